@@ -0,0 +1,109 @@
+"""
+Parity check and microbenchmark for the derived variables in derived.py.
+
+Usage:
+    python benchmarks/bench_derived.py [--floats 10] [--profiles 300] [--repeat 5] [--seed 3]
+
+Mixed-layer depth and heat content computed for whole floats must match a
+straightforward loop over profiles using ``np.interp``; the EOS-80 potential
+temperature must reproduce the UNESCO check value. The timings cover
+the equation of state, the loop and the vectorized pass, and the cached path.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import derived  # noqa: E402
+from derived import DerivedCache, heat_content, mixed_layer_depth, potential_temperature_density  # noqa: E402
+from synthetic import argo_record, float_ids  # noqa: E402
+from timing import best_ms  # noqa: E402
+
+
+def reference(record, theta, sigma0):
+    """``(mld, ohc)`` profile by profile."""
+    mld = np.full(record.n_profiles, np.nan)
+    ohc = np.full(record.n_profiles, np.nan)
+    levels = np.arange(0.0, derived.OHC_DEPTH_DBAR + derived.OHC_STEP_DBAR / 2, derived.OHC_STEP_DBAR)
+    for i in range(record.n_profiles):
+        lo, hi = record.offsets[i], record.offsets[i + 1]
+        p = record.pres[lo:hi].astype(float)
+        for values, out in ((sigma0, mld), (theta, ohc)):
+            v = values[lo:hi]
+            ok = np.isfinite(p) & np.isfinite(v)
+            pp, vv = p[ok], v[ok]
+            order = np.argsort(pp, kind="stable")
+            pp, vv = pp[order], vv[order]
+            if not len(pp):
+                continue
+            if out is mld:
+                if not pp[0] <= derived.MLD_REFERENCE_DBAR <= pp[-1]:
+                    continue
+                threshold = np.interp(derived.MLD_REFERENCE_DBAR, pp, vv) + derived.MLD_THRESHOLD
+                below = np.flatnonzero((pp > derived.MLD_REFERENCE_DBAR) & (vv > threshold))
+                if not len(below):
+                    continue
+                k = below[0]
+                depth = pp[k]
+                if k > 0 and vv[k] > vv[k - 1]:
+                    depth = pp[k - 1] + np.clip((threshold - vv[k - 1]) / (vv[k] - vv[k - 1]), 0, 1) * (pp[k] - pp[k - 1])
+                out[i] = max(depth, derived.MLD_REFERENCE_DBAR)
+            else:
+                if pp[0] > derived.OHC_SURFACE_GAP_DBAR or pp[-1] < derived.OHC_DEPTH_DBAR:
+                    continue
+                grid = np.interp(levels, pp, vv)
+                dz = derived.OHC_STEP_DBAR * derived.DBAR_TO_M
+                out[i] = derived.RHO0 * derived.CP0 * ((grid[1:] + grid[:-1]) / 2).sum() * dz
+    return mld, ohc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--floats", type=int, default=10)
+    parser.add_argument("--profiles", type=int, default=300, help="profiles per float")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    theta = derived.potential_temperature_eos80(np.array(40.0), np.array(40.0 / 1.00024), np.array(10000.0))
+    assert abs(theta * 1.00024 - 36.89073) < 1e-4, theta
+    print(f"EOS-80 check value: θ(40, 40 °C, 10000 dbar) = {theta * 1.00024:.5f} (UNESCO 36.89073)")
+    print(f"density equations: {'TEOS-10 (gsw)' if derived._gsw() else 'EOS-80 (gsw not installed)'}")
+
+    # 5-800 levels from 0-30 dbar down, half of the profiles listed deepest first, with gaps
+    records = {fid: argo_record(fid, args.profiles, 400, spread=0.99, descending=0.5, missing=0.02, seed=args.seed)
+               for fid in float_ids(args.floats)}
+    points = sum(r.n_points for r in records.values())
+    print(f"{args.floats} floats, {args.floats * args.profiles} profiles, {points} points")
+
+    # σθ at the reference level is gridded in float32, worth up to ~0.01 dbar of MLD
+    for record in records.values():
+        theta, sigma0 = potential_temperature_density(record)
+        want_mld, want_ohc = reference(record, theta, sigma0)
+        for name, got, want in (("MLD", mixed_layer_depth(record, sigma0), want_mld),
+                                ("OHC", heat_content(record, theta), want_ohc)):
+            assert (np.isnan(got) == np.isnan(want)).all(), (record.float_id, name)
+            assert np.allclose(got[~np.isnan(got)], want[~np.isnan(want)], rtol=1e-5, atol=1e-2), \
+                (record.float_id, name)
+    print("parity: mixed-layer depth and heat content match the per-profile loop")
+
+    inputs = {fid: potential_temperature_density(r) for fid, r in records.items()}
+    eos = best_ms(lambda: [potential_temperature_density(r) for r in records.values()], args.repeat)
+    looped = best_ms(lambda: [reference(r, *inputs[fid]) for fid, r in records.items()], 1)
+    vectorized = best_ms(lambda: [(mixed_layer_depth(r, inputs[fid][1]), heat_content(r, inputs[fid][0]))
+                                  for fid, r in records.items()], args.repeat)
+    cache = DerivedCache()
+    for record in records.values():
+        cache.get(record)
+    cached = best_ms(lambda: [cache.get(r).series("OHC") for r in records.values()], args.repeat)
+    print(f"θ and σθ for all points     {eos:9.2f} ms")
+    print(f"MLD + OHC, loop             {looped:9.2f} ms")
+    print(f"MLD + OHC, vectorized       {vectorized:9.2f} ms")
+    print(f"series from derived cache   {cached:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Parity check, latency and peak memory of the streaming export in export.py.
+
+Usage:
+    python benchmarks/bench_export.py [--floats 20] [--profiles 300] [--chunk-rows 100000] [--seed 3]
+
+Puts synthetic floats in a float store and exports them as CSV, NetCDF and
+(with pyarrow installed) Parquet. It compares that with the obvious pandas
+route: each float expanded to a DataFrame, concatenated, then written out.
+Peak memory is the largest traced allocation during an export. Every file
+is read back and must hold exactly the rows and values of the records.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The store persists summaries and positions; keep them out of the real cache
+os.environ["ARGO_CACHE_DIR"] = tempfile.mkdtemp(prefix="argo-bench-")
+
+from export import ExportError, export_floats  # noqa: E402
+from store import FloatStore  # noqa: E402
+from synthetic import argo_record, float_ids  # noqa: E402
+from timing import measure  # noqa: E402
+
+
+def pandas_export(records, path, fmt):
+    """Every float as a DataFrame, concatenated and written in one go."""
+    import pandas as pd
+    frame = pd.concat([record.to_xarray().to_dataframe().reset_index(drop=True) for record in records])
+    if fmt == "csv":
+        frame.to_csv(path, index=False)
+    elif fmt == "parquet":
+        frame.to_parquet(path)
+    else:
+        frame.to_xarray().to_netcdf(path)
+
+
+def read_back(path, fmt):
+    """``{column: array}`` of an exported file."""
+    if fmt == "csv":
+        import pandas as pd
+        frame = pd.read_csv(path, parse_dates=["TIME"])
+        return {name: frame[name].to_numpy() for name in frame.columns}
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table[name].to_numpy() for name in table.column_names}
+    import xarray as xr
+    with xr.open_dataset(path) as ds:
+        return {name: ds[name].values for name in ds.variables}
+
+
+def check(path, fmt, records):
+    columns = read_back(path, fmt)
+    counts = [np.diff(r.offsets) for r in records]
+    expected = {
+        "PLATFORM_NUMBER": np.concatenate([np.full(r.n_points, r.float_id) for r in records]),
+        "CYCLE_NUMBER": np.concatenate([np.repeat(r.cycle, c) for r, c in zip(records, counts)]),
+        "TIME": np.concatenate([np.repeat(r.juld, c) for r, c in zip(records, counts)]),
+        "LATITUDE": np.concatenate([np.repeat(r.latitude, c) for r, c in zip(records, counts)]),
+        "PRES": np.concatenate([r.pres for r in records]),
+        "PSAL": np.concatenate([r.psal for r in records]),
+    }
+    for name, values in expected.items():
+        got = columns[name]
+        if values.dtype.kind == "M":
+            assert np.array_equal(got.astype("datetime64[s]"), values), name
+        elif values.dtype.kind == "f":
+            # Values are float32; CSV writes them as text
+            assert np.allclose(got, values, rtol=1e-5, atol=1e-4, equal_nan=True), name
+        else:
+            assert np.array_equal(got, values), name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--floats", type=int, default=20)
+    parser.add_argument("--profiles", type=int, default=300, help="profiles per float")
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    store = FloatStore()
+    ids = float_ids(args.floats)
+    for fid in ids:
+        store.put(fid, argo_record(fid, args.profiles, 525, spread=0.9, seed=args.seed))
+    records = [store.get(fid) for fid in ids]
+    print(f"{args.floats} floats, {sum(r.n_points for r in records)} rows, "
+          f"{sum(r.nbytes for r in records) / 1e6:.1f} MB of records")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, ext in (("csv", "csv"), ("netcdf", "nc"), ("parquet", "parquet")):
+            path = os.path.join(tmp, f"stream.{ext}")
+            try:
+                ms, peak, _ = measure(lambda: export_floats(ids, fmt, store=store, path=path,
+                                                            chunk_rows=args.chunk_rows))
+            except ExportError as e:
+                print(f"(skipping {fmt}: {e})")
+                continue
+            check(path, fmt, records)
+            size = os.path.getsize(path) / 1e6
+            base_path = os.path.join(tmp, f"pandas.{ext}")
+            base_ms, base_peak, _ = measure(lambda: pandas_export(records, base_path, fmt))
+            print(f"{fmt:8s} streaming {ms:8.0f} ms  peak {peak:7.1f} MB   "
+                  f"pandas {base_ms:8.0f} ms  peak {base_peak:7.1f} MB   file {size:6.1f} MB")
+    print("parity: exported files hold the records' rows and values")
+
+
+if __name__ == "__main__":
+    main()
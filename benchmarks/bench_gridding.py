@@ -0,0 +1,100 @@
+"""
+Parity check and microbenchmark for the standard-level gridding in gridding.py.
+
+Usage:
+    python benchmarks/bench_gridding.py [--floats 10] [--profiles 300] [--repeat 5] [--seed 3]
+
+Every gridded profile must match ``np.interp`` run profile by profile (NaN
+outside the sampled pressure range). The batched gridding is timed against
+that per-profile loop, with the same repeats, at 70, 500 and 1000 levels per
+profile on average (low-resolution floats to high-resolution CTD profiles).
+The other timings cover the cached comparison path (grid cache hits plus
+per-level envelopes) and building the envelope comparison figures.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gridding import STANDARD_LEVELS, GridCache, interpolate  # noqa: E402
+from synthetic import argo_record, float_ids  # noqa: E402
+from timing import best_ms  # noqa: E402
+
+
+def reference(record, variable):
+    levels = np.asarray(STANDARD_LEVELS)
+    values = record.temp if variable == "TEMP" else record.psal
+    out = np.full((record.n_profiles, len(levels)), np.nan)
+    for i in range(record.n_profiles):
+        lo, hi = record.offsets[i], record.offsets[i + 1]
+        p, v = record.pres[lo:hi].astype(float), values[lo:hi].astype(float)
+        ok = np.isfinite(p) & np.isfinite(v)
+        p, v = p[ok], v[ok]
+        if not len(p):
+            continue
+        order = np.argsort(p, kind="stable")
+        p, v = p[order], v[order]
+        row = np.interp(levels, p, v)
+        row[(levels < p[0]) | (levels > p[-1])] = np.nan
+        out[i] = row
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--floats", type=int, default=10)
+    parser.add_argument("--profiles", type=int, default=300, help="profiles per float")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    # 5-1000 levels per profile, half of them listed deepest first, with gaps
+    records = {fid: argo_record(fid, args.profiles, 500, spread=0.99, descending=0.5, missing=0.02, seed=args.seed)
+               for fid in float_ids(args.floats)}
+    points = sum(r.n_points for r in records.values())
+    print(f"{args.floats} floats, {args.floats * args.profiles} profiles, {points} points")
+
+    for record in records.values():
+        for variable in ("TEMP", "PSAL"):
+            got, want = interpolate(record, variable), reference(record, variable)
+            assert (np.isnan(got) == np.isnan(want)).all(), (record.float_id, variable)
+            assert np.allclose(got[~np.isnan(got)], want[~np.isnan(want)], atol=1e-4), (record.float_id, variable)
+    print("parity: gridded profiles match np.interp per profile")
+
+    print("levels     points  loop over profiles     batched  speedup")
+    for levels in (70, 500, 1000):
+        sized = records if levels == 500 else {
+            fid: argo_record(fid, args.profiles, levels, spread=0.99, descending=0.5, missing=0.02, seed=args.seed)
+            for fid in records}
+        n = sum(r.n_points for r in sized.values())
+        loop = best_ms(lambda: [reference(r, v) for r in sized.values() for v in ("TEMP", "PSAL")], args.repeat)
+        batched = best_ms(lambda: [interpolate(r, v) for r in sized.values() for v in ("TEMP", "PSAL")],
+                          args.repeat)
+        print(f"{levels:6d} {n:10d} {loop:16.2f} ms {batched:8.2f} ms {loop / batched:7.1f}x")
+
+    cache = GridCache()
+    for record in records.values():
+        cache.get(record)
+    cached = best_ms(lambda: [cache.get(r).envelope(v) for r in records.values() for v in ("TEMP", "PSAL")],
+                     args.repeat)
+    print(f"envelopes from grid cache   {cached:9.2f} ms")
+
+    try:
+        import visualizations as viz
+    except ImportError as e:
+        print(f"(skipping figure timings: {e})")
+        return
+    viz.grid_cache.clear()
+    ids = list(records)
+    viz.compare_floats_envelopes(records, ids)
+    figures = best_ms(lambda: viz.compare_floats_envelopes(records, ids), args.repeat)
+    raw = best_ms(lambda: viz.compare_floats_plot(records, ids), args.repeat)
+    print(f"compare_floats_envelopes    {figures:9.2f} ms (grids cached)")
+    print(f"compare_floats_plot (raw)   {raw:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
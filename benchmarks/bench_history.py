@@ -0,0 +1,87 @@
+"""
+Memory and rerun cost of the chat history in history.py.
+
+Usage:
+    python benchmarks/bench_history.py [--turns 20,200,1000] [--profiles 200] [--repeat 3] [--seed 3]
+
+Plays sessions of ``--turns`` chat turns through the engine over synthetic
+floats and compares the bounded history (figure specs, last page rendered)
+with an unbounded list that keeps every message and redraws it on every
+rerun. Rendering here means rebuilding the figures through the figure cache,
+which is what the UI does before handing them to Streamlit. A re-displayed
+figure must equal the one the reply first showed.
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The store persists summaries and positions; keep them out of the real cache
+os.environ["ARGO_CACHE_DIR"] = tempfile.mkdtemp(prefix="argo-bench-")
+
+from engine import ChatState, handle_message  # noqa: E402
+from history import ChatHistory  # noqa: E402
+from store import FloatStore  # noqa: E402
+from synthetic import argo_record  # noqa: E402
+from timing import best_ms  # noqa: E402
+
+IDS = (2900000, 2900001, 2900002)
+PROMPTS = ("temperature {0}", "salinity {1}", "compare {0} and {2}", "hello", "density {2}", "pressure {1}")
+
+
+def play(turns, store):
+    """
+    ``(bounded history, every message, bytes of every figure shown, json of
+    the figures on the last page)`` of a session of ``turns`` turns.
+    """
+    state, history, unbounded, total, shown = ChatState(), ChatHistory(), [], 0, {}
+    for i in range(turns):
+        text = PROMPTS[i % len(PROMPTS)].format(*IDS)
+        reply = handle_message(state, text, store=store)
+        for role, body, figures in (("user", text, ()), ("assistant", reply.text, reply.figures)):
+            message = history.append(role, body, figures)
+            unbounded.append(message)
+            for spec in figures:
+                for key, fig in spec.build(store):
+                    figure_json = fig.to_json()
+                    total += len(figure_json)
+                    if message.seq >= 2 * turns - history.page_size:
+                        shown[message.chart_key(key)] = figure_json
+    return history, unbounded, total, shown
+
+
+def render(messages, store):
+    return {m.chart_key(key): fig for m in messages for spec in m.figures for key, fig in spec.build(store)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", default="20,200,1000", help="comma-separated session lengths")
+    parser.add_argument("--profiles", type=int, default=200, help="profiles per float")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    store = FloatStore()
+    for fid in IDS:
+        store.put(fid, argo_record(fid, args.profiles, 275, spread=0.8, seed=args.seed))
+
+    print(f"{'turns':>6s} {'kept':>5s} {'history':>10s} {'figures':>10s} {'last page':>11s} {'everything':>11s}")
+    for turns in map(int, args.turns.split(",")):
+        history, unbounded, total, shown = play(turns, store)
+        page = render(history.recent(), store)
+        assert page.keys() == shown.keys()
+        for key, fig in page.items():
+            assert fig.to_json() == shown[key], key
+        page_ms = best_ms(lambda: render(history.recent(), store), args.repeat)
+        all_ms = best_ms(lambda: render(unbounded, store), args.repeat)
+        print(f"{turns:6d} {len(history):5d} {len(pickle.dumps(history)) / 1e3:8.1f} kB "
+              f"{total / 1e6:7.1f} MB {page_ms:8.1f} ms {all_ms:8.1f} ms")
+    print("parity: re-displayed figures equal the ones first shown")
+
+
+if __name__ == "__main__":
+    main()
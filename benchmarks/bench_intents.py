@@ -0,0 +1,342 @@
+"""
+Parity check and microbenchmark for the intent rules in nlp.py.
+
+Usage:
+    python benchmarks/bench_intents.py [--fuzz 200000] [--seed 3] [--repeat 7]
+
+``parse_message`` and ``predict_intents`` must agree on every fuzzed message
+with an if-chain written out by hand: the original one (copied below) with
+the rules added since (export, spatial queries, derived variables) in their
+place. Spatial queries only count when ``nlp.parse_area`` finds a place and
+there is no float ID. A few phrasings that mix float requests with spatial
+words are checked too, and so are date ranges next to float IDs
+(``nlp.parse_range``). The timings compare the old app path (if-chain,
+separate float-ID regex and the trajectory keyword rescan) and the if-chain
+with today's rules with one ``parse_message`` call per message and with
+batches.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlp  # noqa: E402
+
+
+def legacy_predict_intent(text: str) -> str:
+    """
+    Verbatim copy of the original if-chain in nlp.py, kept as the reference.
+    Simple keyword-based intent detection for the Argo chatbot.
+    Expanded to better catch:
+    - comparisons (with or without explicit float numbers)
+    - info/knowledge requests about temperature, salinity, pressure, Argo
+    - synonyms like "temp", "sal", "psal", "pres", and trajectory variants
+    """
+    text_lower = text.lower()
+
+    # Help / capabilities
+    if (
+        "help" in text_lower
+        or "what can you do" in text_lower
+        or "how to use" in text_lower
+        or "commands" in text_lower
+        or "options" in text_lower
+    ):
+        return "help"
+
+    # List loaded floats
+    if (
+        "which floats" in text_lower
+        or "loaded floats" in text_lower
+        or "list floats" in text_lower
+        or "show floats" in text_lower
+        or "what floats" in text_lower
+    ):
+        return "list_floats"
+
+    # Highest-priority: explicit float info
+    if (
+        ("float" in text_lower and "info" in text_lower)
+        or ("details" in text_lower and "float" in text_lower)
+        or ("about" in text_lower and "float" in text_lower)
+        or ("summary" in text_lower and "float" in text_lower)
+        or ("status" in text_lower and "float" in text_lower)
+    ):
+        return "float_info"
+
+    # Comparisons (allow without explicit numbers; numbers are handled downstream)
+    if (
+        "compare" in text_lower
+        or " vs " in text_lower
+        or " versus " in text_lower
+        or "difference between" in text_lower
+    ):
+        return "compare_floats"
+
+    # Knowledge/info requests (e.g., "info regarding temp", "what is salinity")
+    if (
+        "info" in text_lower
+        or "what is" in text_lower
+        or "tell me about" in text_lower
+        or "why" in text_lower
+    ):
+        if ("temperature" in text_lower) or re.search(r"\btemp\b", text_lower):
+            return "importance_temperature"
+        if ("salinity" in text_lower) or re.search(r"\bsal\b", text_lower) or ("psal" in text_lower):
+            return "importance_salinity"
+        if ("pressure" in text_lower) or ("pres" in text_lower):
+            return "importance_pressure"
+        if "argo" in text_lower:
+            return "importance_argo"
+
+    # Variable/profile queries
+    if any(k in text_lower for k in [
+        "temperature profile", "temp profile", "temp data", "temperature", "temp", "heat"
+    ]):
+        return "temperature"
+    if any(k in text_lower for k in ["salinity", "psal", " sal "]):
+        return "salinity"
+    if any(k in text_lower for k in ["pressure", "pres", "depth profile", "depth data"]):
+        return "pressure"
+
+    # Trajectory
+    if any(k in text_lower for k in [
+        "trajectory", "path", "track", "route", "map", "position", "location", "where is"
+    ]):
+        return "trajectory"
+
+    # Add float
+    if (
+        "add float" in text_lower
+        or "load float" in text_lower
+        or "include float" in text_lower
+        or "add another float" in text_lower
+    ):
+        return "ask_float"
+
+    # Greetings / Thanks
+    if any(k in text_lower for k in ["hello", "hi", "hey", "good morning", "good evening"]):
+        return "greeting"
+    if any(k in text_lower for k in ["thanks", "thank you"]):
+        return "thanks"
+    if any(k in text_lower for k in ["bye", "goodbye", "see you"]):
+        return "goodbye"
+
+    # Specific knowledge phrasing
+    if "importance of temperature" in text_lower:
+        return "importance_temperature"
+    if "importance of salinity" in text_lower:
+        return "importance_salinity"
+    if "importance of pressure" in text_lower:
+        return "importance_pressure"
+    if "why argo" in text_lower or "importance of argo" in text_lower or "why argo data" in text_lower:
+        return "importance_argo"
+
+    return "unknown"
+
+
+def legacy_parse(text):
+    """What app.py did per message before the engine."""
+    float_numbers = [int(f) for f in re.findall(r'\b\d{6,8}\b', text)]
+    intent = legacy_predict_intent(text)
+    if intent == "unknown":
+        tl = text.lower()
+        if any(k in tl for k in ["map", "where is", "position", "location", "track", "path", "route"]):
+            intent = "trajectory"
+    return intent, float_numbers
+
+
+def reference_predict_intent(text, float_numbers):
+    """:func:`legacy_predict_intent` with the rules added since, each in its place."""
+    tl = text.lower()
+    if any(k in tl for k in ["help", "what can you do", "how to use", "commands", "options"]):
+        return "help"
+    if any(k in tl for k in ["export", "download", "save as", "data behind"]):
+        return "export"
+    # Spatial queries: "float", a near or region word, a place and no float ID
+    if not float_numbers and "float" in tl and nlp.parse_area(text) is not None:
+        if re.search(r"\bnear\b", tl) or any(k in tl for k in ["nearest", "nearby", "close to", "closest to"]):
+            return "floats_near"
+        if any(k in tl for k in ["within", "inside", "region", "bounding box", *nlp.REGIONS]):
+            return "floats_in_region"
+    if any(k in tl for k in ["which floats", "loaded floats", "list floats", "show floats", "what floats"]):
+        return "list_floats"
+    if "float" in tl and any(k in tl for k in ["info", "details", "about", "summary", "status"]):
+        return "float_info"
+    if any(k in tl for k in ["compare", " vs ", " versus ", "difference between"]):
+        return "compare_floats"
+    if any(k in tl for k in ["info", "what is", "tell me about", "why"]):
+        if "temperature" in tl or re.search(r"\btemp\b", tl):
+            return "importance_temperature"
+        if "salinity" in tl or re.search(r"\bsal\b", tl) or "psal" in tl:
+            return "importance_salinity"
+        if "pressure" in tl or "pres" in tl:
+            return "importance_pressure"
+        if "argo" in tl:
+            return "importance_argo"
+    if "heat content" in tl or "ohc" in tl:
+        return "heat_content"
+    if any(k in tl for k in ["mixed layer", "mixed-layer", "mld"]):
+        return "mixed_layer"
+    if "density" in tl or "sigma" in tl:
+        return "density"
+    if any(k in tl for k in ["temperature profile", "temp profile", "temp data", "temperature", "temp", "heat"]):
+        return "temperature"
+    if any(k in tl for k in ["salinity", "psal", " sal "]):
+        return "salinity"
+    if any(k in tl for k in ["pressure", "pres", "depth profile", "depth data"]):
+        return "pressure"
+    if any(k in tl for k in ["trajectory", "path", "track", "route", "map", "position", "location", "where is"]):
+        return "trajectory"
+    if any(k in tl for k in ["add float", "load float", "include float", "add another float"]):
+        return "ask_float"
+    if any(k in tl for k in ["hello", "hi", "hey", "good morning", "good evening"]):
+        return "greeting"
+    if any(k in tl for k in ["thanks", "thank you"]):
+        return "thanks"
+    if any(k in tl for k in ["bye", "goodbye", "see you"]):
+        return "goodbye"
+    if "importance of temperature" in tl:
+        return "importance_temperature"
+    if "importance of salinity" in tl:
+        return "importance_salinity"
+    if "importance of pressure" in tl:
+        return "importance_pressure"
+    if "why argo" in tl or "importance of argo" in tl or "why argo data" in tl:
+        return "importance_argo"
+    return "unknown"
+
+
+def reference_parse(text):
+    float_numbers = [int(f) for f in re.findall(r'\b\d{6,8}\b', text)]
+    return reference_predict_intent(text, float_numbers), float_numbers
+
+
+# Float requests that use spatial words, and the intent each must get
+REGRESSIONS = [
+    ("temperature of float 2900001 within the last 10 cycles", "temperature"),
+    ("what is the temperature near the surface for float 2900001", "importance_temperature"),
+    ("info about float 2900001 in the indian ocean", "float_info"),
+    ("salinity of float 2903893 near the bottom", "salinity"),
+    ("which floats are near the surface", "list_floats"),
+    ("floats near 15N 70E", "floats_near"),
+    ("floats within 300 km of 12.5S, 80E", "floats_in_region"),
+    ("which floats are in the Bay of Bengal", "floats_in_region"),
+]
+
+# Float IDs after a date word, and the range each message must get
+RANGE_REGRESSIONS = [
+    ("show temperature from 2900001", None),
+    ("salinity in 2900001", None),
+    ("trajectory after 2903892", None),
+    ("temp 2900001 jan 2016", None),
+    ("temperature from 2900001 since 2016", nlp.ProfileRange(start="2016-01-01")),
+    ("salinity of 2900001 in 2017", nlp.ProfileRange(start="2017-01-01", end="2018-01-01")),
+    ("density 2903893 from 2016-01 to 2017-06", nlp.ProfileRange(start="2016-01-01", end="2017-07-01")),
+]
+
+# Fragments mixing every rule phrase with near misses, word-boundary and
+# case-folding edge cases
+FRAGMENTS = [
+    "help", "what can you do", "how to use", "commands", "options", "which floats",
+    "loaded floats", "list floats", "float", "info", "details", "about", "summary",
+    "status", "compare", " vs ", "versus", "difference between", "what is",
+    "tell me about", "why", "temperature", "temp", "tempe", "salinity", "sal", "psal",
+    "pres", "pressure", "argo", "heat", "depth profile", "depth data", "trajectory",
+    "path", "track", "route", "map", "position", "location", "where is", "add float",
+    "load float", "add another float", "hello", "hi", "hey", "good morning", "thanks",
+    "thank you", "bye", "goodbye", "see you", "importance of temperature", "why argo",
+    "2903893", "12345678", "123456789", " ", "  ", "x", "_", "-", "TEMP", "Sal", "é",
+    "İ", "\n", ".", "temp_", "_sal", "sal1", "1sal", "te", "mp", "p", "h", "ab", "out",
+    "ell me", "ta", "ke", "near", "nearby", "within", "inside", "region", "indian ocean",
+    "arabian sea", "15N 70E", "10-20N 60-70E", "in the", "export", "download", "save as",
+    "data behind", "as netcdf", "density", "sigma", "sigma0", "mld", "ohc", "heat content",
+    "mixed layer", "mixed-layer", "mixed", "layer", "content", "dens",
+]
+
+MESSAGES = [
+    "Show me the temperature and salinity profiles for float 2903989.",
+    "Compare float 2903893 and 2903892.",
+    "Why are temperature and salinity important in ocean studies?",
+    "hello",
+    "trajectory 2902206",
+    "thanks!",
+    "what is argo",
+    "list floats",
+    "info float 2903893",
+    "where is float 2902206 now",
+]
+
+# Free text, where per-message cost grows with length
+LONG_MESSAGES = [
+    "I was wondering whether you could possibly show me how the ocean has been changing around here lately",
+    "Please give me everything you have for 2903893 over the last couple of years, plotted nicely thanks",
+]
+
+
+def fuzz_messages(count, seed):
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        sep = rng.choice(["", "", " "])
+        messages.append(sep.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 7))))
+    return messages
+
+
+def check_parity(messages):
+    expected = [(intent, tuple(ids)) for intent, ids in map(reference_parse, messages)]
+    single = [m for m, e in zip(messages, expected) if tuple(nlp.parse_message(m)) != e]
+    batch = [m for m, i, e in zip(messages, nlp.predict_intents(messages), expected) if i != e[0]]
+    assert not single, f"parse_message differs on {len(single)} messages, e.g. {single[:3]!r}"
+    assert not batch, f"predict_intents differs on {len(batch)} messages, e.g. {batch[:3]!r}"
+
+
+def per_message_us(fn, messages, repeat, number=2000):
+    best = min(timeit.repeat(lambda: fn(messages), number=number, repeat=repeat))
+    return best / number / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=200000, help="number of fuzzed messages")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    check_parity(fuzz_messages(args.fuzz, args.seed))
+    for message, intent in REGRESSIONS:
+        assert nlp.parse_message(message).intent == intent, (message, nlp.parse_message(message))
+    for message, selection in RANGE_REGRESSIONS:
+        assert nlp.parse_range(message) == selection, (message, nlp.parse_range(message))
+    print(f"parity: {args.fuzz} fuzzed messages identical, {len(REGRESSIONS)} spatial phrasings routed, "
+          f"{len(RANGE_REGRESSIONS)} ranges next to float IDs read")
+
+    # A replayed chat log repeats short commands; predict_intents parses each distinct one once
+    log = [random.Random(args.seed).choice(MESSAGES) for _ in range(1000)]
+    rows = [
+        ("old app path", lambda ms: [legacy_parse(m) for m in ms]),
+        ("old predict_intent only", lambda ms: [legacy_predict_intent(m) for m in ms]),
+        ("if-chain, today's rules", lambda ms: [reference_parse(m) for m in ms]),
+        ("parse_message", lambda ms: [nlp.parse_message(m) for m in ms]),
+        ("predict_intents", nlp.predict_intents),
+    ]
+    print(f"{'':<26}{'sample':>10}{'chat log':>10}   (us/message)")
+    for name, fn in rows:
+        sample = per_message_us(fn, MESSAGES, args.repeat)
+        replay = per_message_us(fn, log, args.repeat, number=20)
+        print(f"{name:<26}{sample:>10.2f}{replay:>10.2f}")
+    print()
+    print(f"{'old':>8} {'today':>8} {'parse':>8}   (us: old app path, if-chain with today's rules, parse_message)")
+    for message in MESSAGES + LONG_MESSAGES:
+        old = per_message_us(lambda ms: [legacy_parse(m) for m in ms], [message], args.repeat, number=20000)
+        chain = per_message_us(lambda ms: [reference_parse(m) for m in ms], [message], args.repeat, number=20000)
+        new = per_message_us(lambda ms: [nlp.parse_message(m) for m in ms], [message], args.repeat, number=20000)
+        print(f"{old:8.2f} {chain:8.2f} {new:8.2f}  {message}")
+
+
+if __name__ == "__main__":
+    main()
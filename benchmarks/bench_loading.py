@@ -0,0 +1,81 @@
+"""
+Load latency and peak memory of the float cache read paths in fetcher.py.
+
+Usage:
+    python benchmarks/bench_loading.py [--floats 5] [--profiles 300] [--repeat 3] [--seed 3]
+
+Writes argopy-like point datasets (with QC, error and mode variables) to a
+temporary cache directory and compares, per float: loading the whole NetCDF
+file, reading only the variables records use, and opening the memory-mapped
+columnar copy, followed by what a trajectory or a temperature profile
+request touches. Peak memory is the largest traced allocation during a load.
+Every path must produce the same record.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import xarray as xr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetcher import FloatCache  # noqa: E402
+from records import COLUMNS, RECORD_VARIABLES, FloatRecord  # noqa: E402
+from synthetic import argo_dataset, float_ids  # noqa: E402
+from timing import measure  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--floats", type=int, default=5)
+    parser.add_argument("--profiles", type=int, default=300, help="profiles per float")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FloatCache(backend=None, cache_dir=tmp, ttl=None, max_bytes=None, offline=True)
+        ids = float_ids(args.floats)
+        for fid in ids:
+            cache.put(fid, argo_dataset(fid, args.profiles, 525, spread=0.9, seed=args.seed))
+        points = sum(cache.read_record(fid).n_points for fid in ids)
+        print(f"{args.floats} floats, {args.floats * args.profiles} profiles, {points} points, "
+              f"{sum(os.path.getsize(cache.path(fid)) for fid in ids) / 1e6:.1f} MB of NetCDF")
+
+        def full():
+            return [FloatRecord.from_xarray(xr.load_dataset(cache.path(fid)), float_id=fid) for fid in ids]
+
+        def selective():
+            return [FloatRecord.from_xarray(cache._read(cache.path(fid), RECORD_VARIABLES), float_id=fid)
+                    for fid in ids]
+
+        def mapped():
+            return [cache.read_record(fid) for fid in ids]
+
+        def trajectory():
+            return [(r.latitude.copy(), r.longitude.copy()) for r in mapped()]
+
+        def temperature():
+            return [(r.pres.copy(), r.temp.copy()) for r in mapped()]
+
+        results = {}
+        for name, fn in (("load whole file", full), ("read record variables", selective),
+                         ("open mapped columns", mapped), ("  + trajectory columns", trajectory),
+                         ("  + temperature columns", temperature)):
+            ms, peak, results[name] = measure(fn, args.repeat)
+            print(f"{name:26s} {ms:9.2f} ms  peak {peak:8.2f} MB")
+
+        for reference, *others in zip(results["load whole file"], results["read record variables"],
+                                      results["open mapped columns"]):
+            for other in others:
+                assert other.version == reference.version
+                for column in COLUMNS:
+                    a, b = getattr(reference, column), getattr(other, column)
+                    assert np.array_equal(a, b, equal_nan=a.dtype.kind == "f"), column
+        print("parity: all read paths give identical records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Parity check and microbenchmark for the spatial index in spatial.py.
+
+Usage:
+    python benchmarks/bench_spatial.py [--floats 3000] [--profiles 150] [--queries 200] [--seed 3]
+
+Builds a :class:`spatial.SpatialIndex` over synthetic drifting tracks (no
+files are written), checks every radius and box query, latest-position and
+full-track, against a brute-force scan of all positions, and reports the
+build time and the mean query latency.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial import SpatialIndex, haversine_km, wrap_lon  # noqa: E402
+
+
+def synthetic_tracks(n_floats, n_profiles, rng):
+    """Random-walk tracks with ~10-day cycles, as record-like objects."""
+    records = []
+    start = np.datetime64("2015-01-01", "s")
+    for fid in range(1000000, 1000000 + n_floats):
+        n = int(rng.integers(1, n_profiles + 1))
+        lat = np.clip(rng.uniform(-70, 70) + np.cumsum(rng.normal(0, 0.3, n)), -89.9, 89.9)
+        lon = wrap_lon(rng.uniform(-180, 180) + np.cumsum(rng.normal(0, 0.3, n)))
+        juld = start + np.cumsum(rng.integers(9, 11, n)).astype("timedelta64[D]")
+        records.append(SimpleNamespace(
+            float_id=fid, version=f"{n}", cycle=np.arange(1, n + 1, dtype=np.int32),
+            juld=juld.astype("datetime64[s]"), latitude=lat.astype(np.float32),
+            longitude=lon.astype(np.float32)))
+    return records
+
+
+def brute_near(records, lat, lon, radius_km, track):
+    found = set()
+    for r in records:
+        lats, lons = (r.latitude, r.longitude) if track else (r.latitude[-1:], r.longitude[-1:])
+        if (haversine_km(lat, lon, lats, lons) <= radius_km).any():
+            found.add(r.float_id)
+    return found
+
+
+def brute_within(records, south, north, west, east, track):
+    width = (east - west) % 360.0
+    found = set()
+    for r in records:
+        lats, lons = (r.latitude, r.longitude) if track else (r.latitude[-1:], r.longitude[-1:])
+        inside = (lats >= south) & (lats <= north) & ((lons - west) % 360.0 <= width)
+        if inside.any():
+            found.add(r.float_id)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--floats", type=int, default=3000)
+    parser.add_argument("--profiles", type=int, default=150, help="maximum profiles per float")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    records = synthetic_tracks(args.floats, args.profiles, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SpatialIndex(path=os.path.join(tmp, "positions.npz"))
+        for record in records:
+            index.update(record, save=False)
+        start = time.perf_counter()
+        index.near(0.0, 0.0, 1.0)
+        index.near(0.0, 0.0, 1.0, track=True)
+        build = time.perf_counter() - start
+    print(f"{len(index)} floats, {index.n_positions} positions, grids built in {build * 1000:.1f} ms")
+
+    circles = [(rng.uniform(-85, 85), rng.uniform(-180, 180), rng.uniform(50, 1500)) for _ in range(args.queries)]
+    boxes = []
+    for _ in range(args.queries):
+        south = rng.uniform(-80, 70)
+        west = rng.uniform(-180, 180)
+        # Some boxes cross the dateline (west > east after wrapping)
+        boxes.append((south, south + rng.uniform(1, 20), west, float(wrap_lon(west + rng.uniform(1, 40)))))
+
+    for track in (False, True):
+        label = "track " if track else "latest"
+        timings = []
+        for lat, lon, radius in circles:
+            t0 = time.perf_counter()
+            matches = index.near(lat, lon, radius, track=track)
+            timings.append(time.perf_counter() - t0)
+            got = {m.float_id for m in matches}
+            assert got == brute_near(records, lat, lon, radius, track), (lat, lon, radius, track)
+        print(f"near   {label}: {np.mean(timings) * 1000:7.3f} ms/query (max {max(timings) * 1000:.3f})")
+        timings = []
+        for box in boxes:
+            t0 = time.perf_counter()
+            matches = index.within(*box, track=track)
+            timings.append(time.perf_counter() - t0)
+            assert {m.float_id for m in matches} == brute_within(records, *box, track), (box, track)
+        print(f"within {label}: {np.mean(timings) * 1000:7.3f} ms/query (max {max(timings) * 1000:.3f})")
+    print("parity: all queries match the brute-force scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Cold-start and rerun cost of the Streamlit app.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--reruns 5]
+
+Cold start imports the modules app.py needs in a fresh interpreter, best of
+``--repeat``: the current imports (xarray, pandas and plotly.express only load
+when a dataset is read or a map is drawn) against the same imports plus those
+libraries, which is what every process paid before. With Streamlit installed
+it also runs app.py through ``streamlit.testing.v1.AppTest``: the first run
+of a session, and reruns, which re-execute the script but not the modules it
+imports.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+APP_MODULES = "engine, warmup, visualizations, store, profiling, summary"
+EAGER_MODULES = "xarray, pandas, plotly.express"
+
+
+def cold_import(modules, repeat, env):
+    """Best wall time in ms to import ``modules`` in a new interpreter."""
+    code = f"import time; t = time.perf_counter(); import {modules}; print(time.perf_counter() - t)"
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT, ARGO_CACHE_DIR=tmp, ARGO_WARMUP="0", ARGO_OFFLINE="1")
+        lazy = cold_import(APP_MODULES, args.repeat, env)
+        eager = cold_import(f"{APP_MODULES}, {EAGER_MODULES}", args.repeat, env)
+        print(f"cold import, lazy  {lazy:9.1f} ms")
+        print(f"cold import, eager {eager:9.1f} ms  ({eager / lazy:.1f}x)")
+
+        try:
+            from streamlit.testing.v1 import AppTest
+        except ImportError as e:
+            print(f"(skipping rerun timings: {e})")
+            return
+        os.environ.update(env)
+        app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+        start = time.perf_counter()
+        app.run()
+        first = time.perf_counter() - start
+        assert not app.exception, app.exception
+        timings = []
+        for _ in range(args.reruns):
+            start = time.perf_counter()
+            app.run()
+            timings.append(time.perf_counter() - start)
+        print(f"first run          {first * 1000:9.1f} ms")
+        print(f"rerun              {min(timings) * 1000:9.1f} ms  (best of {args.reruns})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Parity check and microbenchmark for the trajectory pipeline in trajectory.py.
+
+Usage:
+    python benchmarks/bench_trajectory.py [--floats 1,50,1000] [--cycles 300] [--repeat 3] [--seed 3]
+
+Compares the previous per-point path of ``plot_trajectories`` (every track
+converted to lists, then every point passed through ``float()`` again to
+compute bounds) with :func:`trajectory.prepare` on random-walk tracks, some
+of which cross the dateline. Both timings include encoding the coordinates
+as JSON, which is how they reach the browser. Checks: without a budget every
+position comes back unchanged, tracks simplified under the budget stay within
+the tolerance of the full ones, and no drawn segment jumps across the map at
+the dateline.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trajectory  # noqa: E402
+from spatial import wrap_lon  # noqa: E402
+from timing import best_ms  # noqa: E402
+
+
+def synthetic_tracks(n_floats, n_cycles, rng):
+    """Random walks; every fifth float starts next to the dateline."""
+    tracks = {}
+    for i in range(n_floats):
+        lon0 = 179.0 if i % 5 == 0 else rng.uniform(40, 100)
+        lat = np.cumsum(rng.normal(0, 0.15, n_cycles)) + rng.uniform(-30, 20)
+        lon = wrap_lon(lon0 + np.cumsum(rng.normal(0, 0.15, n_cycles))).astype(np.float32)
+        lat[rng.random(n_cycles) < 0.01] = np.nan
+        tracks[2900000 + i] = (lat.astype(np.float32), lon)
+    return tracks
+
+
+def legacy(tracks):
+    """Bounds and point lists the way plot_trajectories used to build them."""
+    traces = []
+    for lats, lons in tracks.values():
+        lons = ((lons + 180) % 360) - 180
+        traces.append((lats.tolist(), lons.tolist()))
+        traces.append(([float(lats[-1])], [float(lons[-1])]))
+    all_lats, all_lons = [], []
+    for lat, lon in traces:
+        all_lats.extend([float(x) for x in lat])
+        all_lons.extend([float(x) for x in lon])
+    return traces, (float(np.nanmin(all_lats)), float(np.nanmax(all_lats)),
+                    float(np.nanmin(all_lons)), float(np.nanmax(all_lons)))
+
+
+def encode_legacy(tracks):
+    traces, _ = legacy(tracks)
+    return json.dumps(traces)
+
+
+def encode_pipeline(tracks):
+    result = trajectory.prepare(tracks)
+    return json.dumps([result.lat.tolist(), result.lon.tolist(), result.latest_lat.tolist(),
+                       result.latest_lon.tolist()])
+
+
+def max_deviation(tracks, result):
+    """Largest distance (Mercator degrees) from a full-track vertex to its simplified track."""
+    worst = 0.0
+    for i, fid in enumerate(result.float_ids):
+        lat, lon = tracks[fid]
+        ok = np.isfinite(lat) & np.isfinite(lon)
+        x, y = np.unwrap(lon[ok].astype(np.float64), period=360.0), trajectory.mercator_y(lat[ok].astype(np.float64))
+        slat, slon = result.track(i)
+        keep = np.isfinite(slat)
+        sx = np.unwrap(slon[keep], period=360.0) + (x[0] - slon[keep][0])
+        sy = trajectory.mercator_y(slat[keep])
+        ax, ay, bx, by = sx[:-1, None], sy[:-1, None], sx[1:, None], sy[1:, None]
+        dx, dy = bx - ax, by - ay
+        norm = np.where(dx * dx + dy * dy > 0, dx * dx + dy * dy, 1.0)
+        t = np.clip(((x - ax) * dx + (y - ay) * dy) / norm, 0, 1)
+        worst = max(worst, float(np.hypot(x - (ax + t * dx), y - (ay + t * dy)).min(axis=0).max()))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--floats", default="1,50,1000", help="comma-separated numbers of floats")
+    parser.add_argument("--cycles", type=int, default=300, help="positions per float")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'floats':>6s} {'points':>8s} {'kept':>6s} {'legacy':>10s} {'pipeline':>10s} "
+          f"{'legacy JSON':>11s} {'JSON':>11s} {'deviation':>10s}")
+    for n_floats in map(int, args.floats.split(",")):
+        tracks = synthetic_tracks(n_floats, args.cycles, rng)
+        result = trajectory.prepare(tracks)
+
+        full = trajectory.prepare(tracks, budget=10 ** 9, view_pixels=10 ** 12)
+        for i, fid in enumerate(full.float_ids):
+            lat, lon = tracks[fid]
+            ok = np.isfinite(lat) & np.isfinite(lon)
+            slat, slon = full.track(i)
+            drawn = np.isfinite(slat) & (np.abs(slon) < 180)
+            assert np.array_equal(slat[drawn], lat[ok][np.abs(wrap_lon(lon[ok])) < 180]), fid
+            assert np.allclose(slon[drawn], wrap_lon(lon[ok])[np.abs(wrap_lon(lon[ok])) < 180]), fid
+        for i in range(len(result)):
+            slat, slon = result.track(i)
+            assert np.nanmax(np.abs(np.diff(slon)), initial=0) < 180, "segment across the dateline"
+        south, north, west, east = result.bounds
+        tolerance = max(east - west, float(trajectory.mercator_y(north) - trajectory.mercator_y(south)))
+        tolerance /= trajectory.VIEW_PIXELS
+        deviation = max_deviation(tracks, result)
+        if len(result.lat) - np.isnan(result.lat).sum() < trajectory.TRACK_POINT_BUDGET:
+            assert deviation <= tolerance + 1e-9, (deviation, tolerance)
+
+        legacy_ms = best_ms(lambda: encode_legacy(tracks), args.repeat)
+        new_ms = best_ms(lambda: encode_pipeline(tracks), args.repeat)
+        print(f"{n_floats:6d} {result.n_input:8d} {len(result.lat):6d} {legacy_ms:7.1f} ms {new_ms:7.1f} ms "
+              f"{len(encode_legacy(tracks)) / 1e3:8.0f} kB {len(encode_pipeline(tracks)) / 1e3:8.0f} kB "
+              f"{deviation:10.4f}")
+    print("parity: unbudgeted tracks unchanged, simplified tracks within tolerance, no dateline jumps")
+
+
+if __name__ == "__main__":
+    main()
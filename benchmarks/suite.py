@@ -0,0 +1,349 @@
+"""
+Benchmark suite: time and peak memory of the intent, fetch, plotting and
+dispatch paths across data sizes, checked against a stored baseline.
+
+Usage:
+    python benchmarks/suite.py [--tiers small,medium] [--only plot] [--repeat 5]
+    python benchmarks/suite.py --save-baseline          # record benchmarks/baseline.json
+    python benchmarks/suite.py --threshold 0.25         # exit 1 on regressions past 25%
+
+Floats come from :mod:`synthetic`: argopy-shaped datasets served by a fetch
+backend in place of argopy, so the whole fetch path runs (NetCDF cache,
+columnar copies, concurrent loads) without a network. Each tier scales the
+number of floats, cycles per float and levels per cycle. Every case runs once
+to warm up, then reports its best of ``--repeat`` timings and the peak
+traced allocation of one more run. Caches that would hide the work
+(figures, gridded and derived floats) are cleared before every run.
+
+With a baseline (``--baseline``, default ``benchmarks/baseline.json`` if it
+exists), a case regresses when it is more than ``--threshold`` slower or
+larger than recorded there, and by more than ``--min-ms`` / ``--min-mb`` so
+timer noise on fast cases does not count. Baselines are only comparable on
+the machine that recorded them, so none is checked in. Every case runs: one
+that raises is reported as failed, as is a case the baseline measured but
+this run did not, and either makes the run exit 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import traceback
+from typing import NamedTuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The store persists summaries and positions; keep them out of the real cache
+os.environ["ARGO_CACHE_DIR"] = tempfile.mkdtemp(prefix="argo-bench-")
+
+import nlp  # noqa: E402
+import visualizations as viz  # noqa: E402
+from derived import derived_cache  # noqa: E402
+from engine import ChatState, handle_message  # noqa: E402
+from fetcher import FETCH_WORKERS, FetchCoordinator, FloatCache  # noqa: E402
+from gridding import grid_cache  # noqa: E402
+from store import FloatStore  # noqa: E402
+from synthetic import SyntheticBackend, float_ids  # noqa: E402
+from timing import measure  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Simulated round trip of one argopy request in the concurrent fetch case
+FETCH_LATENCY = 0.05
+
+
+class Tier(NamedTuple):
+    floats: int
+    cycles: int
+    levels: int
+    messages: int
+
+
+TIERS = {
+    "small": Tier(floats=3, cycles=50, levels=200, messages=1_000),
+    "medium": Tier(floats=10, cycles=150, levels=500, messages=10_000),
+    "large": Tier(floats=30, cycles=300, levels=1000, messages=100_000),
+}
+
+# Chat messages the intent cases parse; {a} and {b} are float IDs
+MESSAGES = (
+    "show temperature of float {a}", "salinity profile {a}", "pressure for {a} last 10 cycles",
+    "density {a} since 2016-03", "mixed layer depth of {a}", "ocean heat content {a}",
+    "compare {a} and {b}", "compare floats {a} {b} envelopes", "trajectory of float {a}",
+    "where has float {a} been", "info float {a}", "tell me about float {b}", "which floats are loaded",
+    "floats near 15N 70E", "floats within 300 km of 12.5S, 80E", "export {a} as netcdf", "help",
+    "why is salinity important", "what is argo", "hello", "thanks", "bye", "add a float",
+)
+# Chat turns that the dispatch cases replay, with the intent each must get
+ROUTES = (
+    ("temperature {a}", "temperature"), ("salinity {b} last 10 cycles", "salinity"),
+    ("density {a}", "density"), ("mixed layer depth {a}", "mixed_layer"),
+    ("heat content {b}", "heat_content"), ("compare {ids}", "compare_floats"),
+    ("compare {ids} envelopes", "compare_floats"), ("trajectory {a}", "trajectory"),
+    ("info float {a}", "float_info"), ("which floats are loaded", "list_floats"),
+    ("floats near 15N 70E", "floats_near"),
+)
+# Turns whose figures are built in the "turn" case; the maps have their own cases
+FIGURE_INTENTS = ("temperature", "salinity", "density", "mixed_layer", "heat_content", "compare_floats")
+
+
+def clear_caches():
+    viz.figure_cache.clear()
+    grid_cache.clear()
+    derived_cache.clear()
+
+
+class Context:
+    """The floats of one tier, fetched through a float cache in ``directory``."""
+
+    def __init__(self, tier: Tier, directory: str, seed: int):
+        self.tier = tier
+        self.ids = float_ids(tier.floats)
+        backend = SyntheticBackend(tier.cycles, tier.levels)
+        self.cache = FloatCache(backend=backend, cache_dir=os.path.join(directory, "cache"),
+                                ttl=None, max_bytes=None, offline=False)
+        self.records = {fid: self.cache.record(fid) for fid in self.ids}
+        self.store = FloatStore()
+        for fid, record in self.records.items():
+            self.store.put(fid, record)
+        rng = random.Random(seed)
+        self.messages = [rng.choice(MESSAGES).format(a=rng.choice(self.ids), b=rng.choice(self.ids))
+                         for _ in range(tier.messages)]
+        a, b = self.ids[0], self.ids[-1]
+        ids = " ".join(map(str, self.ids))
+        self.routes = [(text.format(a=a, b=b, ids=ids), intent) for text, intent in ROUTES]
+        self.latency_cache = FloatCache(backend=SyntheticBackend(tier.cycles, tier.levels, FETCH_LATENCY),
+                                        cache_dir=os.path.join(directory, "latency"),
+                                        ttl=None, max_bytes=None, offline=False)
+        self.coordinator = FetchCoordinator(self.latency_cache, max_workers=FETCH_WORKERS)
+
+
+def intent_parse(ctx):
+    return lambda: [nlp.parse_message(m) for m in ctx.messages]
+
+
+def intent_batch(ctx):
+    return lambda: nlp.predict_intents(ctx.messages)
+
+
+def fetch_cold(ctx):
+    """Download, write the NetCDF cache entry and decode, for every float."""
+    def run():
+        for fid in ctx.ids:
+            ctx.cache.invalidate(fid)
+            ctx.cache.record(fid)
+    return run
+
+
+def fetch_warm(ctx):
+    """Memory-mapped reads of cached floats, touching one profile's worth of columns."""
+    def run():
+        for fid in ctx.ids:
+            record = ctx.cache.read_record(fid)
+            record.temp[record.offsets[-2]:].sum()
+    return run
+
+
+def fetch_many(ctx):
+    """Cold loads of every float at once through the coordinator, with network latency."""
+    def run():
+        for fid in ctx.ids:
+            ctx.latency_cache.invalidate(fid)
+        futures = [ctx.coordinator.submit(fid) for fid in ctx.ids]
+        return [future.result() for future in futures]
+    return run
+
+
+def plotting(plot, *args, **kwargs):
+    def case(ctx):
+        def run():
+            clear_caches()
+            return plot(ctx.records, *args, **kwargs)
+        return run
+    return case
+
+
+def compare(plot):
+    def case(ctx):
+        def run():
+            clear_caches()
+            return plot(ctx.records, ctx.ids)
+        return run
+    return case
+
+
+def dispatch_route(ctx):
+    """Parse and route every turn, without building figures."""
+    def run():
+        clear_caches()
+        state = ChatState(ctx.ids)
+        return [handle_message(state, text, store=ctx.store) for text, _ in ctx.routes]
+    return run
+
+
+def dispatch_turn(ctx):
+    """Turns that draw a chart, end to end: route, then build every figure."""
+    turns = [text for text, intent in ctx.routes if intent in FIGURE_INTENTS]
+
+    def run():
+        clear_caches()
+        state = ChatState(ctx.ids)
+        for text in turns:
+            for spec in handle_message(state, text, store=ctx.store).figures:
+                spec.build(ctx.store)
+    return run
+
+
+CASES = {
+    "intent.parse_message": intent_parse,
+    "intent.predict_intents": intent_batch,
+    "fetch.cold": fetch_cold,
+    "fetch.warm": fetch_warm,
+    "fetch.many": fetch_many,
+    "plot.profiles": plotting(viz.plot_float_profiles, variable="TEMP"),
+    "plot.series": plotting(viz.plot_float_series, variable="MLD"),
+    "plot.compare": compare(viz.compare_floats_plot),
+    "plot.envelopes": compare(viz.compare_floats_envelopes),
+    "plot.map": plotting(viz.plot_map),
+    "plot.trajectories": plotting(viz.plot_trajectories),
+    "dispatch.route": dispatch_route,
+    "dispatch.turn": dispatch_turn,
+}
+
+
+def check(ctx):
+    """The fetched floats hold the synthetic data, and every turn gets its intent."""
+    for fid, record in ctx.records.items():
+        ds = ctx.cache.backend.fetch(fid)
+        assert record.n_points == ds.sizes["N_POINTS"], fid
+        assert np.array_equal(record.cycle, np.unique(ds["CYCLE_NUMBER"].values)), fid
+        assert np.allclose(record.pres, ds["PRES"].values.astype(np.float32)), fid
+    state = ChatState(ctx.ids)
+    for text, intent in ctx.routes:
+        got = handle_message(state, text, store=ctx.store).intent
+        assert got == intent, (text, got, intent)
+
+
+def compare_baseline(results, baseline, threshold, min_ms, min_mb):
+    """
+    ``{key: change}`` for every key in ``results`` that regressed against
+    ``baseline``, or that the baseline measured and this run did not.
+    """
+    regressions = {}
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or "ms" not in base:
+            continue
+        if "ms" not in result:
+            regressions[key] = "measured in the baseline, failed now"
+            continue
+        changes = []
+        for metric, slack, unit in (("ms", min_ms, "ms"), ("peak_mb", min_mb, "MB")):
+            old, new = base[metric], result[metric]
+            if new > old * (1 + threshold) and new - old > slack:
+                changes.append(f"{metric} {old:.1f} -> {new:.1f} {unit}")
+        if changes:
+            regressions[key] = ", ".join(changes)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tiers", default="small,medium", help=f"comma-separated, from {', '.join(TIERS)}")
+    parser.add_argument("--only", default="", help="run only the cases whose name starts with this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown or growth")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--min-mb", type=float, default=1.0, help="ignore memory growth smaller than this")
+    args = parser.parse_args()
+
+    tiers = [name.strip() for name in args.tiers.split(",") if name.strip()]
+    unknown = [name for name in tiers if name not in TIERS]
+    if unknown:
+        parser.error(f"unknown tier {', '.join(unknown)}; choose from {', '.join(TIERS)}")
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        for name in tiers:
+            if saved["tiers"].get(name) not in (None, list(TIERS[name])):
+                print(f"(baseline tier {name} has different sizes; its cases are not compared)")
+                baseline = {k: v for k, v in baseline.items() if not k.startswith(f"{name}/")}
+
+    results = {}
+    for name in tiers:
+        tier = TIERS[name]
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            ctx = Context(tier, tmp, args.seed)
+            check(ctx)
+            points = sum(record.n_points for record in ctx.records.values())
+            print(f"\n{name}: {tier.floats} floats x {tier.cycles} cycles x ~{tier.levels} levels "
+                  f"({points} points), {tier.messages} messages; set up in {time.perf_counter() - start:.1f} s")
+            print(f"{'case':24s} {'time':>11s} {'peak':>10s} {'vs baseline':>12s}")
+            for case, setup in CASES.items():
+                if not case.startswith(args.only):
+                    continue
+                key = f"{name}/{case}"
+                try:
+                    ms, peak, _ = measure(setup(ctx), args.repeat, warmup=True)
+                except Exception as e:
+                    results[key] = {"failed": f"{type(e).__name__}: {e}".splitlines()[0][:200]}
+                    print(f"{case:24s} FAILED")
+                    traceback.print_exc()
+                    continue
+                results[key] = {"ms": round(ms, 3), "peak_mb": round(peak, 3)}
+                base = baseline.get(key, {})
+                change = f"{(ms / base['ms'] - 1) * 100:+.0f}%" if base.get("ms") else ""
+                print(f"{case:24s} {ms:8.1f} ms {peak:7.1f} MB {change:>12s}")
+    print("parity: fetched floats match the synthetic datasets; every turn got its intent")
+
+    failed = {key: result["failed"] for key, result in results.items() if "failed" in result}
+    if failed:
+        print(f"\n{len(failed)} case{'s' if len(failed) != 1 else ''} failed:")
+        for key, error in failed.items():
+            print(f"  {key}: {error}")
+        if args.save_baseline:
+            print("baseline not written")
+        return 1
+
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                saved = json.load(f)
+        # Tiers not run this time keep their recorded results
+        kept = {k: v for k, v in saved.get("results", {}).items() if k.split("/")[0] not in tiers}
+        kept_tiers = {k: v for k, v in saved.get("tiers", {}).items() if k not in tiers}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                            "platform": platform.platform(), "processor": platform.processor()},
+                "tiers": dict(kept_tiers, **{name: list(TIERS[name]) for name in tiers}),
+                "results": dict(kept, **results),
+            }, f, indent=1, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        return 0
+    regressions = compare_baseline(results, baseline, args.threshold, args.min_ms, args.min_mb)
+    if regressions:
+        print(f"\n{len(regressions)} regression{'s' if len(regressions) != 1 else ''} "
+              f"beyond {args.threshold:.0%} of {args.baseline}:")
+        for key, change in regressions.items():
+            print(f"  {key}: {change}")
+        return 1
+    print(f"no regressions beyond {args.threshold:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
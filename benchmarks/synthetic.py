@@ -0,0 +1,104 @@
+"""
+Synthetic Argo floats for the benchmarks, scalable in floats, cycles and levels.
+
+:func:`argo_dataset` builds the point dataset argopy returns for one float
+(``N_POINTS`` rows with QC, error and mode variables, and LATITUDE, LONGITUDE
+and TIME coordinates), and :func:`argo_record` the record the store keeps of
+it. Data are derived from the float ID and a seed, so a float looks the same
+on every call. :class:`SyntheticBackend` serves these datasets through
+the fetch layer in place of :class:`fetcher.ArgopyBackend`, with an optional
+delay standing in for the network.
+"""
+import time
+
+import numpy as np
+import xarray as xr
+
+from fetcher import newer_than
+from records import FloatRecord
+
+FIRST_FLOAT = 2900000
+CYCLE_DAYS = 10
+START = np.datetime64("2015-01-01", "ns")
+
+
+def float_ids(n_floats: int):
+    return [FIRST_FLOAT + i for i in range(n_floats)]
+
+
+def argo_dataset(float_id: int, n_cycles: int = 100, n_levels: int = 500, spread: float = 0.2,
+                 descending: float = 0.0, missing: float = 0.01, seed: int = 0) -> xr.Dataset:
+    """
+    Point dataset shaped like argopy's standard output for ``float_id``:
+    ``n_cycles`` profiles of ``n_levels`` levels give or take ``spread`` (a
+    fraction), from the first sample at 0-30 dbar down to 2000 dbar, on a
+    random-walk track. Temperature has a 10-150 dbar mixed layer over a
+    thermocline. A ``descending`` fraction of profiles are marked "D" and
+    listed deepest first, so pressures cannot be assumed sorted, and a
+    ``missing`` fraction of temperatures and salinities are NaN. Every fifth
+    float starts next to the dateline. ``seed`` gives another set of floats.
+    """
+    rng = np.random.default_rng([int(float_id), seed])
+    low, high = max(round(n_levels * (1 - spread)), 1), max(round(n_levels * (1 + spread)), 1)
+    counts = rng.integers(low, high + 1, n_cycles)
+    n = int(counts.sum())
+    profile = np.repeat(np.arange(n_cycles), counts)
+    down = rng.random(n_cycles) < descending
+    tops = rng.uniform(0, 30, n_cycles)
+    pres = np.concatenate([np.sort(rng.uniform(top, 2000, c))[::-1 if d else 1]
+                           for top, c, d in zip(tops, counts, down)])
+
+    # Warmer, saltier surface layer over a cold deep ocean
+    mixed = np.repeat(rng.uniform(10, 150, n_cycles), counts)
+    temp = 2 + 26 * np.exp(-np.maximum(pres - mixed, 0) / 500) + rng.normal(0, 0.01, n)
+    psal = 34.7 + 0.4 * np.tanh((pres - 300) / 200) + rng.normal(0, 0.005, n)
+    temp[rng.random(n) < missing] = np.nan
+    psal[rng.random(n) < missing] = np.nan
+
+    lon0 = 179.0 if (int(float_id) - FIRST_FLOAT) % 5 == 0 else rng.uniform(40, 100)
+    lat = np.clip(rng.uniform(-30, 20) + np.cumsum(rng.normal(0, 0.15, n_cycles)), -80, 80)
+    lon = (lon0 + np.cumsum(rng.normal(0, 0.15, n_cycles)) + 180) % 360 - 180
+    times = START + np.arange(n_cycles) * np.timedelta64(CYCLE_DAYS, "D")
+
+    point = {
+        "CYCLE_NUMBER": np.repeat(np.arange(1, n_cycles + 1), counts),
+        "PLATFORM_NUMBER": np.full(n, int(float_id)),
+        "DIRECTION": np.where(np.repeat(down, counts), "D", "A"),
+        "DATA_MODE": np.full(n, "D"),
+        "CONFIG_MISSION_NUMBER": np.ones(n, dtype=np.int32),
+        "PRES": pres, "TEMP": temp, "PSAL": psal,
+    }
+    for name in ("PRES", "TEMP", "PSAL"):
+        point[f"{name}_QC"] = np.ones(n, dtype=np.int32)
+        point[f"{name}_ERROR"] = np.full(n, 0.01)
+    point["POSITION_QC"] = np.ones(n, dtype=np.int32)
+    point["TIME_QC"] = np.ones(n, dtype=np.int32)
+    return xr.Dataset({k: ("N_POINTS", v) for k, v in point.items()},
+                      coords={"N_POINTS": np.arange(n), "LATITUDE": ("N_POINTS", lat[profile]),
+                              "LONGITUDE": ("N_POINTS", lon[profile]), "TIME": ("N_POINTS", times[profile])})
+
+
+def argo_record(float_id: int, n_cycles: int = 100, n_levels: int = 500, **options) -> FloatRecord:
+    """:func:`argo_dataset` as the :class:`records.FloatRecord` the store holds."""
+    return FloatRecord.from_xarray(argo_dataset(float_id, n_cycles, n_levels, **options), float_id=float_id)
+
+
+class SyntheticBackend:
+    """
+    Fetch backend serving :func:`argo_dataset` floats, a stand-in for argopy's
+    ``DataFetcher``. Each call sleeps ``latency`` seconds first, like a
+    request to the Argo servers.
+    """
+
+    def __init__(self, n_cycles: int = 100, n_levels: int = 500, latency: float = 0.0):
+        self.n_cycles = n_cycles
+        self.n_levels = n_levels
+        self.latency = latency
+
+    def fetch(self, float_id: int):
+        if self.latency:
+            time.sleep(self.latency)
+        return argo_dataset(float_id, self.n_cycles, self.n_levels)
+
+    def fetch_since(self, float_id: int, after=None, position=None):
+        return newer_than(self.fetch(float_id), after)
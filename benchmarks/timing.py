@@ -0,0 +1,36 @@
+"""
+Timing helpers shared by the benchmark scripts.
+
+Times are the best of several calls, in milliseconds. Peak memory is the
+largest allocation traced by ``tracemalloc`` during one more call, made
+separately because tracing slows the code down.
+"""
+import time
+import tracemalloc
+
+
+def best_ms(fn, repeat: int = 1) -> float:
+    """Best wall time of ``repeat`` calls of ``fn``, in ms."""
+    timings = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def measure(fn, repeat: int = 1, warmup: bool = False):
+    """
+    ``(best ms, peak traced MB, result)`` of ``fn``, after one untimed call
+    if ``warmup``; ``result`` is what the traced call returned.
+    """
+    if warmup:
+        fn()
+    ms = best_ms(fn, repeat)
+    tracemalloc.start()
+    try:
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return ms, peak / 1e6, result
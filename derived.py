@@ -0,0 +1,214 @@
+"""
+Derived ocean variables: potential temperature and density, mixed-layer depth
+and upper-ocean heat content.
+
+Everything is computed for a whole float at once on the columnar arrays of a
+:class:`records.FloatRecord`, without loops over profiles. The TEOS-10
+``gsw`` package is used when it is installed; otherwise potential temperature
+and density come from the pure-NumPy EOS-80 (UNESCO) formulas, which agree
+with TEOS-10 to about 0.02 kg/m³ in σθ. Results are kept in ``derived_cache``
+by float ID and data version, so each float is computed once and shared by
+all sessions.
+"""
+import os
+
+import numpy as np
+
+from gridding import interpolate_points, sorted_points
+from profiling import span
+from utils import LRUCache
+
+DERIVED_CACHE_SIZE = int(os.environ.get("ARGO_DERIVED_CACHE_SIZE", 256))
+
+# Mixed layer: first depth below the reference level where σθ exceeds its
+# value there by the threshold (de Boyer Montégut et al., 2004)
+MLD_REFERENCE_DBAR = 10.0
+MLD_THRESHOLD = 0.03
+# Heat content of the upper 700 dbar, integrated on a 10 dbar grid
+OHC_DEPTH_DBAR = 700.0
+OHC_STEP_DBAR = 10.0
+# The shallowest sample may be this deep and still be extended to the surface
+OHC_SURFACE_GAP_DBAR = 20.0
+RHO0 = 1025.0  # kg/m³
+CP0 = 3991.86795711963  # J/(kg K), TEOS-10
+DBAR_TO_M = 1.0e4 / (RHO0 * 9.81)
+
+# Per-profile series: (name, unit)
+SERIES = {
+    "MLD": ("Mixed-layer depth", "dbar"),
+    "OHC": ("Heat content 0–700 dbar", "GJ/m²"),
+}
+
+
+def _gsw():
+    """The TEOS-10 ``gsw`` package if it is installed, else None."""
+    try:
+        import gsw
+    except ImportError:
+        return None
+    return gsw
+
+
+def _adiabatic_gradient(s, t, p):
+    """Adiabatic lapse rate (°C/dbar), UNESCO 1983; ``t`` in IPTS-68."""
+    ds = s - 35.0
+    return (((-2.1687e-16 * t + 1.8676e-14) * t - 4.6206e-13) * p
+            + ((2.7759e-12 * t - 1.1351e-10) * ds
+               + ((-5.4481e-14 * t + 8.733e-12) * t - 6.7795e-10) * t + 1.8741e-8)) * p \
+        + (-4.2393e-8 * t + 1.8932e-6) * ds \
+        + ((6.6228e-10 * t - 6.836e-8) * t + 8.5258e-6) * t + 3.5803e-5
+
+
+def potential_temperature_eos80(s, t, p, p_ref=0.0):
+    """Potential temperature (ITS-90) by the UNESCO 1983 Runge-Kutta scheme."""
+    t68 = t * 1.00024
+    h = p_ref - p
+    xk = h * _adiabatic_gradient(s, t68, p)
+    t68 = t68 + 0.5 * xk
+    q = xk
+    p = p + 0.5 * h
+    xk = h * _adiabatic_gradient(s, t68, p)
+    t68 = t68 + 0.29289322 * (xk - q)
+    q = 0.58578644 * xk + 0.121320344 * q
+    xk = h * _adiabatic_gradient(s, t68, p)
+    t68 = t68 + 1.707106781 * (xk - q)
+    q = 3.414213562 * xk - 4.121320344 * q
+    p = p + 0.5 * h
+    xk = h * _adiabatic_gradient(s, t68, p)
+    return (t68 + (xk - 2.0 * q) / 6.0) / 1.00024
+
+
+def surface_density_eos80(s, t):
+    """Seawater density (kg/m³) at zero pressure, UNESCO 1981; ``t`` in ITS-90."""
+    t = t * 1.00024
+    rho_w = (999.842594 + (6.793952e-2 + (-9.095290e-3 + (1.001685e-4 + (-1.120083e-6 + 6.536332e-9 * t)
+                                                             * t) * t) * t) * t)
+    a = 8.24493e-1 + (-4.0899e-3 + (7.6438e-5 + (-8.2467e-7 + 5.3875e-9 * t) * t) * t) * t
+    b = -5.72466e-3 + (1.0227e-4 - 1.6546e-6 * t) * t
+    return rho_w + a * s + b * s * np.sqrt(np.maximum(s, 0.0)) + 4.8314e-4 * s * s
+
+
+def potential_temperature_density(record):
+    """``(θ, σθ)`` for every point of ``record``: potential temperature (°C) and potential density − 1000 (kg/m³)."""
+    pres = record.pres.astype(np.float64)
+    temp = record.temp.astype(np.float64)
+    psal = record.psal.astype(np.float64)
+    gsw = _gsw()
+    if gsw is None:
+        theta = potential_temperature_eos80(psal, temp, pres)
+        return theta, surface_density_eos80(psal, theta) - 1000.0
+    counts = np.diff(record.offsets)
+    lat = np.nan_to_num(np.repeat(record.latitude.astype(np.float64), counts))
+    lon = np.nan_to_num(np.repeat(record.longitude.astype(np.float64), counts))
+    absolute_salinity = gsw.SA_from_SP(psal, pres, lon, lat)
+    conservative_temp = gsw.CT_from_t(absolute_salinity, temp, pres)
+    return gsw.pt0_from_t(absolute_salinity, temp, pres), gsw.sigma0(absolute_salinity, conservative_temp)
+
+
+def mixed_layer_depth(record, sigma0) -> np.ndarray:
+    """
+    Mixed-layer depth (dbar) of every profile from the σθ threshold criterion,
+    interpolated between the samples around the crossing. NaN where the
+    reference level is not sampled or the threshold is never crossed.
+    """
+    mld = np.full(record.n_profiles, np.nan, dtype=np.float32)
+    prof, pres, sigma = sorted_points(record, sigma0)
+    if not len(prof):
+        return mld
+    reference = interpolate_points(record.n_profiles, prof, pres, sigma, (MLD_REFERENCE_DBAR,))[:, 0]
+    threshold = reference[prof] + MLD_THRESHOLD
+    crossed = np.flatnonzero((pres > MLD_REFERENCE_DBAR) & (sigma > threshold))
+    if not len(crossed):
+        return mld
+    # First crossing of each profile
+    crossed = crossed[np.r_[True, prof[crossed][1:] != prof[crossed][:-1]]]
+    depth = pres[crossed]
+    above = crossed - 1
+    has_above = (crossed > 0) & (prof[np.maximum(above, 0)] == prof[crossed])
+    above = np.maximum(above, 0)
+    rise = sigma[crossed] - sigma[above]
+    fraction = np.where(has_above & (rise > 0), (threshold[crossed] - sigma[above]) / np.where(rise > 0, rise, 1), 1)
+    depth = np.where(has_above, pres[above] + np.clip(fraction, 0, 1) * (depth - pres[above]), depth)
+    mld[prof[crossed]] = np.maximum(depth, MLD_REFERENCE_DBAR)
+    return mld
+
+
+def heat_content(record, theta) -> np.ndarray:
+    """
+    Heat content of the upper :data:`OHC_DEPTH_DBAR` (J/m²) of every profile,
+    ρ0·cp0·∫θ dz with θ interpolated on a regular pressure grid. The shallowest
+    sample is extended to the surface if it is within
+    :data:`OHC_SURFACE_GAP_DBAR`; profiles that do not cover the layer are NaN.
+    """
+    levels = np.arange(0.0, OHC_DEPTH_DBAR + OHC_STEP_DBAR / 2, OHC_STEP_DBAR)
+    prof, pres, values = sorted_points(record, theta)
+    grid = interpolate_points(record.n_profiles, prof, pres, values, levels).astype(np.float64)
+    if not len(grid):
+        return np.zeros(0, dtype=np.float32)
+    # Shallowest sample of each profile, held constant up to the surface
+    first = np.flatnonzero(np.r_[True, prof[1:] != prof[:-1]]) if len(prof) else np.zeros(0, dtype=np.intp)
+    top = np.full(record.n_profiles, np.inf)
+    surface = np.full(record.n_profiles, np.nan)
+    top[prof[first]] = pres[first]
+    surface[prof[first]] = values[first]
+    fill = (levels[None, :] < top[:, None]) & (top[:, None] <= OHC_SURFACE_GAP_DBAR)
+    grid = np.where(fill, surface[:, None], grid)
+    integral = ((grid[:, 1:] + grid[:, :-1]) / 2).sum(axis=1) * OHC_STEP_DBAR * DBAR_TO_M
+    covered = np.isfinite(grid).all(axis=1)
+    return np.where(covered, RHO0 * CP0 * integral, np.nan).astype(np.float32)
+
+
+class DerivedFloat:
+    """
+    Derived variables of one float: ``theta`` and ``sigma0`` per point (aligned
+    with the record's ``pres``), ``mld`` (dbar) and ``ohc`` (J/m²) per profile.
+    """
+
+    __slots__ = ("float_id", "version", "theta", "sigma0", "mld", "ohc")
+
+    def __init__(self, record):
+        self.float_id = record.float_id
+        self.version = record.version
+        theta, sigma0 = potential_temperature_density(record)
+        self.theta = theta.astype(np.float32)
+        self.sigma0 = sigma0.astype(np.float32)
+        self.mld = mixed_layer_depth(record, sigma0)
+        self.ohc = heat_content(record, theta)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ("theta", "sigma0", "mld", "ohc"))
+
+    def series(self, variable: str) -> np.ndarray:
+        """Per-profile values for ``"MLD"`` (dbar) or ``"OHC"`` (GJ/m²)."""
+        if variable == "MLD":
+            return self.mld
+        if variable == "OHC":
+            return self.ohc / 1e9
+        raise ValueError(f"Unknown derived series {variable!r}")
+
+    def describe(self, variable: str, profiles=None) -> str:
+        """Short summary of a series over all profiles, or over the profile indices in ``profiles``."""
+        values = self.series(variable)
+        if profiles is not None:
+            values = values[profiles]
+        finite = values[np.isfinite(values)]
+        unit = SERIES[variable][1]
+        if not len(finite):
+            return "not available for these profiles (too shallow, or not sampled near the surface)"
+        return (f"latest {finite[-1]:.1f} {unit}, median {np.median(finite):.1f} {unit}, "
+                f"range {finite.min():.1f}–{finite.max():.1f} {unit} over {len(finite)} profiles")
+
+
+class DerivedCache(LRUCache):
+    """:class:`DerivedFloat` objects keyed by float ID and data version."""
+
+    def __init__(self, max_entries: int = DERIVED_CACHE_SIZE):
+        super().__init__(max_entries)
+
+    def get(self, record) -> DerivedFloat:
+        with span("derived", float_id=record.float_id) as s:
+            return self.get_or_build((record.float_id, record.version), lambda: DerivedFloat(record), s)
+
+
+derived_cache = DerivedCache()
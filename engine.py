@@ -0,0 +1,360 @@
+"""
+Headless chat engine: turns a chat message into a :class:`Response`.
+
+Nothing here touches Streamlit. ``app.py`` keeps a :class:`ChatState` per
+session, calls :func:`handle_message` and renders the response; ``replay.py``
+drives the same function from a log file.
+"""
+from typing import NamedTuple, Optional, Tuple
+
+from derived import SERIES, derived_cache
+from export import DEFAULT_VARIABLES, ExportError, export_floats
+from fetcher import FetchTimeout, FloatNotFound, get_cache
+from floats import indian_floats
+from nlp import (SPATIAL_INTENTS, ProfileRange, parse_area, parse_compare_mode, parse_export_format,
+                 parse_export_variables, parse_message, parse_range)
+from profiling import span
+from records import select_range
+from spatial import get_spatial_index
+from store import get_store
+from summary import get_summary_index
+
+VARIABLES = {"temperature": "TEMP", "salinity": "PSAL", "pressure": "PRES", "density": "SIGMA0"}
+# Derived values with one number per profile, plotted over time
+DERIVED_SERIES = {"mixed_layer": "MLD", "heat_content": "OHC"}
+COMPARE_PLOTS = {"profiles": "compare_floats_plot", "envelopes": "compare_floats_envelopes"}
+# Matches listed in a spatial reply and drawn on its map
+MAX_LISTED = 20
+MAX_MAPPED = 200
+
+KNOWLEDGE = {
+    "importance_temperature": (
+        "🌡️ **Temperature** is critical for understanding the ocean's heat content, "
+        "which influences currents, weather patterns, and climate change."),
+    "importance_salinity": (
+        "🧂 **Salinity** affects the density of seawater, driving ocean circulation "
+        "and influencing marine ecosystems."),
+    "importance_pressure": (
+        "⏱️ **Pressure** increases with depth and helps determine the density and "
+        "stability of ocean layers, critical for understanding deep-sea processes."),
+    "importance_argo": (
+        "🌊 **Argo data** is essential for monitoring global ocean conditions. "
+        "It provides free, high-quality temperature, salinity, and pressure profiles "
+        "from thousands of floats worldwide to support climate and weather research."),
+}
+
+HELP_TEXT = (
+    "Here’s what I can do:\n"
+    "- Ask about variables: 'temperature', 'salinity', 'pressure', 'density'\n"
+    "- Derived values over time: 'mixed layer depth 2903893', 'heat content 2903893'\n"
+    "- Show a float's 'trajectory' or 'info'\n"
+    "- Narrow a plot: 'temperature 2903893 last 10 cycles', 'trajectory 2902206 since 2024-01', "
+    "'salinity cycles 10-20'\n"
+    "- 'compare' two or more floats (e.g., 'compare 2903893 vs 2903892'; add 'mean' or 'envelope' "
+    "for per-level mean ± std on standard pressure levels)\n"
+    "- 'export' the data behind a plot: 'export 2903893 as parquet', "
+    "'download temperature 2902206 last 10 cycles as netcdf' (CSV by default)\n"
+    "- 'add float' to load new data\n"
+    "- 'list floats' to see what's loaded\n"
+    "- find floats: 'floats near 15N 70E', 'floats within 300 km of 12.5S 80E', "
+    "'floats in the Bay of Bengal', 'floats within 10-20N 60-70E' (add 'ever' to search whole tracks)\n"
+    "Tip: Include a float number like 2903893, or load exactly one float to avoid ambiguity."
+)
+
+SPATIAL_HELP_TEXT = (
+    "Tell me where to look, e.g. 'floats near 15N 70E', 'floats within 300 km of 12.5S 80E', "
+    "'floats in the Arabian Sea' or 'floats within 10-20N 60-70E'."
+)
+
+UNKNOWN_TEXT = (
+    "I didn't quite get that. You can say things like:\n"
+    "'temperature 2903893', 'trajectory', 'compare 2903893 2903892', 'info float 2903893', or 'help'."
+)
+
+
+class ChatState:
+    """Per-session conversation state: the loaded float IDs and whether a float ID is expected next."""
+
+    __slots__ = ("float_ids", "awaiting_float")
+
+    def __init__(self, float_ids=(), awaiting_float=False):
+        self.float_ids = list(float_ids)
+        self.awaiting_float = awaiting_float
+
+    def add(self, float_ids) -> None:
+        for fid in float_ids:
+            if fid not in self.float_ids:
+                self.float_ids.append(fid)
+
+    def default_float(self, float_ids):
+        """The float a message refers to: the first ID in it, else the only loaded float."""
+        if float_ids:
+            return float_ids[0]
+        return self.float_ids[0] if len(self.float_ids) == 1 else None
+
+
+class FigureSpec(NamedTuple):
+    """
+    A figure to show, described rather than built: ``plot`` names a function in
+    :mod:`visualizations` that is called with the floats in ``float_ids`` and
+    ``options``. ``key`` identifies the chart in the UI. With ``profiles``, the
+    plot only receives the profiles of each float within that range.
+    """
+    key: str
+    plot: str
+    float_ids: Tuple[int, ...]
+    options: Tuple[Tuple[str, object], ...] = ()
+    profiles: Optional[ProfileRange] = None
+
+    def build(self, store=None):
+        """Return ``[(key, figure)]``; plots that return several figures get one key each."""
+        import visualizations as viz
+        store = get_store() if store is None else store
+        plot = getattr(viz, self.plot)
+        args = (list(self.float_ids),) if self.plot in COMPARE_PLOTS.values() else ()
+        # The map only needs latest positions, which the summary table holds
+        data = (get_summary_index().describe(self.float_ids) if self.plot == "plot_map"
+                else store.view(self.float_ids))
+        if self.profiles is not None:
+            with span("select_range", selection=self.profiles.describe()):
+                data = {fid: record.take(select_range(record, self.profiles)) for fid, record in data.items()}
+        result = viz.cached_figure(plot, data, *args, **dict(self.options))
+        if isinstance(result, dict):
+            return [(f"{self.key}-{var}", fig) for var, fig in result.items()]
+        return [(self.key, result)]
+
+
+class Response(NamedTuple):
+    text: str
+    intent: str
+    float_ids: Tuple[int, ...] = ()
+    figures: Tuple[FigureSpec, ...] = ()
+    # Paths of files written for the user to download (exports)
+    files: Tuple[str, ...] = ()
+
+
+def _brief(row) -> str:
+    if not row.n_profiles:
+        return f"{row.float_id}: no profiles"
+    return (f"{row.float_id}: cycle {row.latest_cycle} on {row.latest_date or 'Unknown'}, "
+            f"{row.n_profiles} profiles")
+
+
+def _match_line(match) -> str:
+    where = f"({match.lat:.2f}, {match.lon:.2f})"
+    line = f"{match.float_id}: "
+    if match.distance_km is not None:
+        line += f"{match.distance_km:.0f} km, "
+    line += f"cycle {match.cycle} on {match.date or 'Unknown'} at {where}"
+    if match.n_positions > 1:
+        line += f" ({match.n_positions} positions)"
+    return line
+
+
+def find_floats(area):
+    """Cached floats matching a :class:`nlp.Area`, as :class:`spatial.SpatialMatch` rows."""
+    index = get_spatial_index()
+    cache = get_cache()
+    cached = cache.cached_ids()
+    index.backfill(cached, cache)
+    get_summary_index().backfill(cached, cache)
+    with span("spatial.query", kind=area.kind, track=area.track, floats=len(index)) as s:
+        if area.kind == "circle":
+            matches = index.near(area.lat, area.lon, area.radius_km, track=area.track)
+        else:
+            matches = index.within(area.south, area.north, area.west, area.east, track=area.track)
+        s.set(matches=len(matches))
+    return matches
+
+
+def load_float(state: ChatState, float_id, store=None):
+    """Load ``float_id`` into the session if needed; return an error message on failure."""
+    if float_id in state.float_ids:
+        return None
+    store = get_store() if store is None else store
+    try:
+        store.get(float_id)
+        state.add([float_id])
+    except FetchTimeout:
+        return f"Float {float_id} is taking too long to download. Please try again shortly."
+    except FloatNotFound:
+        return f"No Argo data found for float {float_id}. Please try another ID."
+    except Exception as e:
+        return f"Failed to load float {float_id} ({type(e).__name__}: {e})."
+    return None
+
+
+def handle_message(state: ChatState, text: str, store=None, cycle_opts=None,
+                   compare_mode: str = "profiles") -> Response:
+    """
+    Answer one chat message, updating ``state`` (loaded floats, pending
+    "add float" prompt). ``cycle_opts`` are the profile-selection keyword
+    arguments passed on to the profile and compare plots. ``compare_mode``
+    (``"profiles"`` or ``"envelopes"``) is used for comparisons whose message
+    does not ask for either.
+    """
+    store = get_store() if store is None else store
+    options = tuple(sorted((cycle_opts or {}).items()))
+    with span("parse") as s:
+        intent, float_numbers = parse_message(text)
+        s.set(intent=intent)
+    figures = []
+
+    def reply(message):
+        return Response(message, intent, float_numbers, tuple(figures))
+
+    if state.awaiting_float:
+        try:
+            float_id = int(text)
+        except ValueError:
+            return reply("Please enter a valid float number (integer).")
+        error = load_float(state, float_id, store)
+        if error:
+            return reply(error)
+        state.awaiting_float = False
+        return reply(f"Float {float_id} loaded. You can now ask: temperature, salinity, pressure, "
+                     "trajectory, info, or add float.")
+
+    if intent in KNOWLEDGE:
+        return reply(KNOWLEDGE[intent])
+
+    if intent == "export":
+        export_ids = list(float_numbers) or list(state.float_ids)
+        if not export_ids:
+            return reply("Please name the floats to export (e.g., 'export 2903893 as csv') or load some first.")
+        export_ids, failed = store.load_many(export_ids)
+        state.add(export_ids)
+        files = ()
+        response = "None of these floats could be loaded."
+        if export_ids:
+            selection = parse_range(text)
+            try:
+                result = export_floats(export_ids, parse_export_format(text) or "csv",
+                                       parse_export_variables(text) or DEFAULT_VARIABLES, selection, store)
+            except ExportError as e:
+                return reply(str(e))
+            files = (result.path,)
+            scope = f" Limited to {selection.describe()}." if selection else ""
+            response = f"{result.describe()}{scope} Download it below."
+        if failed:
+            response += f" Failed to load: {', '.join(map(str, failed))}."
+        return Response(response, intent, float_numbers, (), files)
+
+    if intent == "compare_floats":
+        compare_ids = list(float_numbers) if len(float_numbers) >= 2 else list(state.float_ids)
+        if len(compare_ids) < 2:
+            return reply("Please specify at least two float numbers to compare or add multiple floats "
+                         "from the sidebar.")
+        # Fetch any floats that are not loaded yet concurrently; a float
+        # that fails is reported instead of aborting the whole compare
+        compare_ids, failed = store.load_many(compare_ids)
+        state.add(compare_ids)
+        if len(compare_ids) >= 2:
+            mode = parse_compare_mode(text) or compare_mode
+            figures.append(FigureSpec(f"compare-{mode}-{'-'.join(map(str, compare_ids))}",
+                                      COMPARE_PLOTS[mode], tuple(compare_ids), options))
+            response = f"Comparing floats: {', '.join(map(str, compare_ids))}. See graphs below."
+            if mode == "envelopes":
+                response = (f"Comparing floats {', '.join(map(str, compare_ids))} on standard pressure "
+                            "levels: mean ± std with min/max per level. See graphs below.")
+        else:
+            response = "Not enough floats could be loaded to compare."
+        if failed:
+            response += f" Failed to load: {', '.join(map(str, failed))}."
+        return reply(response)
+
+    if intent in SPATIAL_INTENTS:
+        area = parse_area(text)
+        if area is None:
+            return reply(SPATIAL_HELP_TEXT)
+        matches = find_floats(area)
+        scope = "tracks pass" if area.track else "latest positions are"
+        if not matches:
+            return reply(f"No cached floats whose {scope} {area.describe()}. "
+                         "Load more floats or widen the search.")
+        lines = [f"{len(matches)} float{'s' if len(matches) != 1 else ''} whose {scope} {area.describe()}:"]
+        lines += [f"- {_match_line(m)}" for m in matches[:MAX_LISTED]]
+        if len(matches) > MAX_LISTED:
+            lines.append(f"...and {len(matches) - MAX_LISTED} more.")
+        mapped = tuple(m.float_id for m in matches[:MAX_MAPPED])
+        figures.append(FigureSpec("spatial-map", "plot_map", mapped))
+        return reply("\n".join(lines))
+
+    if intent == "float_info":
+        fid = state.default_float(float_numbers)
+        if fid is None:
+            return reply("Please specify which float you want info for (e.g., 'info float 2903893'), "
+                         "or load exactly one float.")
+        # Answered from the summary table, which also knows floats loaded by earlier sessions
+        row = get_summary_index().describe([fid], store if fid in state.float_ids else None).get(fid)
+        if row is None:
+            return reply(f"Float {fid} not loaded yet. Please add it first.")
+        return reply(row.describe())
+
+    if intent in VARIABLES or intent in DERIVED_SERIES or intent == "trajectory":
+        fid = state.default_float(float_numbers)
+        if fid is None:
+            example = {"trajectory": "trajectory", "mixed_layer": "mixed layer", "heat_content": "heat content"}
+            return reply(f"Please specify the float number (e.g., '{example.get(intent, 'temperature')} 2903893') "
+                         "or load exactly one float.")
+        # Auto-load if explicit float provided but not yet loaded
+        error = load_float(state, fid, store)
+        if error:
+            return reply(error)
+        selection = parse_range(text)
+        profiles = None
+        scope = ""
+        if selection is not None:
+            profiles = select_range(store.get(fid), selection)
+            if not len(profiles):
+                return reply(f"Float {fid} has no profiles for {selection.describe()}.")
+            scope = f" ({selection.describe()}: {len(profiles)} profiles)"
+        if intent == "trajectory":
+            figures.append(FigureSpec(f"traj-{fid}", "plot_trajectories", (fid,), profiles=selection))
+            return reply(f"{'Trajectory' if selection else 'Full trajectory'} for float {fid}{scope} displayed.")
+        if intent in DERIVED_SERIES:
+            var = DERIVED_SERIES[intent]
+            figures.append(FigureSpec(f"series-{fid}-{var}", "plot_float_series", (fid,),
+                                      tuple(sorted(dict(options, variable=var).items())), selection))
+            summary = derived_cache.get(store.get(fid)).describe(var, profiles)
+            return reply(f"{SERIES[var][0]} for float {fid}{scope} displayed: {summary}.")
+        var = VARIABLES[intent]
+        figures.append(FigureSpec(f"profile-{fid}-{var}", "plot_float_profiles", (fid,),
+                                  tuple(sorted(dict(options, variable=var).items())), selection))
+        return reply(f"{intent.capitalize()} profile for float {fid}{scope} displayed.")
+
+    if intent == "ask_float":
+        state.awaiting_float = True
+        return reply("Please type the float number you want to add.")
+
+    if intent == "greeting":
+        return reply("Hello! You can ask about Argo floats or type a float number to get started.")
+
+    if intent == "thanks":
+        return reply("You're welcome! 🌊")
+
+    if intent == "help":
+        return reply(HELP_TEXT)
+
+    if intent == "list_floats":
+        index = get_summary_index()
+        index.backfill(indian_floats, get_cache())
+        loaded = index.describe(state.float_ids, store)
+        curated = [fid for fid in indian_floats if fid not in state.float_ids]
+        known = index.describe(curated)
+        lines = []
+        if state.float_ids:
+            lines.append("Loaded floats: " + ", ".join(map(str, state.float_ids)))
+            lines += [f"- {_brief(row)}" for row in loaded.values()]
+        else:
+            lines.append("No floats loaded yet. Use the sidebar or type 'add float' to load one.")
+        if curated:
+            # Curated floats nobody has loaded yet have no summary row
+            lines.append("Also available: " + ", ".join(map(str, curated)))
+            lines += [f"- {_brief(known[fid])}" if fid in known else f"- {fid}: not loaded yet" for fid in curated]
+        return reply("\n".join(lines))
+
+    if intent == "goodbye":
+        return reply("Goodbye! If you need me again, just send a message. 👋")
+
+    return reply(UNKNOWN_TEXT)
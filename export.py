@@ -0,0 +1,283 @@
+"""
+Streaming export of float data to Parquet, CSV or NetCDF.
+
+:func:`export_floats` writes one row per measurement: the float, cycle, date
+and position of its profile, then the chosen variables. Floats are read one
+at a time from the store, where cached floats are memory-mapped. Each float
+is cut into chunks of whole profiles of about ``ARGO_EXPORT_CHUNK_ROWS`` rows,
+and each chunk is appended to the file before the next is read. Nothing
+larger than a chunk is built (CSV goes through a pandas frame per chunk), so
+memory stays flat however many floats are exported.
+Potential temperature and density are computed per chunk. Files are written
+under ``ARGO_EXPORT_DIR`` and only appear there once complete; each export
+first removes the ones older than ``ARGO_EXPORT_TTL`` seconds, then the oldest
+until the directory fits ``ARGO_EXPORT_MAX_BYTES``.
+
+Parquet needs ``pyarrow``; NetCDF uses ``netCDF4`` from the requirements.
+"""
+import datetime
+import os
+import tempfile
+import time
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from derived import potential_temperature_density
+from fetcher import NETCDF_LOCK
+from profiling import span
+from records import select_range
+from store import get_store
+
+EXPORT_DIR = os.environ.get(
+    "ARGO_EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exports"),
+)
+EXPORT_CHUNK_ROWS = int(os.environ.get("ARGO_EXPORT_CHUNK_ROWS", 100_000))
+EXPORT_TTL = float(os.environ.get("ARGO_EXPORT_TTL", 24 * 3600))
+EXPORT_MAX_BYTES = int(os.environ.get("ARGO_EXPORT_MAX_BYTES", 1024 ** 3))
+FORMATS = {"parquet": ".parquet", "csv": ".csv", "netcdf": ".nc"}
+# Per-profile columns, repeated on every row of the profile
+PROFILE_COLUMNS = ("PLATFORM_NUMBER", "CYCLE_NUMBER", "TIME", "LATITUDE", "LONGITUDE")
+# Exportable measurement variables and their units; PTEMP and SIGMA0 are derived
+EXPORT_VARIABLES = {
+    "PRES": "dbar",
+    "TEMP": "degree_Celsius",
+    "PSAL": "psu",
+    "PTEMP": "degree_Celsius",
+    "SIGMA0": "kg/m3",
+}
+DEFAULT_VARIABLES = ("PRES", "TEMP", "PSAL")
+# Argo dates are days since this epoch
+REFERENCE_DATE = np.datetime64("1950-01-01T00:00:00", "s")
+
+
+class ExportError(Exception):
+    """An export that cannot be written: unknown format or variable, or a missing library."""
+
+
+class ExportResult(NamedTuple):
+    path: str
+    format: str
+    float_ids: Tuple[int, ...]
+    rows: int
+    nbytes: int
+
+    def describe(self) -> str:
+        floats = ", ".join(map(str, self.float_ids))
+        return (f"Exported {self.rows} rows from float{'s' if len(self.float_ids) != 1 else ''} {floats} "
+                f"to {os.path.basename(self.path)} ({self.nbytes / 1e6:.1f} MB).")
+
+
+def chunks(records, variables=DEFAULT_VARIABLES, selection=None, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    ``{column: array}`` chunks of the floats in ``records`` (an iterable of
+    :class:`records.FloatRecord`), limited to the profiles within
+    ``selection`` (an :class:`nlp.ProfileRange`) if given. A chunk holds whole
+    profiles and about ``chunk_rows`` rows; a longer profile is a chunk of its
+    own.
+    """
+    for record in records:
+        profiles = np.arange(record.n_profiles) if selection is None else select_range(record, selection)
+        counts = np.diff(record.offsets)[profiles]
+        group = (np.cumsum(counts) - counts) // max(chunk_rows, 1)
+        cuts = np.flatnonzero(np.r_[True, group[1:] != group[:-1], True]) if len(profiles) else [0]
+        for lo, hi in zip(cuts[:-1], cuts[1:]):
+            yield _columns(record.take(profiles[lo:hi]), variables)
+
+
+def _columns(record, variables):
+    counts = np.diff(record.offsets)
+    columns = {
+        "PLATFORM_NUMBER": np.full(record.n_points, -1 if record.float_id is None else int(record.float_id),
+                                   dtype=np.int32),
+        "CYCLE_NUMBER": np.repeat(record.cycle, counts),
+        "TIME": np.repeat(record.juld, counts),
+        "LATITUDE": np.repeat(record.latitude, counts),
+        "LONGITUDE": np.repeat(record.longitude, counts),
+    }
+    derived = None
+    for name in variables:
+        if name in ("PTEMP", "SIGMA0"):
+            if derived is None:
+                derived = dict(zip(("PTEMP", "SIGMA0"), potential_temperature_density(record)))
+            columns[name] = derived[name].astype(np.float32)
+        else:
+            columns[name] = getattr(record, name.lower())
+    return columns
+
+
+class _CsvWriter:
+    def __init__(self, path, variables):
+        self.file = open(path, "w", newline="")
+        self.file.write(",".join(PROFILE_COLUMNS + tuple(variables)) + "\n")
+
+    def write(self, columns):
+        # A frame over one chunk only, for pandas' fast CSV formatting
+        import pandas as pd
+        time = np.datetime_as_string(columns["TIME"], unit="s")
+        time[np.isnat(columns["TIME"])] = ""
+        pd.DataFrame(dict(columns, TIME=time), copy=False).to_csv(self.file, header=False, index=False)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, variables):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow); "
+                              "try CSV or NetCDF instead.") from None
+        self.pa = pa
+        self.schema = pa.schema(
+            [("PLATFORM_NUMBER", pa.int32()), ("CYCLE_NUMBER", pa.int32()), ("TIME", pa.timestamp("s")),
+             ("LATITUDE", pa.float32()), ("LONGITUDE", pa.float32())]
+            + [(name, pa.float32()) for name in variables])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, columns):
+        arrays = [self.pa.array(values, type=field.type, from_pandas=True)
+                  for field, values in zip(self.schema, columns.values())]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class _NetcdfWriter:
+    # netCDF-C calls hold fetcher's NETCDF_LOCK, as the fetch pool, warm-up and
+    # prefetch read and write cache files meanwhile; never across store.get
+    def __init__(self, path, variables):
+        try:
+            import netCDF4
+        except ImportError:
+            raise ExportError("NetCDF export needs netCDF4 (pip install netCDF4); try CSV instead.") from None
+        with NETCDF_LOCK:
+            self.ds = netCDF4.Dataset(path, "w")
+            self.ds.createDimension("N_POINTS", None)
+            self.ds.createVariable("PLATFORM_NUMBER", "i4", ("N_POINTS",))
+            self.ds.createVariable("CYCLE_NUMBER", "i4", ("N_POINTS",))
+            time = self.ds.createVariable("TIME", "f8", ("N_POINTS",), fill_value=np.nan)
+            time.units = "days since 1950-01-01 00:00:00"
+            time.calendar = "standard"
+            for name, units in (("LATITUDE", "degree_north"), ("LONGITUDE", "degree_east")):
+                self.ds.createVariable(name, "f4", ("N_POINTS",), fill_value=np.nan).units = units
+            for name in variables:
+                self.ds.createVariable(name, "f4", ("N_POINTS",), fill_value=np.nan).units = EXPORT_VARIABLES[name]
+            self.ds.history = f"Exported by the Argo chatbot on {datetime.date.today().isoformat()}"
+        self.rows = 0
+
+    def write(self, columns):
+        n = len(columns["TIME"])
+        days = (columns["TIME"] - REFERENCE_DATE).astype("timedelta64[s]").astype(np.float64) / 86400.0
+        columns = dict(columns, TIME=np.where(np.isnat(columns["TIME"]), np.nan, days))
+        with NETCDF_LOCK:
+            for name, values in columns.items():
+                self.ds[name][self.rows:self.rows + n] = values
+        self.rows += n
+
+    def close(self):
+        with NETCDF_LOCK:
+            self.ds.close()
+
+
+WRITERS = {"csv": _CsvWriter, "parquet": _ParquetWriter, "netcdf": _NetcdfWriter}
+
+
+def cleanup_exports(directory: str = EXPORT_DIR, ttl: float = EXPORT_TTL,
+                    max_bytes: int = EXPORT_MAX_BYTES, keep=()) -> list:
+    """
+    Delete exports in ``directory`` older than ``ttl`` seconds, then the oldest
+    until the rest fit ``max_bytes`` (either check is skipped when None).
+    Leftover temporary files of failed exports go after ``ttl`` too. Paths in
+    ``keep`` are never deleted. Returns the deleted paths.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        path = os.path.abspath(os.path.join(directory, name))
+        exported = name.startswith("argo-") and name.endswith(tuple(FORMATS.values()))
+        partial = name.startswith(".export-") and name.endswith(".tmp")
+        if path in keep or not (exported or partial):
+            continue
+        try:
+            st_ = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st_.st_mtime, st_.st_size, path, partial))
+    now = time.time()
+    total = sum(size for mtime, size, path, partial in entries if not partial)
+    total += sum(os.path.getsize(path) for path in keep if os.path.exists(path))
+    deleted = []
+    for mtime, size, path, partial in sorted(entries):
+        expired = ttl is not None and now - mtime > ttl
+        over = not partial and max_bytes is not None and total > max_bytes
+        if not (expired or over):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        if not partial:
+            total -= size
+        deleted.append(path)
+    return deleted
+
+
+def export_floats(float_ids, fmt: str = "csv", variables=DEFAULT_VARIABLES, selection=None, store=None,
+                  path: str = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> ExportResult:
+    """
+    Write the floats in ``float_ids`` to ``path`` (default: a new file in
+    :data:`EXPORT_DIR`) as ``fmt`` (``"csv"``, ``"parquet"`` or ``"netcdf"``),
+    streaming chunk by chunk. Floats are read through ``store`` (default: the
+    process-wide store); raises :class:`ExportError` for an unknown format or
+    variable or a missing writer library.
+    """
+    store = get_store() if store is None else store
+    if fmt not in WRITERS:
+        raise ExportError(f"Unknown export format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    variables = tuple(dict.fromkeys(variables))
+    unknown = [name for name in variables if name not in EXPORT_VARIABLES]
+    if unknown:
+        raise ExportError(f"Cannot export {', '.join(unknown)}; choose from {', '.join(EXPORT_VARIABLES)}.")
+    float_ids = tuple(dict.fromkeys(float_ids))
+    if path is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        name = "-".join(map(str, float_ids)) if len(float_ids) <= 3 else f"{len(float_ids)}-floats"
+        path = os.path.join(EXPORT_DIR, f"argo-{name}-{stamp}{FORMATS[fmt]}")
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = os.path.join(EXPORT_DIR, f"argo-{name}-{stamp}-{n}{FORMATS[fmt]}")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    with span("export", floats=len(float_ids), format=fmt) as s:
+        # Written next to the target and renamed when complete, like the float cache
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".export-", suffix=".tmp")
+        os.close(fd)
+        rows = 0
+        try:
+            writer = WRITERS[fmt](tmp, variables)
+            try:
+                for columns in chunks((store.get(fid) for fid in float_ids), variables, selection, chunk_rows):
+                    writer.write(columns)
+                    rows += len(columns["TIME"])
+            finally:
+                writer.close()
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        s.set(rows=rows)
+    if directory == os.path.abspath(EXPORT_DIR):
+        cleanup_exports(directory, keep=[path])
+    return ExportResult(path, fmt, float_ids, rows, os.path.getsize(path))
@@ -1,9 +1,611 @@
-from argopy import DataFetcher
-import xarray as xr
-import streamlit as st
-
-@st.cache_data
-def fetch_float_data(float_id: int) -> xr.Dataset:
-    ArgoSet = DataFetcher().float([float_id])
-    ds = ArgoSet.load().to_xarray()
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+from profiling import enabled as profiling_enabled, span
+from records import RECORD_VARIABLES, FloatRecord
+
+# Defaults can be overridden per deployment through the environment.
+CACHE_DIR = os.environ.get(
+    "ARGO_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "floats"),
+)
+CACHE_TTL = float(os.environ.get("ARGO_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_BYTES = int(os.environ.get("ARGO_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+OFFLINE = os.environ.get("ARGO_OFFLINE", "").lower() in ("1", "true", "yes")
+FETCH_WORKERS = int(os.environ.get("ARGO_FETCH_WORKERS", 4))
+FETCH_TIMEOUT = float(os.environ.get("ARGO_FETCH_TIMEOUT", 120))
+FETCH_RETRIES = int(os.environ.get("ARGO_FETCH_RETRIES", 3))
+# Search radius growth (degrees per day since the last profile) for incremental refreshes
+REFRESH_DRIFT_DEG_PER_DAY = float(os.environ.get("ARGO_REFRESH_DRIFT", 0.1))
+# Past this half-width (degrees) a region request downloads more than the float
+# itself, so the refresh fetches the whole float instead
+REFRESH_MAX_MARGIN_DEG = float(os.environ.get("ARGO_REFRESH_MAX_MARGIN", 5.0))
+
+# xarray (and pandas under it) is imported where NetCDF files are read or
+# written: serving memory-mapped records never needs it, which keeps it off
+# the app's startup path.
+# The netCDF-C library is not thread-safe, and concurrent fetches writing
+# cache files at once crash the process: files are read and written one at a
+# time, here and in every other module that opens NetCDF files (exports).
+# Downloads still overlap.
+NETCDF_LOCK = threading.Lock()
+
+
+def _time_name(ds) -> str:
+    return "JULD" if "JULD" in ds else "TIME"
+
+
+def latest(ds):
+    """``(time, (lat, lon))`` of the last measurement in ``ds``, or ``(None, None)``."""
+    if ds is None or not ds.sizes.get("N_POINTS"):
+        return None, None
+    times = np.asarray(ds[_time_name(ds)].values)
+    i = int(np.argmax(times))
+    position = (float(ds["LATITUDE"].values[i]), float(ds["LONGITUDE"].values[i]))
+    return np.datetime64(times[i], "s"), position
+
+
+def newer_than(ds, after):
+    """Points of ``ds`` measured strictly after ``after`` (None if there are none)."""
+    if ds is not None and after is not None:
+        times = np.asarray(ds[_time_name(ds)].values)
+        ds = ds.isel(N_POINTS=np.flatnonzero(times > np.datetime64(after, "ns")))
+    if ds is None or not ds.sizes.get("N_POINTS"):
+        return None
     return ds
+
+
+def region_boxes(lat: float, lon: float, margin: float):
+    """
+    ``[west, east, south, north]`` boxes covering ``margin`` degrees around
+    ``(lat, lon)``: two boxes when the square crosses the antimeridian, so
+    longitudes wrap around instead of being cut off at ±180.
+    """
+    south, north = max(lat - margin, -90.0), min(lat + margin, 90.0)
+    if margin >= 180.0:
+        return [[-180.0, 180.0, south, north]]
+    west = (lon - margin + 180.0) % 360.0 - 180.0
+    east = (lon + margin + 180.0) % 360.0 - 180.0
+    if west <= east:
+        return [[west, east, south, north]]
+    return [[west, 180.0, south, north], [-180.0, east, south, north]]
+
+
+def append_points(ds, new):
+    """``ds`` followed by the points of ``new``, renumbered along ``N_POINTS``."""
+    if new is None:
+        return ds
+    import xarray as xr
+    merged = xr.concat([ds, new], dim="N_POINTS", data_vars="all", coords="all",
+                       compat="override", join="outer", combine_attrs="override")
+    return merged.assign_coords(N_POINTS=np.arange(merged.sizes["N_POINTS"]))
+
+
+class FetchError(Exception):
+    """Raised when a float cannot be obtained from the backend or the cache."""
+
+
+class OfflineCacheMiss(FetchError):
+    """Raised in offline mode when a float is not available on disk."""
+
+
+class FloatNotFound(FetchError):
+    """Raised when the backend has no data for a float ID."""
+
+
+class FetchTimeout(FetchError):
+    """Raised when a float did not arrive within the request timeout."""
+
+
+class ArgopyBackend:
+    """Download float datasets from the Argo servers through argopy."""
+
+    def __init__(self, timeout: float = FETCH_TIMEOUT):
+        self.timeout = timeout
+
+    def fetch(self, float_id: int):
+        import argopy
+        from argopy.errors import DataNotFound
+        try:
+            with argopy.set_options(api_timeout=self.timeout):
+                ArgoSet = argopy.DataFetcher().float([float_id])
+                return ArgoSet.load().to_xarray()
+        except DataNotFound as e:
+            raise FloatNotFound(f"No Argo data for float {float_id}") from e
+
+    def fetch_since(self, float_id: int, after=None, position=None):
+        """
+        Points of ``float_id`` measured after ``after`` (None if there are none).
+
+        argopy float requests cannot be restricted in time, so this issues a
+        region request from ``after`` until now in a box around the last known
+        ``(lat, lon)`` position, widened with the elapsed time to cover the
+        float's drift, and keeps this float's points. A box that crosses the
+        antimeridian is split in two; once the box would be wider than
+        ``ARGO_REFRESH_MAX_MARGIN`` degrees either side, the whole float is
+        fetched instead, which is then the smaller download.
+        """
+        if after is None or position is None or not np.isfinite(position).all():
+            return newer_than(self.fetch(float_id), after)
+        after = np.datetime64(after, "s")
+        now = np.datetime64("now", "s")
+        days = max(float((now - after) / np.timedelta64(1, "D")), 0.0)
+        margin = 1.0 + REFRESH_DRIFT_DEG_PER_DAY * days
+        if margin > REFRESH_MAX_MARGIN_DEG:
+            return newer_than(self.fetch(float_id), after)
+        import argopy
+        from argopy.errors import DataNotFound
+        lat, lon = (float(v) for v in position)
+        window = [0, 10000, str(after + np.timedelta64(1, "s")), str(now + np.timedelta64(1, "D"))]
+        new = None
+        for box in region_boxes(lat, lon, margin):
+            try:
+                with argopy.set_options(api_timeout=self.timeout):
+                    ds = argopy.DataFetcher().region(box + window).load().to_xarray()
+            except DataNotFound:
+                continue
+            platform = np.asarray(ds["PLATFORM_NUMBER"].values).astype(np.int64)
+            part = newer_than(ds.isel(N_POINTS=np.flatnonzero(platform == int(float_id))), after)
+            new = part if new is None else append_points(new, part)
+        return new
+
+
+class DirectoryBackend:
+    """
+    Serve float datasets from ``<root>/<float_id>.nc``.
+    Local stand-in for argopy, useful for tests and offline demos.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def fetch(self, float_id: int):
+        path = os.path.join(self.root, f"{int(float_id)}.nc")
+        if not os.path.exists(path):
+            raise FloatNotFound(f"Float {float_id} not found in {self.root}")
+        import xarray as xr
+        with NETCDF_LOCK:
+            return xr.load_dataset(path)
+
+    def fetch_since(self, float_id: int, after=None, position=None):
+        return newer_than(self.fetch(float_id), after)
+
+
+class FloatCache:
+    """
+    Persistent on-disk cache of float datasets, one NetCDF file per float ID.
+
+    Entries older than ``ttl`` seconds are re-fetched from the backend (a stale
+    copy is still served if that fails). Once the directory grows past
+    ``max_bytes`` the least recently used files are evicted. In ``offline`` mode
+    the backend is never called and only files already on disk are served.
+
+    :meth:`record` serves floats as :class:`records.FloatRecord` objects. The
+    first read of a cached file keeps a columnar copy in ``<float_id>.columns/``
+    (one ``.npy`` file per column, tagged with the NetCDF file it came from);
+    later reads memory-map it, so loading a float costs almost nothing and each
+    request only pages in the columns it uses.
+    """
+
+    def __init__(self, backend=None, cache_dir: str = CACHE_DIR, ttl: float = CACHE_TTL,
+                 max_bytes: int = CACHE_MAX_BYTES, offline: bool = OFFLINE):
+        self.backend = backend if backend is not None else ArgopyBackend()
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, float_id: int) -> str:
+        return os.path.join(self.cache_dir, f"{int(float_id)}.nc")
+
+    def columns_path(self, float_id: int) -> str:
+        return os.path.join(self.cache_dir, f"{int(float_id)}.columns")
+
+    def is_fresh(self, float_id: int) -> bool:
+        path = self.path(float_id)
+        if not os.path.exists(path):
+            return False
+        return self.ttl is None or time.time() - os.path.getmtime(path) < self.ttl
+
+    def has(self, float_id: int) -> bool:
+        """True if :meth:`get` would be served from disk without the backend."""
+        if self.offline:
+            return os.path.exists(self.path(float_id))
+        return self.is_fresh(float_id)
+
+    def get(self, float_id: int):
+        path = self.path(float_id)
+        if self.has(float_id):
+            return self._read(path)
+        if self.offline:
+            raise OfflineCacheMiss(f"Float {float_id} is not cached and offline mode is on")
+        if os.path.exists(path) and hasattr(self.backend, "fetch_since"):
+            # Stale copy: only fetch the cycles that came in since
+            cached = self._read(path)
+            try:
+                return self.update(float_id, cached=cached)[0]
+            except Exception:
+                return cached
+        try:
+            ds = self.backend.fetch(float_id)
+        except Exception:
+            if os.path.exists(path):
+                # Serve the stale copy rather than failing outright
+                return self._read(path)
+            raise
+        self.put(float_id, ds)
+        return ds
+
+    def record(self, float_id: int) -> FloatRecord:
+        """:meth:`get` as a :class:`records.FloatRecord`, memory-mapped when served from disk."""
+        if self.has(float_id):
+            return self.read_record(float_id)
+        return FloatRecord.from_xarray(self.get(float_id), float_id=float_id)
+
+    def read_record(self, float_id: int) -> FloatRecord:
+        """
+        The cached copy of ``float_id`` as a memory-mapped record, whatever its
+        age; the backend is never called. The columnar copy is (re)built, reading
+        only :data:`records.RECORD_VARIABLES` from the NetCDF file, when it is
+        missing or was made from an older file.
+        """
+        path = self.path(float_id)
+        with span("cache.read_record", float_id=float_id) as s:
+            source = self._source(path)
+            self._touch(path)
+            record = self._open_columns(float_id, source)
+            if record is not None:
+                s.set(columns="hit")
+                return record
+            s.set(columns="miss")
+            record = FloatRecord.from_xarray(self._read(path, RECORD_VARIABLES), float_id=float_id)
+            if self._source(path) == source:
+                self._write_columns(float_id, record, source)
+                # Serve the mapped copy so the decoded arrays can be freed
+                record = self._open_columns(float_id, source) or record
+            return record
+
+    def update(self, float_id: int, after=None, position=None, cached=None):
+        """
+        Fetch only the data newer than what is cached for ``float_id`` and append
+        it to the cached file. Returns ``(dataset, new)``: the full updated
+        dataset (None if nothing was cached) and just the new points (None if
+        there were none). ``after`` and ``position`` default to the time and
+        position of the last cached measurement; a float that is not cached is
+        fetched in full. When the file is already newer than ``after`` (another
+        store or worker refreshed it), only what follows the file is fetched and
+        appended, and ``new`` also holds the cached points after ``after``.
+        """
+        if self.offline:
+            raise OfflineCacheMiss(f"Cannot refresh float {float_id} in offline mode")
+        path = self.path(float_id)
+        if cached is None and os.path.exists(path):
+            cached = self._read(path)
+        if cached is None:
+            # Nothing on disk to append to: fetch the whole float
+            ds = self.backend.fetch(float_id)
+            self.put(float_id, ds)
+            return ds, newer_than(ds, after)
+        newest, last_position = latest(cached)
+        since = after
+        if newest is not None and (since is None or newest > np.datetime64(since, "s")):
+            since, position = newest, last_position
+        if hasattr(self.backend, "fetch_since"):
+            new = self.backend.fetch_since(float_id, since, position)
+        else:
+            new = newer_than(self.backend.fetch(float_id), since)
+        if new is not None:
+            ds = append_points(cached, new)
+            self.put(float_id, ds)
+        else:
+            ds = cached
+            os.utime(path)  # checked just now: fresh again
+        if after is not None and since is not after:
+            new = newer_than(ds, after)
+        return ds, new
+
+    def put(self, float_id: int, ds) -> None:
+        """Write ``ds`` atomically: readers only ever see a complete file."""
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{int(float_id)}-", suffix=".tmp")
+        os.close(fd)
+        try:
+            with NETCDF_LOCK:
+                ds.to_netcdf(tmp)
+            os.replace(tmp, self.path(float_id))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._drop_columns(float_id)
+        self.evict()
+
+    def invalidate(self, float_id: int) -> None:
+        try:
+            os.remove(self.path(float_id))
+        except FileNotFoundError:
+            pass
+        self._drop_columns(float_id)
+
+    def cached_ids(self):
+        return sorted(int(name[:-3]) for name in os.listdir(self.cache_dir)
+                      if name.endswith(".nc") and name[:-3].isdigit())
+
+    def size_bytes(self) -> int:
+        return sum(self._entry_bytes(fid) for fid in self.cached_ids())
+
+    def evict(self) -> list:
+        """Drop least recently used files until the cache fits ``max_bytes``."""
+        if self.max_bytes is None:
+            return []
+        entries = []
+        for fid in self.cached_ids():
+            st_ = os.stat(self.path(fid))
+            entries.append((st_.st_atime, self._entry_bytes(fid), fid))
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for _, size, fid in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.invalidate(fid)
+            total -= size
+            evicted.append(fid)
+        return evicted
+
+    def _read(self, path: str, variables=None):
+        """The dataset at ``path``; with ``variables``, only those of them it has are read."""
+        import xarray as xr
+        self._touch(path)
+        with NETCDF_LOCK:
+            if variables is None:
+                return xr.load_dataset(path)
+            # Decoding happens at open time for some variables (strings), so open
+            # undecoded and decode just the selection
+            with xr.open_dataset(path, decode_cf=False) as raw:
+                return xr.decode_cf(raw[[name for name in variables if name in raw.variables]]).load()
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        # Bump the access time explicitly; many filesystems mount with noatime
+        st_ = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), st_.st_mtime_ns))
+
+    @staticmethod
+    def _source(path: str):
+        """Identity of the file at ``path``: rewrites replace it, so they get a new inode."""
+        st_ = os.stat(path)
+        return st_.st_ino, st_.st_size
+
+    def _entry_bytes(self, float_id: int) -> int:
+        size = os.path.getsize(self.path(float_id))
+        directory = self.columns_path(float_id)
+        if os.path.isdir(directory):
+            size += sum(entry.stat().st_size for entry in os.scandir(directory))
+        return size
+
+    def _open_columns(self, float_id: int, source):
+        directory = self.columns_path(float_id)
+        try:
+            if tuple(np.load(os.path.join(directory, "source.npy")).tolist()) != source:
+                return None
+            return FloatRecord.open(directory, float_id=float_id)
+        except (OSError, ValueError):
+            # Missing, half-removed or unreadable: rebuilt from the NetCDF file
+            return None
+
+    def _write_columns(self, float_id: int, record: FloatRecord, source) -> None:
+        """Publish a columnar copy of ``record`` atomically (a directory rename)."""
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=f".{int(float_id)}-columns-")
+        try:
+            record.save(tmp)
+            np.save(os.path.join(tmp, "source.npy"), np.array(source, dtype=np.int64))
+            self._drop_columns(float_id)
+            os.replace(tmp, self.columns_path(float_id))
+        except OSError:
+            # Another reader published one first; the NetCDF file is still there
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _drop_columns(self, float_id: int) -> None:
+        # Records that already mapped these files keep reading them until released
+        shutil.rmtree(self.columns_path(float_id), ignore_errors=True)
+
+
+class FetchCoordinator:
+    """
+    Process-wide front door to the float cache.
+
+    Concurrent requests for the same float ID share one in-flight load
+    (single-flight), so simultaneous sessions trigger a single download.
+    Transient backend errors are retried with full-jitter exponential backoff;
+    :class:`FetchError` subclasses (not found, offline miss) are not retried.
+    ``stats`` counts requests, disk hits, merged requests, downloads, incremental
+    refreshes, retries, failures and timeouts.
+    """
+
+    def __init__(self, cache: FloatCache = None, max_workers: int = FETCH_WORKERS,
+                 timeout: float = FETCH_TIMEOUT, retries: int = FETCH_RETRIES,
+                 backoff: float = 1.0, max_backoff: float = 30.0):
+        self.cache = cache if cache is not None else FloatCache()
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = dict.fromkeys(
+            ["requests", "hits", "merged", "downloads", "refreshes", "retries", "failures", "timeouts"], 0)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="argo-fetch")
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def submit(self, float_id: int):
+        """Return a future for ``float_id``, joining an in-flight load if there is one."""
+        fid = int(float_id)
+        with self._lock:
+            self.stats["requests"] += 1
+            future = self._inflight.get(fid)
+            if future is not None:
+                self.stats["merged"] += 1
+                return future
+            self.stats["hits" if self.cache.has(fid) else "downloads"] += 1
+            future = self._pool.submit(self._load, fid)
+            self._inflight[fid] = future
+            return future
+
+    def fetch(self, float_id: int, timeout: float = None) -> FloatRecord:
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            with span("fetch", float_id=float_id) as s:
+                if profiling_enabled():
+                    s.set(disk_cache="hit" if self.cache.has(float_id) else "miss")
+                return self.submit(float_id).result(timeout=timeout)
+        except FutureTimeout:
+            self._bump("timeouts")
+            raise FetchTimeout(f"Float {float_id} did not load within {timeout:g}s") from None
+
+    def refresh(self, float_id: int, after=None, position=None):
+        """
+        Return a future for :meth:`FloatCache.update` of ``float_id``: only data
+        newer than ``after`` is fetched. Concurrent refreshes of a float share one call.
+        """
+        fid = int(float_id)
+        key = ("refresh", fid)
+        with self._lock:
+            self.stats["refreshes"] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["merged"] += 1
+                return future
+            future = self._pool.submit(self._retrying, key, lambda: self.cache.update(fid, after, position))
+            self._inflight[key] = future
+            return future
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Stop the worker pool: queued loads are cancelled, and loads already
+        running finish in the background unless ``wait``. Later submissions fail.
+        """
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _load(self, fid: int) -> FloatRecord:
+        return self._retrying(fid, lambda: self.cache.record(fid))
+
+    def _retrying(self, key, call):
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return call()
+                except FetchError:
+                    self._bump("failures")
+                    raise
+                except Exception:
+                    if attempt >= self.retries:
+                        self._bump("failures")
+                        raise
+                    attempt += 1
+                    self._bump("retries")
+                    delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                    time.sleep(random.uniform(0, delay))
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator() -> FetchCoordinator:
+    """Process-wide coordinator built from the environment defaults."""
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = FetchCoordinator()
+        return _coordinator
+
+
+def get_cache() -> FloatCache:
+    return get_coordinator().cache
+
+
+def set_cache(cache: FloatCache) -> None:
+    """
+    Swap the process-wide cache, e.g. for a :class:`DirectoryBackend`. The
+    previous coordinator is shut down so its worker threads do not linger.
+    """
+    global _coordinator
+    with _coordinator_lock:
+        previous, _coordinator = _coordinator, FetchCoordinator(cache)
+    if previous is not None:
+        previous.shutdown()
+
+
+def fetch_float_data(float_id: int) -> FloatRecord:
+    return get_coordinator().fetch(float_id)
+
+
+def fetch_many(float_ids, timeout: float = None, on_progress=None):
+    """
+    Fetch several floats concurrently through the coordinator's bounded pool.
+
+    Returns ``(results, errors)``: ``{float_id: FloatRecord}`` for the floats that
+    loaded and ``{float_id: exception}`` for the ones that did not, so one bad
+    float never fails the whole batch. ``on_progress(float_id, done, total, error)``
+    is called as each float finishes.
+    """
+    coordinator = get_coordinator()
+    ids = list(dict.fromkeys(float_ids))
+    return _gather(coordinator, {coordinator.submit(fid): fid for fid in ids}, timeout, on_progress)
+
+
+def refresh_many(latest_by_id, timeout: float = None, on_progress=None):
+    """
+    Incrementally refresh several floats concurrently.
+
+    ``latest_by_id`` maps float IDs to the ``(time, (lat, lon))`` of the newest
+    data already held, or ``(None, None)`` to use the cached file. Returns
+    ``(results, errors)`` like :func:`fetch_many`, where each result is the
+    ``(dataset, new)`` pair of :meth:`FloatCache.update`.
+    """
+    coordinator = get_coordinator()
+    futures = {coordinator.refresh(fid, after, position): fid
+               for fid, (after, position) in latest_by_id.items()}
+    return _gather(coordinator, futures, timeout, on_progress)
+
+
+def _gather(coordinator, futures, timeout, on_progress):
+    timeout = coordinator.timeout if timeout is None else timeout
+    results, errors = {}, {}
+    total = len(futures)
+    done = 0
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            fid = futures[future]
+            error = future.exception()
+            if error is None:
+                results[fid] = future.result()
+            else:
+                errors[fid] = error
+            done += 1
+            if on_progress is not None:
+                on_progress(fid, done, total, error)
+    except FutureTimeout:
+        for future, fid in futures.items():
+            if not future.done():
+                coordinator._bump("timeouts")
+                errors[fid] = FetchTimeout(f"Float {fid} did not load within {timeout:g}s")
+                done += 1
+                if on_progress is not None:
+                    on_progress(fid, done, total, errors[fid])
+    return results, errors
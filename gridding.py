@@ -0,0 +1,149 @@
+"""
+Profiles interpolated onto standard pressure levels, and per-level statistics.
+
+:func:`interpolate` grids every profile of a float in one batched NumPy
+operation: the points are sorted by ``(profile, pressure)``, turned into a
+single sorted key array and all ``(profile, level)`` pairs are located with one
+``searchsorted``, so there is no Python loop over cycles. That pays off most on
+the typical 70-500 level profiles (about 5x and 2x faster than ``np.interp``
+per profile, per ``benchmarks/bench_gridding.py``); at 1000 levels the sort
+dominates and both take about as long. Gridded floats are
+kept in ``grid_cache`` by float ID and data version; comparisons then only
+reduce small ``(profiles, levels)`` arrays into :class:`Envelope` rows.
+"""
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from profiling import span
+from utils import LRUCache
+
+# Standard pressure levels (dbar), close to the usual Argo climatology levels
+STANDARD_LEVELS = (0.0, 5.0, 10.0, 20.0, 30.0, 50.0, 75.0, 100.0, 125.0, 150.0, 200.0, 250.0, 300.0,
+                   400.0, 500.0, 600.0, 700.0, 800.0, 900.0, 1000.0, 1100.0, 1200.0, 1300.0, 1400.0,
+                   1500.0, 1750.0, 2000.0)
+GRID_VARIABLES = {"TEMP": "temp", "PSAL": "psal"}
+GRID_CACHE_SIZE = int(os.environ.get("ARGO_GRID_CACHE_SIZE", 256))
+
+
+def interpolate(record, variable: str, levels=STANDARD_LEVELS) -> np.ndarray:
+    """
+    ``(n_profiles, n_levels)`` float32 array of ``variable`` linearly
+    interpolated in pressure onto ``levels``. Levels outside a profile's
+    sampled pressure range are NaN (no extrapolation).
+    """
+    values = getattr(record, GRID_VARIABLES[variable])
+    return interpolate_points(record.n_profiles, *sorted_points(record, values), levels)
+
+
+def interpolate_points(n_profiles, prof, pres, values, levels=STANDARD_LEVELS) -> np.ndarray:
+    """:func:`interpolate` for points already ordered by :func:`sorted_points`."""
+    levels = np.asarray(levels, dtype=np.float64)
+    out = np.full((n_profiles, len(levels)), np.nan, dtype=np.float32)
+    if not len(prof):
+        return out
+    # One key per point ordering by profile, then pressure within the profile
+    low = min(pres.min(), levels.min())
+    scale = max(pres.max(), levels.max()) - low + 1.0
+    keys = prof * scale + (pres - low)
+    query_prof = np.repeat(np.arange(n_profiles), len(levels))
+    queries = query_prof * scale + np.tile(levels - low, n_profiles)
+
+    j = np.searchsorted(keys, queries, side="left")
+    n = len(keys)
+    exact = j < n
+    exact[exact] = keys[j[exact]] == queries[exact]
+    if n > 1:
+        k = np.clip(j, 1, n - 1)
+        lo, hi = keys[k - 1], keys[k]
+        inside = (prof[k - 1] == query_prof) & (prof[k] == query_prof) & (lo < queries) & (queries < hi)
+        weight = (queries - lo) / np.where(hi > lo, hi - lo, 1.0)
+        result = np.where(inside, values[k - 1] + weight * (values[k] - values[k - 1]), np.nan)
+    else:
+        result = np.full(len(queries), np.nan)
+    result[exact] = values[j[exact]]
+    out[:] = result.reshape(n_profiles, len(levels))
+    return out
+
+
+def sorted_points(record, values):
+    """
+    ``(profile index, pressure, value)`` float64 columns of the points of
+    ``record`` where both pressure and ``values`` are finite, ordered by
+    profile and then by pressure within each profile.
+    """
+    ok = np.isfinite(record.pres) & np.isfinite(values)
+    prof = record.profile_ids()[ok]
+    pres = record.pres[ok].astype(np.float64)
+    values = np.asarray(values)[ok].astype(np.float64)
+    if not len(prof):
+        return prof, pres, values
+    # Profiles are stored as ascending or descending runs, which a stable
+    # (merge) sort of one combined key handles far faster than a lexsort
+    keys = prof * (pres.max() - pres.min() + 1.0) + (pres - pres.min())
+    order = np.argsort(keys, kind="stable")
+    return prof[order], pres[order], values[order]
+
+
+class Envelope(NamedTuple):
+    """Per-level statistics over a float's gridded profiles; NaN where ``count`` is 0."""
+    levels: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    count: np.ndarray
+
+
+def envelope(grid: np.ndarray, levels=STANDARD_LEVELS) -> Envelope:
+    """Mean, standard deviation, min and max of every column of ``grid``."""
+    finite = np.isfinite(grid)
+    count = finite.sum(axis=0)
+    has = count > 0
+    safe = np.where(finite, grid, 0.0).astype(np.float64)
+    mean = np.where(has, safe.sum(axis=0) / np.maximum(count, 1), np.nan)
+    spread = np.where(finite, grid - mean, 0.0)
+    std = np.where(has, np.sqrt((spread ** 2).sum(axis=0) / np.maximum(count, 1)), np.nan)
+    low = np.where(has, np.where(finite, grid, np.inf).min(axis=0, initial=np.inf), np.nan)
+    high = np.where(has, np.where(finite, grid, -np.inf).max(axis=0, initial=-np.inf), np.nan)
+    return Envelope(np.asarray(levels, dtype=np.float64), mean, std, low, high, count)
+
+
+class GriddedFloat:
+    """One float's profiles on standard levels: ``grids[variable]`` is ``(n_profiles, n_levels)``."""
+
+    __slots__ = ("float_id", "version", "levels", "grids")
+
+    def __init__(self, record, levels=STANDARD_LEVELS):
+        self.float_id = record.float_id
+        self.version = record.version
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.grids = {var: interpolate(record, var, levels) for var in GRID_VARIABLES}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(grid.nbytes for grid in self.grids.values())
+
+    def envelope(self, variable: str, profiles=None) -> Envelope:
+        """Statistics over all profiles, or over the profile indices in ``profiles``."""
+        grid = self.grids[variable]
+        return envelope(grid if profiles is None else grid[profiles], self.levels)
+
+
+class GridCache(LRUCache):
+    """
+    :class:`GriddedFloat` objects keyed by float ID, data version and levels,
+    so a float is gridded again only when it gets new data.
+    """
+
+    def __init__(self, max_entries: int = GRID_CACHE_SIZE):
+        super().__init__(max_entries)
+
+    def get(self, record, levels=STANDARD_LEVELS) -> GriddedFloat:
+        key = (record.float_id, record.version, tuple(levels))
+        with span("grid", float_id=record.float_id) as s:
+            return self.get_or_build(key, lambda: GriddedFloat(record, levels), s)
+
+
+grid_cache = GridCache()
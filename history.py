@@ -0,0 +1,73 @@
+"""
+Bounded chat history of one session.
+
+Messages are kept as small :class:`Message` tuples: the text and the
+:class:`engine.FigureSpec` of each figure the reply showed, not the figures
+themselves. Re-displaying a past reply rebuilds its figures through
+``visualizations.figure_cache``, so a figure still in the cache costs a JSON
+decode. Only the last ``limit`` messages are kept, and the UI only renders
+the last page or pages of them, so a long session neither grows without
+bound nor slows down every rerun.
+"""
+import os
+from collections import deque
+from typing import NamedTuple, Tuple
+
+from engine import FigureSpec
+
+HISTORY_LIMIT = int(os.environ.get("ARGO_HISTORY_LIMIT", 200))  # messages kept per session
+HISTORY_PAGE = int(os.environ.get("ARGO_HISTORY_PAGE", 10))  # messages rendered per page
+
+
+class Message(NamedTuple):
+    """
+    One chat message; ``seq`` numbers messages in the session and keys their
+    charts. ``files`` are paths of files offered for download (exports).
+    """
+    seq: int
+    role: str
+    text: str
+    figures: Tuple[FigureSpec, ...] = ()
+    files: Tuple[str, ...] = ()
+
+    def chart_key(self, key: str) -> str:
+        """Chart key of figure ``key`` in this message, unique across the history."""
+        return f"msg{self.seq}-{key}"
+
+
+class ChatHistory:
+    """
+    The last ``limit`` messages of a session, oldest first, rendered
+    ``page_size`` at a time from the newest.
+    """
+
+    def __init__(self, limit: int = HISTORY_LIMIT, page_size: int = HISTORY_PAGE):
+        self.page_size = max(page_size, 1)
+        self._messages = deque(maxlen=max(limit, 1))
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    @property
+    def dropped(self) -> int:
+        """Messages that fell off the front of the history."""
+        return self._seq - len(self._messages)
+
+    def append(self, role: str, text: str, figures=(), files=()) -> Message:
+        message = Message(self._seq, role, text, tuple(figures), tuple(files))
+        self._seq += 1
+        self._messages.append(message)
+        return message
+
+    def pages(self) -> int:
+        """Number of pages the kept messages fill."""
+        return -(-len(self._messages) // self.page_size)
+
+    def recent(self, pages: int = 1):
+        """The last ``pages`` pages of messages, oldest first."""
+        n = min(max(pages, 1) * self.page_size, len(self._messages))
+        return [self._messages[i] for i in range(len(self._messages) - n, len(self._messages))]
@@ -1,5 +1,163 @@
 # nlp.py
+import datetime
 import re
+from typing import List, NamedTuple, Optional, Tuple
+
+
+# Word-bounded variants of short keywords ("temp" but not "temperature")
+TEMP_WORD = "temp@word"
+SAL_WORD = "sal@word"
+NEAR_WORD = "near@word"
+_WORD_FEATURES = {TEMP_WORD: "temp", SAL_WORD: "sal", NEAR_WORD: "near"}
+
+_KNOWLEDGE = ("info", "what is", "tell me about", "why")
+
+# Named sea areas for "floats in the Bay of Bengal": (south, north, west, east)
+# in degrees; longitudes run eastwards from west to east, so west > east
+# crosses the dateline. Rough boxes, not exact basin outlines.
+REGIONS = {
+    "bay of bengal": (5.0, 23.0, 80.0, 95.0),
+    "arabian sea": (0.0, 25.0, 51.0, 77.0),
+    "andaman sea": (5.0, 17.0, 92.0, 99.0),
+    "laccadive sea": (6.0, 14.0, 71.0, 78.0),
+    "red sea": (12.0, 30.0, 32.0, 44.0),
+    "gulf of aden": (10.0, 16.0, 43.0, 52.0),
+    "gulf of oman": (22.0, 26.5, 56.0, 62.0),
+    "persian gulf": (23.0, 30.5, 47.5, 57.0),
+    "mozambique channel": (-26.0, -10.0, 33.0, 50.0),
+    "equatorial indian ocean": (-10.0, 10.0, 40.0, 100.0),
+    "southern indian ocean": (-60.0, -10.0, 20.0, 147.0),
+    "indian ocean": (-60.0, 30.0, 20.0, 147.0),
+    "south china sea": (0.0, 23.0, 99.0, 121.0),
+    "north pacific": (0.0, 60.0, 120.0, -110.0),
+    "south pacific": (-60.0, 0.0, 150.0, -70.0),
+    "pacific ocean": (-60.0, 60.0, 120.0, -70.0),
+    "north atlantic": (0.0, 65.0, -80.0, 0.0),
+    "south atlantic": (-60.0, 0.0, -70.0, 20.0),
+    "atlantic ocean": (-60.0, 65.0, -80.0, 20.0),
+    "mediterranean sea": (30.0, 46.0, -6.0, 36.0),
+    "southern ocean": (-90.0, -60.0, -180.0, 180.0),
+}
+_REGION_NAMES = tuple(REGIONS)
+
+# Intent rules in priority order; the first rule that matches wins. A rule is a
+# list of phrase groups and matches when every group has at least one phrase
+# occurring in the lowercased text (plain substring match, as in the original
+# if-chain).
+INTENT_RULES = [
+    # Help / capabilities
+    ("help", [("help", "what can you do", "how to use", "commands", "options")]),
+    # Export the data behind a plot; ahead of the variable words it may name
+    ("export", [("export", "download", "save as", "data behind")]),
+    # Spatial queries over all cached floats; ahead of "which floats" and trajectory words.
+    # Only taken when the message names a place and no float (see IntentEngine)
+    ("floats_near", [("float",), (NEAR_WORD, "nearest", "nearby", "close to", "closest to")]),
+    ("floats_in_region", [("float",), ("within", "inside", "region", "bounding box") + _REGION_NAMES]),
+    # List loaded floats
+    ("list_floats", [("which floats", "loaded floats", "list floats", "show floats", "what floats")]),
+    # Highest-priority: explicit float info
+    ("float_info", [("float",), ("info", "details", "about", "summary", "status")]),
+    # Comparisons (allow without explicit numbers; numbers are handled downstream)
+    ("compare_floats", [("compare", " vs ", " versus ", "difference between")]),
+    # Knowledge/info requests (e.g., "info regarding temp", "what is salinity")
+    ("importance_temperature", [_KNOWLEDGE, ("temperature", TEMP_WORD)]),
+    ("importance_salinity", [_KNOWLEDGE, ("salinity", SAL_WORD, "psal")]),
+    ("importance_pressure", [_KNOWLEDGE, ("pressure", "pres")]),
+    ("importance_argo", [_KNOWLEDGE, ("argo",)]),
+    # Derived variables; ahead of "heat" and "temperature" below
+    ("heat_content", [("heat content", "ohc")]),
+    ("mixed_layer", [("mixed layer", "mixed-layer", "mld")]),
+    ("density", [("density", "sigma")]),
+    # Variable/profile queries
+    ("temperature", [("temperature profile", "temp profile", "temp data", "temperature", "temp", "heat")]),
+    ("salinity", [("salinity", "psal", " sal ")]),
+    ("pressure", [("pressure", "pres", "depth profile", "depth data")]),
+    # Trajectory
+    ("trajectory", [("trajectory", "path", "track", "route", "map", "position", "location", "where is")]),
+    # Add float
+    ("ask_float", [("add float", "load float", "include float", "add another float")]),
+    # Greetings / Thanks
+    ("greeting", [("hello", "hi", "hey", "good morning", "good evening")]),
+    ("thanks", [("thanks", "thank you")]),
+    ("goodbye", [("bye", "goodbye", "see you")]),
+    # Specific knowledge phrasing
+    ("importance_temperature", [("importance of temperature",)]),
+    ("importance_salinity", [("importance of salinity",)]),
+    ("importance_pressure", [("importance of pressure",)]),
+    ("importance_argo", [("why argo", "importance of argo", "why argo data")]),
+]
+
+SPATIAL_INTENTS = ("floats_near", "floats_in_region")
+
+FLOAT_ID_PATTERN = r"\b\d{6,8}\b"
+_FLOAT_ID_RE = re.compile(FLOAT_ID_PATTERN)
+
+
+class Parse(NamedTuple):
+    intent: str
+    float_ids: Tuple[int, ...]
+
+
+class IntentEngine:
+    """
+    :data:`INTENT_RULES` prepared once and tried in priority order, like the
+    original if-chain: plain phrases are substring checks and the
+    word-bounded ones (``"temp@word"``) precompiled patterns.
+
+    The rules of :data:`SPATIAL_INTENTS` only need "float" and a common word
+    such as "near" or "within", so they are passed over unless
+    :func:`parse_area` finds a place in the message and it names no float ID.
+    """
+
+    def __init__(self, rules=INTENT_RULES):
+        self.rules = [(name, tuple(_compile_group(group) for group in groups)) for name, groups in rules]
+
+    def parse(self, text: str) -> Parse:
+        text_lower = text.lower()
+        float_ids = tuple(int(f) for f in _FLOAT_ID_RE.findall(text))
+        for name, groups in self.rules:
+            for phrases, words in groups:
+                for phrase in phrases:
+                    if phrase in text_lower:
+                        break
+                else:
+                    for search in words:
+                        if search(text_lower):
+                            break
+                    else:
+                        break  # no phrase of this group: next rule
+            else:
+                if name in SPATIAL_INTENTS and (float_ids or parse_area(text) is None):
+                    continue
+                return Parse(name, float_ids)
+        return Parse("unknown", float_ids)
+
+    def parse_many(self, texts) -> List[Parse]:
+        """Parse a batch; repeated messages are only parsed once."""
+        seen = {}
+        results = []
+        for text in texts:
+            parsed = seen.get(text)
+            if parsed is None:
+                parsed = seen[text] = self.parse(text)
+            results.append(parsed)
+        return results
+
+
+def _compile_group(group):
+    """``(plain phrases, search functions of the word-bounded ones)`` of one phrase group."""
+    phrases = tuple(p for p in group if p not in _WORD_FEATURES)
+    words = tuple(re.compile(r"\b%s\b" % re.escape(_WORD_FEATURES[p])).search for p in group if p in _WORD_FEATURES)
+    return phrases, words
+
+
+_engine = IntentEngine()
+
+
+def parse_message(text: str) -> Parse:
+    """Intent and float IDs (6-8 digit numbers) of one message."""
+    return _engine.parse(text)
+
 
 def predict_intent(text: str) -> str:
     """
@@ -8,105 +166,310 @@ def predict_intent(text: str) -> str:
     - comparisons (with or without explicit float numbers)
     - info/knowledge requests about temperature, salinity, pressure, Argo
     - synonyms like "temp", "sal", "psal", "pres", and trajectory variants
+    The rules live in INTENT_RULES and are prepared once by IntentEngine.
+    """
+    return _engine.parse(text).intent
+
+
+def predict_intents(texts) -> List[str]:
+    """Batch version of :func:`predict_intent`."""
+    return [p.intent for p in _engine.parse_many(texts)]
+
+
+DEFAULT_RADIUS_KM = 500.0
+KM_PER_DEGREE = 111.195
+_RADIUS_UNITS = {"km": 1.0, "kilomet": 1.0, "mi": 1.609344, "nm": 1.852, "nautical": 1.852, "deg": KM_PER_DEGREE}
+
+_NUM = r"[-+]?\d+(?:\.\d+)?"
+_DEG = r"\s*°?\s*"
+# Latitude range, longitude range, single hemisphere-tagged coordinate, or
+# "lat 15" / "lon 70"; ranges come first so "10-20N" is not read as 10 and -20
+_COORD_RE = re.compile(
+    rf"(?P<lat0>{_NUM}){_DEG}(?P<h0>[ns])?\s*(?:-|–|to)\s*(?P<lat1>{_NUM}){_DEG}(?P<h1>[ns])\b"
+    rf"|(?P<lon0>{_NUM}){_DEG}(?P<h2>[ew])?\s*(?:-|–|to)\s*(?P<lon1>{_NUM}){_DEG}(?P<h3>[ew])\b"
+    rf"|(?P<value>{_NUM}){_DEG}(?P<hemi>[nsew])\b"
+    rf"|\b(?P<axis>lat(?:itude)?|lon(?:g(?:itude)?)?)\b\s*[:=]?\s*(?P<plain>{_NUM})"
+)
+_PAIR_RE = re.compile(rf"(?P<lat>{_NUM})\s*,\s*(?P<lon>{_NUM})")
+_RADIUS_RE = re.compile(
+    rf"(?P<radius>{_NUM})\s*(?P<unit>km|kilomet(?:er|re)s?|nautical miles?|nmi|nm|miles?|mi|degrees?|deg)\b")
+_REGION_RE = re.compile(r"\b(" + "|".join(sorted(map(re.escape, REGIONS), key=len, reverse=True)) + r")\b")
+_TRACK_RE = re.compile(r"\b(ever|tracks?|trajector(?:y|ies)|pass(?:ed|es)?|visited|been|history)\b")
+
+
+class Area(NamedTuple):
+    """
+    Where a spatial query looks: a ``"circle"`` of ``radius_km`` around
+    ``(lat, lon)`` or a ``"box"`` (``west > east`` crosses the dateline).
+    ``track`` asks about whole trajectories instead of latest positions.
+    """
+    kind: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    radius_km: Optional[float] = None
+    south: Optional[float] = None
+    north: Optional[float] = None
+    west: Optional[float] = None
+    east: Optional[float] = None
+    name: Optional[str] = None
+    track: bool = False
+
+    def describe(self) -> str:
+        """Phrase for chat replies, e.g. "within 500 km of 15.00°N, 70.00°E"."""
+        if self.kind == "circle":
+            return f"within {self.radius_km:.0f} km of {_fmt_lat(self.lat)}, {_fmt_lon(self.lon)}"
+        box = (f"{_fmt_lat(self.south)} to {_fmt_lat(self.north)}, "
+               f"{_fmt_lon(self.west)} to {_fmt_lon(self.east)}")
+        return f"in the {self.name.title().replace(' Of ', ' of ')} ({box})" if self.name else f"in {box}"
+
+
+def parse_area(text: str) -> Optional[Area]:
+    """
+    The place a spatial query refers to, or None. Understands points such as
+    "15N 70E", "12.5°S, 80°E", "lat 15 lon 70" or "(15, 70)" with an optional
+    radius ("within 300 km", "200 nm", "100 miles", "2 degrees"; default
+    :data:`DEFAULT_RADIUS_KM`), boxes given as ranges ("10-20N 60-70E") or two
+    corners ("10N 60E to 20N 70E"), and the names in :data:`REGIONS`.
     """
     text_lower = text.lower()
+    track = bool(_TRACK_RE.search(text_lower))
+    lats, lons = [], []
+    lat_range = lon_range = None
+    for m in _COORD_RE.finditer(text_lower):
+        if m.group("lat0") is not None:
+            lat_range = (_signed(m.group("lat0"), m.group("h0") or m.group("h1")),
+                         _signed(m.group("lat1"), m.group("h1")))
+        elif m.group("lon0") is not None:
+            lon_range = (_signed(m.group("lon0"), m.group("h2") or m.group("h3")),
+                         _signed(m.group("lon1"), m.group("h3")))
+        elif m.group("value") is not None:
+            (lats if m.group("hemi") in "ns" else lons).append(_signed(m.group("value"), m.group("hemi")))
+        else:
+            (lats if m.group("axis").startswith("lat") else lons).append(float(m.group("plain")))
+    if not (lats or lons or lat_range or lon_range):
+        pair = _PAIR_RE.search(text_lower)
+        if pair:
+            lats.append(float(pair.group("lat")))
+            lons.append(float(pair.group("lon")))
+    if lat_range is None and len(lats) >= 2:
+        lat_range = tuple(lats[:2])
+    if lon_range is None and len(lons) >= 2:
+        lon_range = tuple(lons[:2])
 
-    # Help / capabilities
-    if (
-        "help" in text_lower
-        or "what can you do" in text_lower
-        or "how to use" in text_lower
-        or "commands" in text_lower
-        or "options" in text_lower
-    ):
-        return "help"
+    if lat_range and lon_range:
+        south, north = sorted(lat_range)
+        if south < -90 or north > 90:
+            return None
+        return Area("box", south=south, north=north, west=_wrap(lon_range[0]), east=_wrap(lon_range[1]),
+                    track=track)
+    if lats and lons:
+        if abs(lats[0]) > 90:
+            return None
+        radius = _RADIUS_RE.search(text_lower)
+        radius_km = DEFAULT_RADIUS_KM
+        if radius:
+            unit = next(scale for prefix, scale in _RADIUS_UNITS.items() if radius.group("unit").startswith(prefix))
+            radius_km = abs(float(radius.group("radius"))) * unit
+        return Area("circle", lat=lats[0], lon=_wrap(lons[0]), radius_km=radius_km, track=track)
+    region = _REGION_RE.search(text_lower)
+    if region:
+        south, north, west, east = REGIONS[region.group(1)]
+        return Area("box", south=south, north=north, west=west, east=east, name=region.group(1), track=track)
+    return None
 
-    # List loaded floats
-    if (
-        "which floats" in text_lower
-        or "loaded floats" in text_lower
-        or "list floats" in text_lower
-        or "show floats" in text_lower
-        or "what floats" in text_lower
-    ):
-        return "list_floats"
 
-    # Highest-priority: explicit float info
-    if (
-        ("float" in text_lower and "info" in text_lower)
-        or ("details" in text_lower and "float" in text_lower)
-        or ("about" in text_lower and "float" in text_lower)
-        or ("summary" in text_lower and "float" in text_lower)
-        or ("status" in text_lower and "float" in text_lower)
-    ):
-        return "float_info"
+def _signed(value, hemisphere) -> float:
+    value = float(value)
+    return -value if hemisphere in ("s", "w") else value
 
-    # Comparisons (allow without explicit numbers; numbers are handled downstream)
-    if (
-        "compare" in text_lower
-        or " vs " in text_lower
-        or " versus " in text_lower
-        or "difference between" in text_lower
-    ):
-        return "compare_floats"
 
-    # Knowledge/info requests (e.g., "info regarding temp", "what is salinity")
-    if (
-        "info" in text_lower
-        or "what is" in text_lower
-        or "tell me about" in text_lower
-        or "why" in text_lower
-    ):
-        if ("temperature" in text_lower) or re.search(r"\btemp\b", text_lower):
-            return "importance_temperature"
-        if ("salinity" in text_lower) or re.search(r"\bsal\b", text_lower) or ("psal" in text_lower):
-            return "importance_salinity"
-        if ("pressure" in text_lower) or ("pres" in text_lower):
-            return "importance_pressure"
-        if "argo" in text_lower:
-            return "importance_argo"
+def _wrap(lon) -> float:
+    # 180 stays 180 so boxes like 170E-180E keep their meaning
+    return lon if -180 <= lon <= 180 else (lon + 180) % 360 - 180
 
-    # Variable/profile queries
-    if any(k in text_lower for k in [
-        "temperature profile", "temp profile", "temp data", "temperature", "temp", "heat"
-    ]):
-        return "temperature"
-    if any(k in text_lower for k in ["salinity", "psal", " sal "]):
-        return "salinity"
-    if any(k in text_lower for k in ["pressure", "pres", "depth profile", "depth data"]):
-        return "pressure"
 
-    # Trajectory
-    if any(k in text_lower for k in [
-        "trajectory", "path", "track", "route", "map", "position", "location", "where is"
-    ]):
-        return "trajectory"
+def _fmt_lat(lat) -> str:
+    return f"{abs(lat):.2f}°{'S' if lat < 0 else 'N'}"
 
-    # Add float
-    if (
-        "add float" in text_lower
-        or "load float" in text_lower
-        or "include float" in text_lower
-        or "add another float" in text_lower
-    ):
-        return "ask_float"
 
-    # Greetings / Thanks
-    if any(k in text_lower for k in ["hello", "hi", "hey", "good morning", "good evening"]):
-        return "greeting"
-    if any(k in text_lower for k in ["thanks", "thank you"]):
-        return "thanks"
-    if any(k in text_lower for k in ["bye", "goodbye", "see you"]):
-        return "goodbye"
+def _fmt_lon(lon) -> str:
+    return f"{abs(lon):.2f}°{'W' if lon < 0 else 'E'}"
 
-    # Specific knowledge phrasing
-    if "importance of temperature" in text_lower:
-        return "importance_temperature"
-    if "importance of salinity" in text_lower:
-        return "importance_salinity"
-    if "importance of pressure" in text_lower:
-        return "importance_pressure"
-    if "why argo" in text_lower or "importance of argo" in text_lower or "why argo data" in text_lower:
-        return "importance_argo"
-
-    return "unknown"
+
+_MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+# Every number must end where the date does, so a float ID such as "from
+# 2900001" is not read as the year 2900
+_DATE = (r"(?:(?P<{p}y>\d{{4}})(?!\d)(?:-(?P<{p}m>\d{{1,2}})(?!\d)(?:-(?P<{p}d>\d{{1,2}})(?!\d))?)?"
+         r"|(?P<{p}mon>" + "|".join(_MONTHS) + r")[a-z]*\.?\s+(?P<{p}my>\d{{4}})(?!\d))")
+_LATEST_RE = re.compile(r"\b(?:last|latest|recent|past|most recent)\s+(?:(?P<n>\d{1,5})\s+)?(?:cycles?|profiles?)\b")
+_CYCLES_RE = re.compile(r"\bcycles?\s*(?:#|no\.?|number)?\s*(?P<a>\d{1,5})(?:\s*(?:-|–|to|and)\s*(?P<b>\d{1,5}))?\b")
+_CYCLE_BOUND_RE = re.compile(
+    r"\b(?P<op>since|from|after|before|until|till|up to)\s+cycle\s*(?P<n>\d{1,5})\b")
+_RECENT_RE = re.compile(r"\b(?:last|past)\s+(?:(?P<n>\d{1,4})\s+)?(?P<unit>days?|weeks?|months?|years?)\b")
+_BETWEEN_RE = re.compile(
+    r"\b(?:from|between)\s+" + _DATE.format(p="a") + r"\s+(?:to|and|until|till|-|–)\s+" + _DATE.format(p="b"))
+_DATE_BOUND_RE = re.compile(r"\b(?P<op>since|from|after|before|until|till|in|during)\s+" + _DATE.format(p="a"))
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+
+class ProfileRange(NamedTuple):
+    """
+    Which profiles of a float a message asks for; unset fields do not
+    restrict. ``latest`` keeps the last that many cycles, ``cycle_min`` and
+    ``cycle_max`` are inclusive, ``start`` and ``end`` are ISO dates with
+    ``end`` exclusive.
+    """
+    latest: Optional[int] = None
+    cycle_min: Optional[int] = None
+    cycle_max: Optional[int] = None
+    start: Optional[str] = None
+    end: Optional[str] = None
+
+    def describe(self) -> str:
+        """Phrase for chat replies, e.g. "last 10 cycles" or "cycles 5-20, since 2024-01-01"."""
+        parts = []
+        if self.latest is not None:
+            parts.append("last cycle" if self.latest == 1 else f"last {self.latest} cycles")
+        if self.cycle_min is not None and self.cycle_min == self.cycle_max:
+            parts.append(f"cycle {self.cycle_min}")
+        elif self.cycle_min is not None and self.cycle_max is not None:
+            parts.append(f"cycles {self.cycle_min}-{self.cycle_max}")
+        elif self.cycle_min is not None:
+            parts.append(f"from cycle {self.cycle_min}")
+        elif self.cycle_max is not None:
+            parts.append(f"up to cycle {self.cycle_max}")
+        if self.start and self.end:
+            end = datetime.date.fromisoformat(self.end) - datetime.timedelta(days=1)
+            parts.append(f"{self.start} to {end.isoformat()}")
+        elif self.start:
+            parts.append(f"since {self.start}")
+        elif self.end:
+            parts.append(f"before {self.end}")
+        return ", ".join(parts)
+
+
+def parse_range(text: str, today: datetime.date = None) -> Optional[ProfileRange]:
+    """
+    The profiles a message restricts a plot to, or None for the whole history.
+    Understands "last 10 cycles" / "latest profile", "cycle 15", "cycles 10-20",
+    "since cycle 40", dates as "2024", "2024-01", "2024-01-15" or "Jan 2024"
+    after "since", "after", "before", "until", "in" or "during", "from 2023-06
+    to 2024-01", and "last 30 days" / "past 6 months" (relative to ``today``).
+    A date names a whole period: "until 2024-01" includes January.
+    """
+    text_lower = text.lower()
+    fields = {}
+    m = _LATEST_RE.search(text_lower)
+    if m:
+        fields["latest"] = int(m.group("n") or 1)
+    m = _CYCLES_RE.search(text_lower)
+    bound = _CYCLE_BOUND_RE.search(text_lower)
+    if bound and not (m and m.group("b")):
+        n = int(bound.group("n"))
+        if bound.group("op") in ("since", "from"):
+            fields["cycle_min"] = n
+        elif bound.group("op") == "after":
+            fields["cycle_min"] = n + 1
+        elif bound.group("op") == "before":
+            fields["cycle_max"] = n - 1
+        else:
+            fields["cycle_max"] = n
+    elif m:
+        a = int(m.group("a"))
+        b = int(m.group("b")) if m.group("b") else a
+        fields["cycle_min"], fields["cycle_max"] = min(a, b), max(a, b)
+    m = _BETWEEN_RE.search(text_lower)
+    if m:
+        first, last = _period(m, "a"), _period(m, "b")
+        if first and last:
+            fields["start"], fields["end"] = first[0], max(first[1], last[1])
+    else:
+        m = _DATE_BOUND_RE.search(text_lower)
+        period = _period(m, "a") if m else None
+        if period:
+            op = m.group("op")
+            if op in ("since", "from"):
+                fields["start"] = period[0]
+            elif op == "after":
+                fields["start"] = period[1]
+            elif op == "before":
+                fields["end"] = period[0]
+            elif op in ("until", "till"):
+                fields["end"] = period[1]
+            else:
+                fields["start"], fields["end"] = period
+        else:
+            m = _RECENT_RE.search(text_lower)
+            if m:
+                today = datetime.date.today() if today is None else today
+                days = int(m.group("n") or 1) * _UNIT_DAYS[m.group("unit").rstrip("s")]
+                fields["start"] = (today - datetime.timedelta(days=days)).isoformat()
+    if not fields:
+        return None
+    return ProfileRange(**{k: v.isoformat() if isinstance(v, datetime.date) else v for k, v in fields.items()})
+
+
+def _period(m, prefix):
+    """``(first day, first day after)`` of the date matched under ``prefix``, or None if invalid."""
+    try:
+        if m.group(prefix + "y"):
+            year = int(m.group(prefix + "y"))
+            month = int(m.group(prefix + "m")) if m.group(prefix + "m") else None
+            day = int(m.group(prefix + "d")) if m.group(prefix + "d") else None
+        else:
+            year, month, day = int(m.group(prefix + "my")), _MONTHS.index(m.group(prefix + "mon")) + 1, None
+        if month is None:
+            return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        if day is None:
+            first = datetime.date(year, month, 1)
+            return first, datetime.date(year + month // 12, month % 12 + 1, 1)
+        first = datetime.date(year, month, day)
+        return first, first + datetime.timedelta(days=1)
+    except ValueError:
+        return None
+
+
+COMPARE_MODES = ("profiles", "envelopes")
+_ENVELOPE_RE = re.compile(
+    r"\b(envelopes?|mean|average|avg|stats|statistics|std|spread|gridded|standard (?:levels|depths))\b")
+_RAW_RE = re.compile(r"\b(raw|all points|every point|individual profiles)\b")
+
+
+def parse_compare_mode(text: str) -> Optional[str]:
+    """``"envelopes"`` or ``"profiles"`` if a compare message asks for one, else None."""
+    text_lower = text.lower()
+    if _ENVELOPE_RE.search(text_lower):
+        return "envelopes"
+    if _RAW_RE.search(text_lower):
+        return "profiles"
+    return None
+
+
+EXPORT_FORMATS = {"parquet": "parquet", "csv": "csv", "netcdf": "netcdf", "nc": "netcdf"}
+_EXPORT_FORMAT_RE = re.compile(r"\b(parquet|csv|netcdf|nc)\b")
+# Longest names first so "potential temperature" is not also read as "temperature"
+_EXPORT_VARIABLE_RE = re.compile(
+    r"\b(potential temperature|potential density|theta|sigma0?|density|temperature|temp|salinity|psal|sal|"
+    r"pressure|pres)\b")
+_EXPORT_VARIABLES = {
+    "potential temperature": "PTEMP", "theta": "PTEMP", "potential density": "SIGMA0", "sigma": "SIGMA0",
+    "sigma0": "SIGMA0", "density": "SIGMA0", "temperature": "TEMP", "temp": "TEMP", "salinity": "PSAL",
+    "psal": "PSAL", "sal": "PSAL", "pressure": "PRES", "pres": "PRES",
+}
+
+
+def parse_export_format(text: str) -> Optional[str]:
+    """``"csv"``, ``"parquet"`` or ``"netcdf"`` if an export message names a format, else None."""
+    m = _EXPORT_FORMAT_RE.search(text.lower())
+    return EXPORT_FORMATS[m.group(1)] if m else None
+
+
+def parse_export_variables(text: str) -> Optional[Tuple[str, ...]]:
+    """
+    Variables an export message names, in order and always with pressure
+    first (rows without it mean little), or None if it names none.
+    """
+    names = [_EXPORT_VARIABLES[m] for m in _EXPORT_VARIABLE_RE.findall(text.lower())]
+    if not names:
+        return None
+    return tuple(dict.fromkeys(["PRES"] + names))
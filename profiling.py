@@ -0,0 +1,166 @@
+"""
+Lightweight per-turn timing spans.
+
+Code marks its stages with ``with span("name", key=value) as s: ...`` and can
+add attributes later through ``s.set(cache="hit", bytes=n)``. Spans are only
+recorded inside ``with tracing("turn") as trace:``; everywhere else
+:func:`span` returns a shared no-op object, so instrumented code costs one
+context-variable lookup when profiling is off. Finished traces export as JSON
+or in the Chrome trace event format (open in ``chrome://tracing`` or Perfetto).
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("argo_trace", default=None)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "start", "duration", "depth", "thread")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+        self.depth = 0
+        self.thread = threading.get_ident()
+
+    def __enter__(self):
+        self.depth = self.trace._depth
+        self.trace._depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        self.trace._depth -= 1
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.spans.append(self)
+        return False
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start_ms": (self.start - self.trace.start) * 1000.0,
+            "duration_ms": self.duration * 1000.0,
+            "depth": self.depth,
+            **self.attrs,
+        }
+
+
+class Trace:
+    """Spans recorded during one chat turn, in completion order."""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.duration = None
+        self.thread = threading.get_ident()
+        self._depth = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "duration_ms": (self.duration or 0.0) * 1000.0,
+            **self.attrs,
+            "spans": sorted((s.to_dict() for s in self.spans), key=lambda d: d["start_ms"]),
+        }
+
+    def chrome_events(self, pid: int = None) -> list:
+        """Complete ("X") events in the Chrome trace format, timestamps in microseconds."""
+        pid = os.getpid() if pid is None else pid
+        origin = self.wall_start * 1e6
+        events = [{
+            "name": self.name, "ph": "X", "pid": pid, "tid": self.thread,
+            "ts": origin, "dur": (self.duration or 0.0) * 1e6, "args": dict(self.attrs),
+        }]
+        for s in self.spans:
+            events.append({
+                "name": s.name, "ph": "X", "pid": pid, "tid": s.thread,
+                "ts": origin + (s.start - self.start) * 1e6, "dur": s.duration * 1e6,
+                "args": {k: _jsonable(v) for k, v in s.attrs.items()},
+            })
+        return events
+
+
+@contextmanager
+def tracing(name: str = "turn", **attrs):
+    """Record the spans of the enclosed block into a new :class:`Trace`."""
+    trace = Trace(name, **attrs)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.duration = time.perf_counter() - trace.start
+        _current.reset(token)
+
+
+def span(name: str, **attrs):
+    """Time the enclosed block as part of the current trace (no-op outside :func:`tracing`)."""
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return Span(trace, name, attrs)
+
+
+def enabled() -> bool:
+    """True inside :func:`tracing`; guards attributes that are costly to compute."""
+    return _current.get() is not None
+
+
+def summarize(traces) -> list:
+    """Per-stage totals over several traces: ``[{name, count, total_ms, mean_ms, max_ms}]``."""
+    durations = defaultdict(list)
+    for trace in traces:
+        for s in trace.spans:
+            durations[s.name].append(s.duration * 1000.0)
+    rows = [{"name": name, "count": len(ms), "total_ms": sum(ms),
+             "mean_ms": sum(ms) / len(ms), "max_ms": max(ms)}
+            for name, ms in durations.items()]
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+def to_json(traces) -> str:
+    return json.dumps([t.to_dict() for t in traces], default=_jsonable, indent=1)
+
+
+def to_chrome_trace(traces) -> str:
+    events = [event for t in traces for event in t.chrome_events()]
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=_jsonable)
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
@@ -0,0 +1,299 @@
+import mmap
+import os
+import zlib
+
+import numpy as np
+
+# Variables kept per measurement and per profile; everything else in the
+# argopy dataset (QC flags, errors, data mode, attributes...) is dropped.
+POINT_VARIABLES = ("PRES", "TEMP", "PSAL")
+PROFILE_VARIABLES = ("CYCLE_NUMBER", "JULD", "LATITUDE", "LONGITUDE")
+# Everything :meth:`FloatRecord.from_xarray` reads from a dataset
+RECORD_VARIABLES = POINT_VARIABLES + PROFILE_VARIABLES + ("TIME", "DIRECTION", "PLATFORM_NUMBER")
+# Array attributes, in the order of the constructor arguments
+COLUMNS = ("pres", "temp", "psal", "offsets", "cycle", "juld", "latitude", "longitude")
+
+
+class FloatRecord:
+    """
+    Compact columnar copy of one float: only what the chatbot plots.
+
+    ``pres``, ``temp`` and ``psal`` are contiguous float32 columns over all
+    measurements. Profile ``i`` spans ``offsets[i]:offsets[i + 1]`` of those
+    columns and ``cycle``, ``juld``, ``latitude`` and ``longitude`` hold one
+    value per profile. ``version`` fingerprints the content so caches can tell
+    when a float has new data. Profiles are also indexed by date and by cycle
+    number (sorted copies plus the permutations that sort them), so time and
+    cycle ranges resolve with ``searchsorted``. Records written with
+    :meth:`save` can be reopened with their columns memory-mapped, so a
+    trajectory never reads the measurement columns and a temperature profile
+    never reads salinity.
+    """
+
+    __slots__ = ("float_id", "pres", "temp", "psal", "offsets",
+                 "cycle", "juld", "latitude", "longitude", "version",
+                 "_juld_order", "_juld_sorted", "_cycle_order", "_cycle_sorted")
+
+    def __init__(self, float_id, pres, temp, psal, offsets, cycle, juld, latitude, longitude):
+        self.float_id = float_id
+        self.pres = np.ascontiguousarray(pres, dtype=np.float32)
+        self.temp = np.ascontiguousarray(temp, dtype=np.float32)
+        self.psal = np.ascontiguousarray(psal, dtype=np.float32)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.cycle = np.ascontiguousarray(cycle, dtype=np.int32)
+        self.juld = np.ascontiguousarray(juld, dtype="datetime64[s]")
+        self.latitude = np.ascontiguousarray(latitude, dtype=np.float32)
+        self.longitude = np.ascontiguousarray(longitude, dtype=np.float32)
+        self.version = self._fingerprint()
+        # Profiles without a date are left out of the date index
+        order = np.argsort(self.juld, kind="stable")
+        self._juld_order = order[~np.isnat(self.juld[order])]
+        self._juld_sorted = self.juld[self._juld_order]
+        self._cycle_order = np.argsort(self.cycle, kind="stable")
+        self._cycle_sorted = self.cycle[self._cycle_order]
+
+    @classmethod
+    def from_xarray(cls, ds, float_id=None) -> "FloatRecord":
+        """Build a record from an argopy point dataset (``N_POINTS`` dimension)."""
+        n = _point_count(ds)
+        if float_id is None and "PLATFORM_NUMBER" in ds and n:
+            float_id = int(ds["PLATFORM_NUMBER"].values[0])
+
+        def column(name, dtype, fill):
+            if name in ds:
+                return np.asarray(ds[name].values).astype(dtype, copy=False)
+            return np.full(n, fill, dtype=dtype)
+
+        cycle = column("CYCLE_NUMBER", np.int32, -1)
+        time_name = "JULD" if "JULD" in ds else "TIME"
+        juld = column(time_name, "datetime64[s]", np.datetime64("NaT"))
+        lat = column("LATITUDE", np.float64, np.nan)
+        lon = column("LONGITUDE", np.float64, np.nan)
+
+        # A new profile starts wherever the cycle (or profiling direction) changes
+        change = np.zeros(n, dtype=bool)
+        if n:
+            change[0] = True
+            change[1:] = cycle[1:] != cycle[:-1]
+            if "DIRECTION" in ds:
+                direction = np.asarray(ds["DIRECTION"].values)
+                change[1:] |= direction[1:] != direction[:-1]
+        starts = np.flatnonzero(change)
+        offsets = np.append(starts, n)
+        return cls(
+            float_id,
+            column("PRES", np.float32, np.nan),
+            column("TEMP", np.float32, np.nan),
+            column("PSAL", np.float32, np.nan),
+            offsets,
+            cycle[starts],
+            juld[starts],
+            lat[starts],
+            lon[starts],
+        )
+
+    @classmethod
+    def open(cls, directory: str, float_id=None) -> "FloatRecord":
+        """
+        Open a record written by :meth:`save` with its columns memory-mapped:
+        nothing is read until a column is used, and then only its pages.
+        """
+        return cls(float_id, *(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                               for name in COLUMNS))
+
+    def save(self, directory: str) -> None:
+        """Write every column to ``<directory>/<column>.npy``."""
+        for name in COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    def to_xarray(self):
+        """Expand back to an argopy-style point dataset."""
+        import xarray as xr
+        counts = np.diff(self.offsets)
+        n = self.n_points
+        return xr.Dataset(
+            {
+                "CYCLE_NUMBER": ("N_POINTS", np.repeat(self.cycle, counts)),
+                "PLATFORM_NUMBER": ("N_POINTS", np.full(n, -1 if self.float_id is None else int(self.float_id))),
+                "PRES": ("N_POINTS", self.pres),
+                "TEMP": ("N_POINTS", self.temp),
+                "PSAL": ("N_POINTS", self.psal),
+            },
+            coords={
+                "N_POINTS": np.arange(n),
+                "LATITUDE": ("N_POINTS", np.repeat(self.latitude, counts)),
+                "LONGITUDE": ("N_POINTS", np.repeat(self.longitude, counts)),
+                "TIME": ("N_POINTS", np.repeat(self.juld, counts).astype("datetime64[ns]")),
+            },
+        )
+
+    def append(self, other: "FloatRecord") -> "FloatRecord":
+        """
+        A new record with the profiles of ``other`` that are newer than this
+        record's last one appended (``self`` if there are none).
+        """
+        if not self.n_profiles:
+            return other if other.n_profiles else self
+        last_juld, last_cycle = self.juld[-1], self.cycle[-1]
+        if np.isnat(last_juld):
+            new = other.cycle > last_cycle
+        else:
+            new = other.juld > last_juld
+        keep = np.flatnonzero(new)
+        if not len(keep):
+            return self
+        points, counts = other._points(keep)
+        return FloatRecord(
+            self.float_id,
+            np.concatenate([self.pres, other.pres[points]]),
+            np.concatenate([self.temp, other.temp[points]]),
+            np.concatenate([self.psal, other.psal[points]]),
+            np.concatenate([self.offsets, self.n_points + np.cumsum(counts)]),
+            np.concatenate([self.cycle, other.cycle[keep]]),
+            np.concatenate([self.juld, other.juld[keep]]),
+            np.concatenate([self.latitude, other.latitude[keep]]),
+            np.concatenate([self.longitude, other.longitude[keep]]),
+        )
+
+    def take(self, profiles) -> "FloatRecord":
+        """
+        A record with only the profiles at indices ``profiles``, in that order.
+        Its ``version`` extends this record's with a checksum of the selection.
+        """
+        profiles = np.asarray(profiles, dtype=np.int64)
+        points, counts = self._points(profiles)
+        record = FloatRecord(
+            self.float_id,
+            self.pres[points],
+            self.temp[points],
+            self.psal[points],
+            np.append(0, np.cumsum(counts)),
+            self.cycle[profiles],
+            self.juld[profiles],
+            self.latitude[profiles],
+            self.longitude[profiles],
+        )
+        record.version = f"{self.version}/{zlib.crc32(profiles.tobytes()):08x}"
+        return record
+
+    def profiles_between(self, start=None, end=None) -> np.ndarray:
+        """
+        Indices (in record order) of the profiles dated in ``[start, end)``;
+        either bound may be None. Profiles without a date never match.
+        """
+        lo, hi = 0, len(self._juld_sorted)
+        if start is not None:
+            lo = np.searchsorted(self._juld_sorted, np.datetime64(start, "s"), side="left")
+        if end is not None:
+            hi = np.searchsorted(self._juld_sorted, np.datetime64(end, "s"), side="left")
+        return np.sort(self._juld_order[lo:max(hi, lo)])
+
+    def profiles_in_cycles(self, first=None, last=None) -> np.ndarray:
+        """Indices (in record order) of the profiles with ``first <= cycle <= last``."""
+        lo, hi = 0, len(self._cycle_sorted)
+        if first is not None:
+            lo = np.searchsorted(self._cycle_sorted, first, side="left")
+        if last is not None:
+            hi = np.searchsorted(self._cycle_sorted, last, side="right")
+        return np.sort(self._cycle_order[lo:max(hi, lo)])
+
+    def latest_cycles(self, n: int) -> np.ndarray:
+        """Indices (in record order) of the profiles of the ``n`` highest cycle numbers."""
+        if not self.n_profiles or n < 1:
+            return np.arange(0)
+        # Walk back over distinct cycle numbers from the top of the sorted index
+        starts = np.flatnonzero(np.r_[True, self._cycle_sorted[1:] != self._cycle_sorted[:-1]])
+        return self.profiles_in_cycles(self._cycle_sorted[starts[max(len(starts) - n, 0)]])
+
+    @property
+    def n_points(self) -> int:
+        return int(self.offsets[-1]) if len(self.offsets) else 0
+
+    @property
+    def n_profiles(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory; memory-mapped columns are paged by the OS and not counted."""
+        return sum(getattr(self, name).nbytes for name in COLUMNS if not _mapped(getattr(self, name)))
+
+    def profile_ids(self) -> np.ndarray:
+        """Profile index of every measurement."""
+        return np.repeat(np.arange(self.n_profiles), np.diff(self.offsets))
+
+    def __repr__(self) -> str:
+        return (f"<FloatRecord {self.float_id}: {self.n_profiles} profiles, "
+                f"{self.n_points} points, {self.nbytes} bytes>")
+
+    def _points(self, profiles):
+        """``(point indices, points per profile)`` of ``profiles``, in order."""
+        starts, ends = self.offsets[profiles], self.offsets[profiles + 1]
+        counts = ends - starts
+        points = np.repeat(starts - np.cumsum(np.append(0, counts[:-1])), counts) + np.arange(counts.sum())
+        return points, counts
+
+    def _fingerprint(self) -> str:
+        if not self.n_profiles:
+            return "empty"
+        return f"{self.n_profiles}-{int(self.cycle[-1])}-{self.juld[-1].astype('int64')}-{self.n_points}"
+
+
+def select_profiles(record: FloatRecord, mode: str = "all", n: int = 1) -> np.ndarray:
+    """
+    Indices of the profiles to show: ``"latest"`` keeps the last ``n`` profiles,
+    ``"every"`` keeps every ``n``-th profile counting back from the latest one and
+    ``"all"`` keeps them all.
+    """
+    count = record.n_profiles
+    n = max(int(n), 1)
+    if mode == "latest":
+        return np.arange(max(count - n, 0), count)
+    if mode == "every":
+        return np.arange(count - 1, -1, -n)[::-1]
+    return np.arange(count)
+
+
+def select_range(record: FloatRecord, selection) -> np.ndarray:
+    """
+    Indices (in record order) of the profiles within ``selection``, an
+    :class:`nlp.ProfileRange`: the cycle and date bounds are intersected, then
+    ``latest`` keeps the profiles of the last that many cycles among them.
+    """
+    keep = None
+    if selection.cycle_min is not None or selection.cycle_max is not None:
+        keep = record.profiles_in_cycles(selection.cycle_min, selection.cycle_max)
+    if selection.start is not None or selection.end is not None:
+        dated = record.profiles_between(selection.start, selection.end)
+        keep = dated if keep is None else np.intersect1d(keep, dated, assume_unique=True)
+    if selection.latest is not None:
+        if keep is None:
+            return record.latest_cycles(selection.latest)
+        cycles = record.cycle[keep]
+        distinct = np.unique(cycles)
+        if len(distinct) > selection.latest:
+            keep = keep[cycles >= distinct[-selection.latest]]
+    return np.arange(record.n_profiles) if keep is None else keep
+
+
+def _mapped(array) -> bool:
+    """True if ``array`` is a view of a memory-mapped file."""
+    while array is not None:
+        if isinstance(array, mmap.mmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def _point_count(ds) -> int:
+    for name in POINT_VARIABLES + PROFILE_VARIABLES:
+        if name in ds:
+            return int(ds[name].size)
+    return 0
+
+
+def as_record(data, float_id=None) -> FloatRecord:
+    """Return ``data`` as a :class:`FloatRecord`, converting xarray datasets."""
+    if isinstance(data, FloatRecord):
+        return data
+    return FloatRecord.from_xarray(data, float_id=float_id)
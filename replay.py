@@ -0,0 +1,149 @@
+"""
+Replay a JSONL log of chat turns through the headless engine.
+
+Each line is a JSON object with the message in ``"text"`` and optionally a
+``"session"`` key; lines with a ``"role"`` other than ``"user"`` are skipped, so
+saved chat transcripts can be replayed as they are. Turns of one session run
+in order against their own :class:`engine.ChatState`; different sessions run
+concurrently on ``--workers`` threads and share the process-wide store, fetch
+layer and figure cache, just like concurrent browser sessions.
+
+Usage:
+    python replay.py turns.jsonl --workers 8
+    python replay.py turns.jsonl --data data/samples --no-figures --json
+    python replay.py turns.jsonl --trace trace.json   # open in chrome://tracing
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+
+import profiling
+from engine import ChatState, handle_message
+from store import get_store
+
+
+def read_turns(path):
+    """Return ``{session: [text, ...]}`` in file order."""
+    sessions = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            turn = json.loads(line)
+            if turn.get("role", "user") != "user":
+                continue
+            sessions[str(turn.get("session", "default"))].append(turn["text"])
+    return sessions
+
+
+def run_session(texts, build_figures=True, cycle_opts=None, traces=None):
+    """
+    Play one session; return ``[(intent, seconds, error)]`` per turn. When
+    ``traces`` is a list, every turn is profiled and its trace appended to it.
+    """
+    state = ChatState()
+    store = get_store()
+    timings = []
+    for text in texts:
+        with profiling.tracing("turn", text=text) if traces is not None else nullcontext() as trace:
+            start = time.perf_counter()
+            error = None
+            try:
+                reply = handle_message(state, text, store=store, cycle_opts=cycle_opts)
+                intent = reply.intent
+                if build_figures:
+                    for spec in reply.figures:
+                        spec.build(store)
+            except Exception as e:
+                intent, error = "error", f"{type(e).__name__}: {e}"
+            timings.append((intent, time.perf_counter() - start, error))
+        if trace is not None:
+            trace.attrs["intent"] = intent
+            traces.append(trace)
+    return timings
+
+
+def replay(sessions, workers=4, build_figures=True, cycle_opts=None, traces=None):
+    """Replay ``{session: [text, ...]}``; return a report dict."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay") as pool:
+        results = list(pool.map(lambda texts: run_session(texts, build_figures, cycle_opts, traces),
+                                sessions.values()))
+    elapsed = time.perf_counter() - start
+
+    by_intent = defaultdict(list)
+    errors = []
+    for timings in results:
+        for intent, seconds, error in timings:
+            by_intent[intent].append(seconds)
+            if error:
+                errors.append(error)
+    turns = sum(len(v) for v in by_intent.values())
+    return {
+        "sessions": len(sessions),
+        "turns": turns,
+        "workers": workers,
+        "seconds": elapsed,
+        "turns_per_second": turns / elapsed if elapsed else float("inf"),
+        "intents": {intent: _latency(seconds) for intent, seconds in sorted(by_intent.items())},
+        "all": _latency([s for v in by_intent.values() for s in v]),
+        "errors": errors,
+    }
+
+
+def _latency(seconds):
+    ms = np.asarray(seconds) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (np.nan,) * 3
+    return {"count": int(len(ms)), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def format_report(report) -> str:
+    lines = [
+        f"{report['turns']} turns in {report['sessions']} sessions, {report['workers']} workers: "
+        f"{report['seconds']:.2f}s, {report['turns_per_second']:.1f} turns/s",
+        f"{'intent':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+    ]
+    rows = list(report["intents"].items()) + [("all", report["all"])]
+    for intent, row in rows:
+        lines.append(f"{intent:<24}{row['count']:>7}{row['p50_ms']:>10.2f}"
+                     f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+    if report["errors"]:
+        lines.append(f"{len(report['errors'])} turns raised, first: {report['errors'][0]}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay JSONL chat turns through the headless engine.")
+    parser.add_argument("log", help="JSONL file, one chat turn per line")
+    parser.add_argument("--workers", type=int, default=4, help="sessions replayed concurrently")
+    parser.add_argument("--no-figures", action="store_true", help="skip building the figures of each reply")
+    parser.add_argument("--data", help="serve floats from <DIR>/<float_id>.nc instead of argopy")
+    parser.add_argument("--cycles", default="all", choices=["all", "latest", "every"])
+    parser.add_argument("--n-cycles", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--trace", metavar="PATH", help="profile every turn and write a Chrome trace to PATH")
+    args = parser.parse_args(argv)
+
+    if args.data:
+        from fetcher import DirectoryBackend, FloatCache, set_cache
+        set_cache(FloatCache(DirectoryBackend(args.data)))
+
+    traces = [] if args.trace else None
+    report = replay(read_turns(args.log), workers=args.workers, build_figures=not args.no_figures,
+                    cycle_opts={"cycles": args.cycles, "n_cycles": args.n_cycles}, traces=traces)
+    if args.trace:
+        with open(args.trace, "w", encoding="utf-8") as f:
+            f.write(profiling.to_chrome_trace(traces))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
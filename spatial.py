@@ -0,0 +1,277 @@
+"""
+Spatial index over float positions for "floats near 15N 70E" and "floats in
+the Bay of Bengal".
+
+The profile positions (one per cycle) of every float put in the store are
+kept as flat columns in ``positions.npz``. Queries run against two
+:class:`PositionGrid` instances, one over the latest position of every float
+and one over every position of every track; both are rebuilt lazily after
+updates.
+"""
+import os
+import threading
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from fetcher import CACHE_DIR
+from utils import PersistedIndex
+
+POSITIONS_PATH = os.environ.get("ARGO_POSITIONS_PATH", os.path.join(CACHE_DIR, "positions.npz"))
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEG = 1.0
+
+
+def wrap_lon(lon):
+    """Longitudes mapped to [-180, 180)."""
+    return (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; broadcasts like NumPy arithmetic."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _ranges(starts, ends):
+    """Concatenation of ``arange(s, e)`` for every pair, without a Python loop."""
+    counts = np.maximum(ends - starts, 0)
+    total = int(counts.sum())
+    if not total:
+        return np.arange(0)
+    return np.repeat(starts - np.cumsum(np.append(0, counts[:-1])), counts) + np.arange(total)
+
+
+class PositionGrid:
+    """
+    Points bucketed into ``cell_deg`` x ``cell_deg`` latitude/longitude cells.
+
+    Points are sorted by cell in row-major order (rows by latitude), so the
+    cells of one latitude row between two longitudes form one contiguous slice
+    of the sorted arrays. A query gathers at most two slices per row it
+    crosses and then filters those candidates exactly. Query results are
+    indices into the arrays the grid was built from.
+    """
+
+    def __init__(self, lat, lon, cell_deg: float = CELL_DEG):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = wrap_lon(lon)
+        keep = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self.cell_deg = cell_deg
+        self.n_rows = int(np.ceil(180.0 / cell_deg))
+        self.n_cols = int(np.ceil(360.0 / cell_deg))
+        cells = self._row(lat[keep]) * self.n_cols + self._col(lon[keep])
+        order = np.argsort(cells, kind="stable")
+        self.index = keep[order]
+        self.lat = lat[self.index]
+        self.lon = lon[self.index]
+        counts = np.bincount(cells, minlength=self.n_rows * self.n_cols)
+        self._bounds = np.append(0, np.cumsum(counts))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def near(self, lat: float, lon: float, radius_km: float):
+        """``(indices, distances_km)`` of the points within ``radius_km`` of ``(lat, lon)``."""
+        delta = np.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = lat - delta, lat + delta
+        # Longitude half-width of a spherical cap; the whole circle near the poles
+        ratio = np.sin(np.radians(min(delta, 90.0))) / max(np.cos(np.radians(lat)), 1e-12)
+        if south <= -90.0 or north >= 90.0 or ratio >= 1.0:
+            candidates = self._candidates(south, north, None, None)
+        else:
+            half = np.degrees(np.arcsin(ratio))
+            candidates = self._candidates(south, north, lon - half, 2 * half)
+        distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+        hit = distances <= radius_km
+        return self.index[candidates[hit]], distances[hit]
+
+    def within(self, south: float, north: float, west: float, east: float):
+        """
+        Indices of the points inside the box. Longitudes run eastwards from
+        ``west`` to ``east``, so ``west > east`` crosses the dateline.
+        """
+        if east - west >= 360.0:
+            west, width = None, None
+        else:
+            west, width = float(wrap_lon(west)), (east - west) % 360.0
+        candidates = self._candidates(south, north, west, width)
+        lat, lon = self.lat[candidates], self.lon[candidates]
+        hit = (lat >= south) & (lat <= north)
+        if west is not None:
+            hit &= (lon - west) % 360.0 <= width
+        return self.index[candidates[hit]]
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90.0) // self.cell_deg).astype(np.int64), 0, self.n_rows - 1)
+
+    def _col(self, lon):
+        return np.clip(((np.asarray(lon) + 180.0) // self.cell_deg).astype(np.int64), 0, self.n_cols - 1)
+
+    def _candidates(self, south, north, west, width):
+        """
+        Sorted-order indices of the points in the cells overlapping the latitude
+        band and ``width`` degrees eastwards of ``west`` (every longitude if None).
+        """
+        rows = np.arange(self._row(max(south, -90.0)), self._row(min(north, 90.0)) + 1) * self.n_cols
+        if west is None:
+            spans = [(0, self.n_cols - 1)]
+        else:
+            west = float(wrap_lon(west))
+            end = west + width
+            spans = [(int(self._col(west)), int(self._col(min(end, 180.0))))]
+            if end > 180.0:
+                spans.append((0, int(self._col(end - 360.0))))
+        starts = np.concatenate([self._bounds[rows + first] for first, _ in spans])
+        ends = np.concatenate([self._bounds[rows + last + 1] for _, last in spans])
+        return _ranges(starts, ends)
+
+
+class SpatialMatch(NamedTuple):
+    """
+    One float matching a spatial query, described by one matching position:
+    the closest one for radius queries, the latest one for box queries.
+    """
+    float_id: int
+    cycle: int
+    date: Optional[str]
+    lat: float
+    lon: float
+    distance_km: Optional[float]
+    n_positions: int
+
+
+class SpatialIndex(PersistedIndex):
+    """
+    ``(version, cycle, juld, lat, lon)`` tracks of the indexed floats.
+    ``track=False`` queries only look at each float's latest position;
+    ``track=True`` queries at every position of its trajectory.
+    """
+
+    def __init__(self, path: str = POSITIONS_PATH, cell_deg: float = CELL_DEG):
+        self.cell_deg = cell_deg
+        self._grids = None
+        super().__init__(path)
+
+    @property
+    def n_positions(self) -> int:
+        return sum(len(track[1]) for track in self._entries.values())
+
+    def near(self, lat: float, lon: float, radius_km: float, track: bool = False):
+        """Floats within ``radius_km`` of ``(lat, lon)``, closest first."""
+        columns, grid = self._grid(track)
+        idx, distances = grid.near(lat, lon, radius_km)
+        return self._matches(columns, idx, distances)
+
+    def within(self, south: float, north: float, west: float, east: float, track: bool = False):
+        """Floats inside the box (see :meth:`PositionGrid.within`), most recently seen first."""
+        columns, grid = self._grid(track)
+        return self._matches(columns, grid.within(south, north, west, east))
+
+    def _grid(self, track):
+        with self._lock:
+            if self._grids is None:
+                self._grids = self._build()
+            return self._grids[track]
+
+    def _build(self):
+        ids = list(self._entries)
+        counts = np.array([len(self._entries[fid][1]) for fid in ids], dtype=np.int64)
+        columns = {
+            "float_id": np.repeat(np.array(ids, dtype=np.int64), counts),
+            "cycle": np.concatenate([self._entries[fid][1] for fid in ids] or [np.zeros(0, np.int32)]),
+            "juld": np.concatenate([self._entries[fid][2] for fid in ids] or [np.zeros(0, "datetime64[s]")]),
+            "lat": np.concatenate([self._entries[fid][3] for fid in ids] or [np.zeros(0, np.float32)]),
+            "lon": np.concatenate([self._entries[fid][4] for fid in ids] or [np.zeros(0, np.float32)]),
+        }
+        # Latest position of each float: its last profile with a finite position
+        valid = np.flatnonzero(np.isfinite(columns["lat"]) & np.isfinite(columns["lon"]))
+        fid_valid = columns["float_id"][valid]
+        last = valid[np.flatnonzero(np.append(fid_valid[1:] != fid_valid[:-1], True))] if len(valid) else valid
+        latest = {name: values[last] for name, values in columns.items()}
+        return {
+            False: (latest, PositionGrid(latest["lat"], latest["lon"], self.cell_deg)),
+            True: (columns, PositionGrid(columns["lat"], columns["lon"], self.cell_deg)),
+        }
+
+    @staticmethod
+    def _matches(columns, idx, distances=None):
+        """One :class:`SpatialMatch` per float among the matching positions ``idx``."""
+        if not len(idx):
+            return []
+        fids = columns["float_id"][idx]
+        # Within each float, the closest position first, else the most recent one
+        order = np.lexsort((distances, fids) if distances is not None else (-idx, fids))
+        idx, fids = idx[order], fids[order]
+        if distances is not None:
+            distances = distances[order]
+        first = np.flatnonzero(np.append(True, fids[1:] != fids[:-1]))
+        counts = np.diff(np.append(first, len(fids)))
+        matches = []
+        for i, n in zip(first, counts):
+            j = idx[i]
+            juld = columns["juld"][j]
+            matches.append(SpatialMatch(
+                float_id=int(fids[i]),
+                cycle=int(columns["cycle"][j]),
+                date=None if np.isnat(juld) else str(np.datetime64(juld, "D")),
+                lat=float(columns["lat"][j]),
+                lon=float(columns["lon"][j]),
+                distance_km=None if distances is None else float(distances[i]),
+                n_positions=int(n),
+            ))
+        if distances is not None:
+            matches.sort(key=lambda m: m.distance_km)
+        else:
+            matches.sort(key=lambda m: m.date or "", reverse=True)
+        return matches
+
+    @staticmethod
+    def _entry(record):
+        return (record.version, record.cycle.copy(), record.juld.copy(),
+                record.latitude.copy(), record.longitude.copy())
+
+    @staticmethod
+    def _version(track) -> str:
+        return track[0]
+
+    def _changed(self) -> None:
+        self._grids = None
+
+    @staticmethod
+    def _load(path) -> dict:
+        with np.load(path, allow_pickle=False) as data:
+            ids, versions, counts = data["ids"], data["versions"], data["counts"]
+            bounds = np.append(0, np.cumsum(counts))
+            columns = [data[name] for name in ("cycle", "juld", "lat", "lon")]
+        return {
+            int(fid): (str(version), *(column[bounds[i]:bounds[i + 1]] for column in columns))
+            for i, (fid, version) in enumerate(zip(ids, versions))
+        }
+
+    def _dump(self, f) -> None:
+        tracks = list(self._entries.items())
+        np.savez(
+            f,
+            ids=np.array([fid for fid, _ in tracks], dtype=np.int64),
+            versions=np.array([track[0] for _, track in tracks], dtype=str),
+            counts=np.array([len(track[1]) for _, track in tracks], dtype=np.int64),
+            cycle=np.concatenate([track[1] for _, track in tracks] or [np.zeros(0, np.int32)]),
+            juld=np.concatenate([track[2] for _, track in tracks] or [np.zeros(0, "datetime64[s]")]),
+            lat=np.concatenate([track[3] for _, track in tracks] or [np.zeros(0, np.float32)]),
+            lon=np.concatenate([track[4] for _, track in tracks] or [np.zeros(0, np.float32)]),
+        )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_spatial_index() -> SpatialIndex:
+    """Process-wide spatial index at :data:`POSITIONS_PATH`."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SpatialIndex()
+        return _index
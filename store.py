@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+from fetcher import fetch_float_data, fetch_many, refresh_many
+from profiling import span
+from records import as_record
+from spatial import get_spatial_index
+from summary import get_summary_index
+
+STORE_BUDGET = int(os.environ.get("ARGO_STORE_BUDGET", 1024 ** 3))
+
+
+class FloatStore:
+    """
+    Process-wide store of loaded floats shared by every session.
+
+    Sessions only keep float IDs and read floats through :meth:`get` or a
+    :meth:`view`. Every float put in the store is also summarized in
+    :mod:`summary` and its positions indexed in :mod:`spatial`. Floats are
+    held as compact :class:`records.FloatRecord` objects in LRU order; once
+    their total size passes ``budget`` bytes the least recently used ones are
+    dropped. Records served from the on-disk cache are memory-mapped and only
+    count what they hold in memory. Eviction is transparent: the next read
+    reloads the float through the fetch layer, which serves it from disk.
+    """
+
+    def __init__(self, budget: int = STORE_BUDGET, loader=fetch_float_data):
+        self.budget = budget
+        self.loader = loader
+        self.stats = dict.fromkeys(["hits", "misses", "evictions"], 0)
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, float_id) -> bool:
+        return float_id in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, float_id):
+        with span("store.get", float_id=float_id) as s:
+            with self._lock:
+                record = self._data.get(float_id)
+                if record is not None:
+                    self._data.move_to_end(float_id)
+                    self.stats["hits"] += 1
+                    s.set(cache="hit")
+                    return record
+                self.stats["misses"] += 1
+            record = self.put(float_id, self.loader(float_id))
+            s.set(cache="miss", bytes=record.nbytes)
+            return record
+
+    def put(self, float_id, ds):
+        record = as_record(ds, float_id=float_id)
+        get_summary_index().update(record)
+        get_spatial_index().update(record)
+        with self._lock:
+            self._data[float_id] = record
+            self._data.move_to_end(float_id)
+            self._sizes[float_id] = record.nbytes
+            self._evict(keep=float_id)
+        return record
+
+    def load_many(self, float_ids, on_progress=None):
+        """Load the missing floats concurrently; return ``(loaded_ids, errors)``."""
+        missing = [fid for fid in float_ids if fid not in self]
+        with span("store.load_many", requested=len(float_ids), missing=len(missing)) as s:
+            results, errors = fetch_many(missing, on_progress=on_progress)
+            for fid, ds in results.items():
+                self.put(fid, ds)
+            s.set(failed=len(errors))
+        return [fid for fid in float_ids if fid not in errors], errors
+
+    def refresh(self, float_ids, on_progress=None):
+        """
+        Fetch only the cycles newer than what each float already holds and
+        append them; records that changed get a new ``version``. Returns
+        ``(new_profiles, errors)`` with ``{float_id: number of profiles added}``.
+        """
+        records = {fid: self.get(fid) for fid in dict.fromkeys(float_ids)}
+        latest = {}
+        for fid, record in records.items():
+            if record.n_profiles and not np.isnat(record.juld[-1]):
+                latest[fid] = (record.juld[-1], (float(record.latitude[-1]), float(record.longitude[-1])))
+            else:
+                latest[fid] = (None, None)
+        with span("store.refresh", floats=len(records)) as s:
+            results, errors = refresh_many(latest, on_progress=on_progress)
+            added = {}
+            for fid, (ds, new) in results.items():
+                record = records[fid]
+                updated = record.append(as_record(new, float_id=fid)) if new is not None else record
+                if updated is not record:
+                    self.put(fid, updated)
+                added[fid] = updated.n_profiles - record.n_profiles
+            s.set(new_profiles=sum(added.values()), failed=len(errors))
+        return added, errors
+
+    def discard(self, float_id) -> None:
+        with self._lock:
+            self._data.pop(float_id, None)
+            self._sizes.pop(float_id, None)
+
+    def view(self, float_ids):
+        return FloatView(self, float_ids)
+
+    def _evict(self, keep=None) -> None:
+        total = sum(self._sizes.values())
+        for fid in list(self._data):
+            if total <= self.budget:
+                break
+            if fid == keep:
+                continue
+            del self._data[fid]
+            total -= self._sizes.pop(fid)
+            self.stats["evictions"] += 1
+
+
+class FloatView(Mapping):
+    """Read-only ``{float_id: FloatRecord}`` mapping over a subset of the store."""
+
+    def __init__(self, store: FloatStore, float_ids):
+        self._store = store
+        self._ids = list(dict.fromkeys(float_ids))
+
+    def __getitem__(self, float_id):
+        if float_id not in self._ids:
+            raise KeyError(float_id)
+        return self._store.get(float_id)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> FloatStore:
+    """Process-wide float store built from the environment defaults."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FloatStore()
+        return _store
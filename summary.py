@@ -0,0 +1,136 @@
+"""
+Small persisted table with one summary row per float.
+
+Rows are computed from a :class:`records.FloatRecord` whenever the store
+receives a new version of a float (first load or refresh) and written to a
+JSON file next to the float cache. The latest position, the chat answers
+about floats and the position map are served from this table, so they
+never touch the full datasets, and floats loaded by earlier sessions can be
+described without loading them.
+"""
+import json
+import os
+import threading
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from fetcher import CACHE_DIR
+from utils import PersistedIndex
+
+SUMMARY_PATH = os.environ.get("ARGO_SUMMARY_PATH", os.path.join(CACHE_DIR, "summaries.json"))
+
+
+class FloatSummary(NamedTuple):
+    float_id: int
+    version: str
+    n_profiles: int
+    latest_cycle: Optional[int]
+    latest_date: Optional[str]
+    latest_lat: Optional[float]
+    latest_lon: Optional[float]
+    first_date: Optional[str]
+    lat_min: Optional[float]
+    lat_max: Optional[float]
+    lon_min: Optional[float]
+    lon_max: Optional[float]
+    max_pres: Optional[float]
+
+    def describe(self) -> str:
+        """One-line chat description."""
+        if not self.n_profiles:
+            return f"Float {self.float_id}: no profiles."
+        return (f"Float {self.float_id}: Latest cycle {self.latest_cycle}, at "
+                f"{_fmt(self.latest_lat)}°N, {_fmt(self.latest_lon)}°E on {self.latest_date or 'Unknown'}. "
+                f"{self.n_profiles} profiles from {self.first_date or 'Unknown'}, "
+                f"{_fmt(self.lat_min)}–{_fmt(self.lat_max)}°N, {_fmt(self.lon_min)}–{_fmt(self.lon_max)}°E, "
+                f"down to {_fmt(self.max_pres, 0)} dbar.")
+
+
+def summarize(record) -> FloatSummary:
+    """Summary row of a :class:`records.FloatRecord`."""
+    n = record.n_profiles
+    if not n:
+        return FloatSummary(record.float_id, record.version, 0, *([None] * 10))
+    dates = record.juld[~np.isnat(record.juld)]
+    return FloatSummary(
+        float_id=int(record.float_id),
+        version=record.version,
+        n_profiles=n,
+        latest_cycle=int(record.cycle[-1]),
+        latest_date=_date(record.juld[-1]),
+        latest_lat=_float(record.latitude[-1]),
+        latest_lon=_float(record.longitude[-1]),
+        first_date=_date(dates.min()) if len(dates) else None,
+        lat_min=_float(np.nanmin(record.latitude)) if np.isfinite(record.latitude).any() else None,
+        lat_max=_float(np.nanmax(record.latitude)) if np.isfinite(record.latitude).any() else None,
+        lon_min=_float(np.nanmin(record.longitude)) if np.isfinite(record.longitude).any() else None,
+        lon_max=_float(np.nanmax(record.longitude)) if np.isfinite(record.longitude).any() else None,
+        max_pres=_float(np.nanmax(record.pres)) if np.isfinite(record.pres).any() else None,
+    )
+
+
+class SummaryIndex(PersistedIndex):
+    """``{float_id: FloatSummary}`` stored as a JSON object at ``path``."""
+
+    def __init__(self, path: str = SUMMARY_PATH):
+        super().__init__(path)
+
+    def get(self, float_id) -> Optional[FloatSummary]:
+        return self._entries.get(float_id)
+
+    def describe(self, float_ids, store=None) -> dict:
+        """
+        ``{float_id: FloatSummary}`` for the indexed floats among ``float_ids``.
+        With a ``store``, floats missing from the index are summarized from it.
+        """
+        rows = {}
+        for fid in float_ids:
+            row = self._entries.get(fid)
+            if row is None and store is not None:
+                self.update(store.get(fid))
+                row = self._entries.get(fid)
+            if row is not None:
+                rows[fid] = row
+        return rows
+
+    _entry = staticmethod(summarize)
+
+    @staticmethod
+    def _version(row) -> str:
+        return row.version
+
+    @staticmethod
+    def _load(path) -> dict:
+        with open(path, encoding="utf-8") as f:
+            return {int(fid): FloatSummary(**row) for fid, row in json.load(f).items()}
+
+    def _dump(self, f) -> None:
+        rows = {str(fid): row._asdict() for fid, row in self._entries.items()}
+        f.write(json.dumps(rows).encode("utf-8"))
+
+
+def _float(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def _date(value):
+    return None if np.isnat(value) else str(np.datetime64(value, "D"))
+
+
+def _fmt(value, digits=2):
+    return "?" if value is None else f"{value:.{digits}f}"
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_summary_index() -> SummaryIndex:
+    """Process-wide summary table at :data:`SUMMARY_PATH`."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SummaryIndex()
+        return _index
@@ -0,0 +1,205 @@
+"""
+Float tracks prepared for the trajectory map.
+
+:func:`prepare` takes the positions of any number of floats and returns them
+as one :class:`Tracks` set of concatenated arrays. Longitudes are unwrapped
+along each track, so a float that drifts across ±180° moves by a few degrees
+rather than 360. The tracks are then simplified together with Douglas–Peucker
+to a point budget. Distances are measured in Web Mercator, the projection the
+map is drawn in, and vertices that would move a line by less than about a pixel
+of the fitted view are dropped even under the budget. Finally every track is
+cut where it crosses the dateline, ending at one edge of the map and resuming
+at the other. The map bounds are the narrowest longitude arc holding every
+point, so floats on both sides of the dateline are framed together rather than
+across the whole globe. Every step works on whole arrays; the simplification
+loops once per level of refinement, not per vertex or per float.
+"""
+import os
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from profiling import span
+from spatial import wrap_lon
+
+# Vertices drawn for all tracks of one map together
+TRACK_POINT_BUDGET = int(os.environ.get("ARGO_TRACK_POINT_BUDGET", 5000))
+# Width in pixels assumed for the fitted view when dropping sub-pixel vertices
+VIEW_PIXELS = 1000
+MAX_MERCATOR_LAT = 85.0
+
+
+class Tracks(NamedTuple):
+    """
+    Simplified tracks of several floats. Track ``i`` is
+    ``lat[offsets[i]:offsets[i + 1]]`` (and ``lon``), with NaN rows where it
+    is cut at the dateline. ``bounds`` is ``(south, north, west, east)`` with
+    ``east`` past 180 when the tracks straddle the dateline.
+    """
+    float_ids: Tuple[int, ...]
+    offsets: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    latest_lat: np.ndarray
+    latest_lon: np.ndarray
+    bounds: Optional[Tuple[float, float, float, float]]
+    n_input: int
+
+    def __len__(self) -> int:
+        return len(self.float_ids)
+
+    def track(self, i: int):
+        """``(lat, lon)`` of track ``i``."""
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return self.lat[lo:hi], self.lon[lo:hi]
+
+    def joined(self):
+        """``(lat, lon, float_id)`` of all tracks in one line, with a NaN row between tracks."""
+        ends = self.offsets[1:-1]
+        gap = np.full(len(ends), np.nan)
+        ids = np.repeat(np.asarray(self.float_ids, dtype=np.int64), np.diff(self.offsets))
+        return (np.insert(self.lat, ends, gap), np.insert(self.lon, ends, gap),
+                np.insert(ids, ends, 0))
+
+
+def mercator_y(lat):
+    """Web Mercator northing of ``lat``, in degrees so it is comparable with longitude."""
+    lat = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    return np.degrees(np.log(np.tan(np.pi / 4 + lat / 2)))
+
+
+def lon_bounds(lon):
+    """
+    ``(west, east)`` of the narrowest longitude arc holding every ``lon``:
+    the complement of the widest gap between neighbouring longitudes, with
+    ``east`` past 180 when the arc crosses the dateline.
+    """
+    lon = np.unique(wrap_lon(lon))
+    if not len(lon):
+        return None
+    gaps = np.diff(np.append(lon, lon[0] + 360.0))
+    widest = int(np.argmax(gaps))
+    west, east = lon[(widest + 1) % len(lon)], lon[widest]
+    return float(west), float(east if east >= west else east + 360.0)
+
+
+def bounds(lat, lon):
+    """``(south, north, west, east)`` of the finite positions, or None."""
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    if not ok.any():
+        return None
+    west, east = lon_bounds(lon[ok])
+    return float(lat[ok].min()), float(lat[ok].max()), west, east
+
+
+def simplify(offsets, x, y, budget: int = TRACK_POINT_BUDGET, tolerance: float = 0.0):
+    """
+    Boolean mask of the vertices kept from the tracks ``x[offsets[i]:offsets[i + 1]]``.
+
+    Douglas–Peucker over all tracks at once, one level per round: every
+    track keeps its end points, then each round adds, in every segment whose
+    farthest vertex lies more than ``tolerance`` from its chord, that vertex.
+    Segments within tolerance are finished and drop out of later rounds. When
+    a round would pass ``budget`` vertices, only the farthest of its
+    candidates are added.
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    starts, ends = offsets[:-1], offsets[1:] - 1
+    keep[starts[ends >= starts]] = True
+    keep[ends[ends >= starts]] = True
+    if n <= budget and tolerance <= 0:
+        keep[:] = True
+        return keep
+    kept = int(keep.sum())
+    # Vertices not kept yet whose segment may still need refining
+    live = ~keep
+    while kept < budget:
+        points = np.flatnonzero(live)
+        if not len(points):
+            break
+        vertices = np.flatnonzero(keep)
+        seg = np.searchsorted(vertices, points) - 1
+        lo, hi = vertices[seg], vertices[seg + 1]
+        dx, dy = x[hi] - x[lo], y[hi] - y[lo]
+        norm = dx * dx + dy * dy
+        t = np.clip(((x[points] - x[lo]) * dx + (y[points] - y[lo]) * dy) / np.where(norm > 0, norm, 1.0), 0.0, 1.0)
+        dist = np.hypot(x[points] - (x[lo] + t * dx), y[points] - (y[lo] + t * dy))
+
+        # Points come sorted, so each segment's points are one run
+        first = np.flatnonzero(np.append(True, seg[1:] != seg[:-1]))
+        counts = np.diff(np.append(first, len(points)))
+        worst = np.maximum.reduceat(dist, first)
+        is_worst = np.flatnonzero(dist == np.repeat(worst, counts))
+        farthest = is_worst[np.unique(seg[is_worst], return_index=True)[1]]
+        refine = worst > tolerance
+        live[points[~np.repeat(refine, counts)]] = False
+        candidates, distance = points[farthest[refine]], worst[refine]
+        if not len(candidates):
+            break
+        room = budget - kept
+        if len(candidates) > room:
+            candidates = candidates[np.argpartition(-distance, room - 1)[:room]]
+        keep[candidates] = True
+        live[candidates] = False
+        kept += len(candidates)
+    return keep
+
+
+def split_dateline(offsets, lat, lon):
+    """
+    Cut tracks with unwrapped longitudes where they cross ±180°. Each crossing
+    gets a vertex on the edge it leaves by, a NaN row, and one on the edge it
+    enters by, at the interpolated latitude. Returns ``(offsets, lat, lon)``
+    with longitudes in [-180, 180].
+    """
+    band = np.floor((lon + 180.0) / 360.0)
+    same_track = np.ones(len(lon) - 1 if len(lon) else 0, dtype=bool)
+    same_track[offsets[1:-1] - 1] = False
+    cross = np.flatnonzero((band[1:] != band[:-1]) & same_track)
+    wrapped = lon - 360.0 * band
+    if not len(cross):
+        return offsets, lat, wrapped
+    eastward = lon[cross + 1] > lon[cross]
+    edge = -180.0 + 360.0 * np.maximum(band[cross], band[cross + 1])
+    t = (edge - lon[cross]) / (lon[cross + 1] - lon[cross])
+    edge_lat = lat[cross] + t * (lat[cross + 1] - lat[cross])
+    leave = np.where(eastward, 180.0, -180.0)
+    at = np.repeat(cross + 1, 3)
+    lat = np.insert(lat, at, np.column_stack([edge_lat, np.full(len(cross), np.nan), edge_lat]).ravel())
+    lon = np.insert(wrapped, at, np.column_stack([leave, np.full(len(cross), np.nan), -leave]).ravel())
+    # Every crossing before a track boundary moves it down three rows
+    offsets = offsets + 3 * np.searchsorted(cross, offsets - 1, side="right")
+    return offsets, lat, lon
+
+
+def prepare(positions, budget: int = TRACK_POINT_BUDGET, view_pixels: int = VIEW_PIXELS) -> Tracks:
+    """
+    :class:`Tracks` of ``{float_id: (lat, lon)}``; positions without a fix are dropped.
+    Floats without any position are left out.
+    """
+    with span("trajectory.prepare", floats=len(positions)) as s:
+        ids, lats, lons = [], [], []
+        for fid, (lat, lon) in positions.items():
+            lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+            ok = np.isfinite(lat) & np.isfinite(lon)
+            if ok.any():
+                ids.append(fid)
+                lats.append(lat[ok])
+                lons.append(np.unwrap(lon[ok], period=360.0))
+        offsets = np.append(0, np.cumsum([len(lat) for lat in lats])).astype(np.int64)
+        lat = np.concatenate(lats) if lats else np.empty(0)
+        lon = np.concatenate(lons) if lons else np.empty(0)
+        latest = offsets[1:] - 1
+        box = bounds(lat, lon)
+
+        tolerance = 0.0
+        if box is not None:
+            south, north, west, east = box
+            extent = max(east - west, float(mercator_y(north) - mercator_y(south)))
+            tolerance = extent / max(view_pixels, 1)
+        keep = simplify(offsets, lon, mercator_y(lat), budget, tolerance)
+        kept_offsets = np.append(0, np.cumsum(np.add.reduceat(keep, offsets[:-1]) if len(ids) else []))
+        out_offsets, out_lat, out_lon = split_dateline(kept_offsets.astype(np.int64), lat[keep], lon[keep])
+        s.set(points=len(lat), kept=int(keep.sum()))
+        return Tracks(tuple(ids), out_offsets, out_lat, out_lon, lat[latest], wrap_lon(lon[latest]), box, len(lat))
@@ -0,0 +1,262 @@
+"""
+Streamlit UI of the app, imported once per process.
+
+Streamlit re-executes ``app.py`` on every interaction. Keeping the widgets and
+panels in functions here means a rerun only calls them: imports, constants
+and function definitions are not redone. The float panel, which has its own
+widget, is a Streamlit fragment, so picking floats to view reruns just that
+panel. On a chat turn the reply is answered and drawn first; the panels above
+it are filled in afterwards, into containers reserved at the top of the page.
+"""
+import os
+from collections import deque
+from contextlib import nullcontext
+
+import streamlit as st
+
+import profiling
+import visualizations as viz
+import warmup
+from engine import ChatState, handle_message, load_float
+from export import DEFAULT_VARIABLES, EXPORT_VARIABLES, FORMATS, ExportError, export_floats
+from history import ChatHistory
+from fetcher import get_coordinator
+from floats import indian_floats
+from nlp import parse_range
+from summary import get_summary_index
+
+CYCLE_MODES = {"All": "all", "Latest N": "latest", "Every k-th": "every"}
+COMPARE_CHOICES = {"Raw profiles": "profiles", "Envelopes (standard levels)": "envelopes"}
+# st.fragment arrived in Streamlit 1.37 (experimental_fragment in 1.33); older
+# versions rerun the whole page, as before
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+# Fill the cache with the curated floats in the background, once per process
+if warmup.WARMUP:
+    warmup.start_warmup()
+
+
+def session_state():
+    """``(chat, history, traces)`` of this browser session, created on its first run."""
+    # Messages keep figure specs, not figures; see history.py
+    if 'history' not in st.session_state:
+        st.session_state['history'] = ChatHistory()
+    if 'history_pages' not in st.session_state:
+        st.session_state['history_pages'] = 1
+    # Sessions only keep float IDs (in their ChatState); the datasets live in
+    # the process-wide store
+    if 'chat' not in st.session_state:
+        st.session_state['chat'] = ChatState()
+    # Timing traces of the last turns, recorded while "Debug intents" is on
+    if 'traces' not in st.session_state:
+        st.session_state['traces'] = deque(maxlen=50)
+    return st.session_state['chat'], st.session_state['history'], st.session_state['traces']
+
+
+def sidebar(chat, store):
+    """Float management and display options; returns ``(cycle_opts, compare_mode, debug_intents)``."""
+    st.sidebar.header("Manage Floats 🌏")
+    selected_float = st.sidebar.selectbox("Add a float:", indian_floats)
+    # Picking a float usually means adding it next; prefetch once per pick,
+    # not on every rerun
+    if st.session_state.get('prefetched') != selected_float:
+        st.session_state['prefetched'] = selected_float
+        warmup.prefetch([selected_float], store)
+    debug_intents = st.sidebar.checkbox("Debug intents", value=False)
+    cycle_choice = st.sidebar.selectbox("Cycles to show", list(CYCLE_MODES))
+    cycle_n = st.sidebar.number_input("N / k", min_value=1, value=10, step=1) if cycle_choice != "All" else 1
+    cycle_opts = {"cycles": CYCLE_MODES[cycle_choice], "n_cycles": int(cycle_n)}
+    compare_mode = COMPARE_CHOICES[st.sidebar.selectbox("Compare as", list(COMPARE_CHOICES))]
+    if st.sidebar.button("Add float"):
+        if selected_float not in chat.float_ids:
+            error = load_float(chat, selected_float, store)
+            if error:
+                st.sidebar.error(error)
+            else:
+                st.sidebar.success(f"Float {selected_float} added!")
+    if st.sidebar.button("Add all floats"):
+        _add_all(chat, store)
+    if chat.float_ids and st.sidebar.button("Refresh loaded floats"):
+        _refresh(chat, store)
+    if chat.float_ids:
+        _export(chat, store)
+    return cycle_opts, compare_mode, debug_intents
+
+
+def _add_all(chat, store):
+    missing = [f for f in indian_floats if f not in chat.float_ids]
+    progress = st.sidebar.progress(0.0, text=f"Loading {len(missing)} floats...")
+
+    def _report(fid, done, total, error):
+        status = "failed" if error else "loaded"
+        progress.progress(done / total, text=f"Float {fid} {status} ({done}/{total})")
+
+    loaded, failed = store.load_many(missing, on_progress=_report)
+    chat.add(loaded)
+    progress.empty()
+    if loaded:
+        st.sidebar.success(f"Added {len(loaded)} floats.")
+    if failed:
+        st.sidebar.error("Failed to load: " + ", ".join(map(str, failed)))
+
+
+def _refresh(chat, store):
+    progress = st.sidebar.progress(0.0, text=f"Checking {len(chat.float_ids)} floats for new cycles...")
+
+    def _report(fid, done, total, error):
+        progress.progress(done / total, text=f"Float {fid} checked ({done}/{total})")
+
+    added, failed = store.refresh(chat.float_ids, on_progress=_report)
+    progress.empty()
+    updated = {fid: n for fid, n in added.items() if n}
+    if updated:
+        st.sidebar.success("New profiles: " + ", ".join(f"{fid} (+{n})" for fid, n in updated.items()))
+    elif added:
+        st.sidebar.info("All loaded floats are up to date.")
+    if failed:
+        st.sidebar.error("Failed to refresh: " + ", ".join(map(str, failed)))
+
+
+def _export(chat, store):
+    with st.sidebar.expander("Export loaded floats"):
+        fmt = st.selectbox("Format", list(FORMATS))
+        variables = st.multiselect("Variables", list(EXPORT_VARIABLES), default=list(DEFAULT_VARIABLES))
+        scope = st.text_input("Cycles or dates (optional)", placeholder="last 10 cycles, since 2024-01")
+        if st.button("Export"):
+            selection = parse_range(scope) if scope.strip() else None
+            if scope.strip() and selection is None:
+                st.error(f"Could not read a cycle or date range from {scope!r}.")
+                return
+            try:
+                with st.spinner(f"Exporting {len(chat.float_ids)} floats..."):
+                    result = export_floats(chat.float_ids, fmt, variables, selection, store)
+            except ExportError as e:
+                st.error(str(e))
+                return
+            # Kept so the download button survives the reruns that follow
+            st.session_state['export'] = result
+        result = st.session_state.get('export')
+        if result is not None and os.path.exists(result.path):
+            st.caption(result.describe())
+            _download(result.path, key="download-export")
+
+
+def _download(path, key):
+    with open(path, "rb") as f:
+        st.download_button(f"Download {os.path.basename(path)}", f, file_name=os.path.basename(path), key=key)
+
+
+@fragment
+def float_panel(chat, store, cycle_opts, compare_mode):
+    """Profiles of one selected float, or a comparison of several."""
+    if not chat.float_ids:
+        return
+    selection = st.multiselect("Select floats to view or compare", list(chat.float_ids))
+    if len(selection) == 1:
+        fid = selection[0]
+        st.subheader(f"Data for Float {fid}")
+        for var in ["TEMP", "PSAL", "PRES"]:
+            fig = viz.cached_figure(viz.plot_float_profiles, store.view([fid]), variable=var, **cycle_opts)
+            st.plotly_chart(fig, use_container_width=True, key=f"profile-{fid}-{var}")
+    elif len(selection) > 1:
+        st.subheader(f"Comparison for floats: {', '.join(map(str, selection))}")
+        plot = viz.compare_floats_envelopes if compare_mode == "envelopes" else viz.compare_floats_plot
+        figs = viz.cached_figure(plot, store.view(selection), selection, **cycle_opts)
+        for var, fig in figs.items():
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key=f"sidebar-compare-{compare_mode}-{var}-{'-'.join(map(str, selection))}"
+            )
+
+
+def map_panel(chat, store):
+    if not chat.float_ids:
+        return
+    st.subheader("Latest Float Positions")
+    # Latest positions come from the summary table, not the datasets
+    fig_map = viz.cached_figure(viz.plot_map, get_summary_index().describe(chat.float_ids, store))
+    st.plotly_chart(fig_map, use_container_width=True, key="map-latest")
+
+
+def _draw(message, store, debug_intents=False):
+    """Draw ``message`` and rebuild its figures (served from the figure cache when still there)."""
+    with st.chat_message(message.role):
+        st.markdown(message.text)
+        for i, path in enumerate(message.files):
+            if os.path.exists(path):
+                _download(path, key=message.chart_key(f"file{i}"))
+        for spec in message.figures:
+            try:
+                figures = spec.build(store)
+            except Exception as e:
+                st.caption(f"Figure {spec.key} is no longer available: {e}")
+                continue
+            for key, fig in figures:
+                with profiling.span("plotly_chart", key=key) as s:
+                    st.plotly_chart(fig, use_container_width=True, key=message.chart_key(key))
+                if debug_intents:
+                    s.set(bytes=len(fig.to_json()))
+
+
+def chat_history(history, store):
+    """The latest page of messages, with buttons to page back through older ones."""
+    pages = st.session_state['history_pages']
+    if pages < history.pages() and st.button("Show earlier messages"):
+        pages = st.session_state['history_pages'] = pages + 1
+    if pages > 1 and st.button("Show only the latest messages"):
+        pages = st.session_state['history_pages'] = 1
+    shown = history.recent(pages)
+    hidden = len(history) - len(shown)
+    if hidden or history.dropped:
+        st.caption(f"{hidden} earlier messages hidden" +
+                   (f", {history.dropped} older ones no longer kept" if history.dropped else ""))
+    for message in shown:
+        _draw(message, store)
+
+
+def chat_turn(chat, store, history, traces, user_input, cycle_opts, compare_mode, debug_intents):
+    """Answer ``user_input``, draw the reply and its figures, and prefetch the likely next floats."""
+    # A new turn goes back to showing only the latest page on the next rerun
+    st.session_state['history_pages'] = 1
+    _draw(history.append("user", user_input), store)
+
+    # All dispatch happens in the headless engine; the UI only renders
+    with profiling.tracing("turn", text=user_input) if debug_intents else nullcontext() as trace:
+        reply = handle_message(chat, user_input, store=store, cycle_opts=cycle_opts, compare_mode=compare_mode)
+        _draw(history.append("assistant", reply.text, reply.figures, reply.files), store, debug_intents)
+
+    if debug_intents:
+        trace.attrs["intent"] = reply.intent
+        traces.append(trace)
+        st.sidebar.write({
+            "intent": reply.intent,
+            "numbers": list(reply.float_ids),
+            "visualizations_module": getattr(viz, "__file__", "unknown"),
+            "fetch_stats": dict(get_coordinator().stats),
+            "store": dict(store.stats, floats=len(store), bytes=store.nbytes),
+            "figure_cache": dict(viz.figure_cache.stats, entries=len(viz.figure_cache), bytes=viz.figure_cache.nbytes),
+            "grid_cache": dict(viz.grid_cache.stats, entries=len(viz.grid_cache), bytes=viz.grid_cache.nbytes),
+            "derived_cache": dict(viz.derived_cache.stats, entries=len(viz.derived_cache),
+                                  bytes=viz.derived_cache.nbytes),
+            "warmup": dict(warmup.stats),
+            "history": {"messages": len(history), "dropped": history.dropped},
+        })
+
+    warmup.prefetch(warmup.predict(chat, reply), store)
+
+
+def profiler_panel(traces):
+    traces = list(traces)
+    if not traces:
+        return
+    with st.sidebar.expander("Profiler", expanded=True):
+        last = traces[-1]
+        st.caption(f"Last turn ({last.attrs.get('intent', '?')}): {last.duration * 1000:.1f} ms")
+        st.dataframe([dict(span, name="  " * span["depth"] + span["name"]) for span in last.to_dict()["spans"]],
+                     use_container_width=True)
+        st.caption(f"Session: {len(traces)} turns, {sum(t.duration for t in traces) * 1000:.1f} ms")
+        st.dataframe(profiling.summarize(traces), use_container_width=True)
+        st.download_button("Export JSON", profiling.to_json(traces), "argo-profile.json", "application/json")
+        st.download_button("Export Chrome trace", profiling.to_chrome_trace(traces),
+                           "argo-trace.json", "application/json")
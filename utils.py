@@ -0,0 +1,194 @@
+"""
+Helpers shared by the caches and the persisted per-float indexes.
+
+:class:`LRUCache` is the bounded, thread-safe map behind the derived-variable,
+grid and figure caches; their keys include each float's data version, so an
+entry is simply never asked for again once the float changes.
+
+:class:`DeferredSave` batches the writes of a table that is updated float by
+float: the first change schedules one write ``ARGO_INDEX_SAVE_DELAY`` seconds
+later and further changes before then ride along with it, so loading many
+floats rewrites the file a handful of times instead of once per float.
+:class:`PersistedIndex` is the table both indexes build on.
+"""
+import atexit
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+INDEX_SAVE_DELAY = float(os.environ.get("ARGO_INDEX_SAVE_DELAY", 2.0))
+
+
+class LRUCache:
+    """
+    Least recently used map of at most ``max_entries`` values, shared by all
+    sessions. ``stats`` counts hits and misses; ``size(value)`` gives the bytes
+    summed by :attr:`nbytes` and reported to the profiler.
+    """
+
+    def __init__(self, max_entries: int, size=None):
+        self.max_entries = max_entries
+        self.stats = dict.fromkeys(["hits", "misses"], 0)
+        self._size = size or (lambda value: value.nbytes)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._size(value) for value in list(self._entries.values()))
+
+    def get_or_build(self, key, build, span=None):
+        """
+        The value for ``key``, from ``build()`` on a miss (called without the
+        lock held). A profiling ``span`` is tagged with the hit or miss and the
+        value's size.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+        if value is None:
+            value = build()
+            with self._lock:
+                self.stats["misses"] += 1
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            if span is not None:
+                span.set(cache="miss", bytes=self._size(value))
+        elif span is not None:
+            span.set(cache="hit", bytes=self._size(value))
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DeferredSave:
+    """
+    Calls ``save`` (with ``lock`` held) on a timer thread ``delay`` seconds
+    after :meth:`mark`, once for all marks made meanwhile; with ``delay`` 0 it
+    saves at once. :meth:`flush` saves now if a write is pending; pending
+    writes are also flushed when the process exits.
+    """
+
+    def __init__(self, save, lock, delay: float = INDEX_SAVE_DELAY):
+        self.save = save
+        self.lock = lock
+        self.delay = delay
+        self._dirty = False
+        self._timer = None
+        self._state_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @property
+    def pending(self) -> bool:
+        return self._dirty
+
+    def mark(self) -> None:
+        """Note a change; it is saved within ``delay`` seconds."""
+        if self.delay <= 0:
+            with self._state_lock:
+                self._dirty = True
+            self.flush()
+            return
+        with self._state_lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._state_lock:
+            timer, self._timer = self._timer, None
+            dirty, self._dirty = self._dirty, False
+        if timer is not None:
+            timer.cancel()
+        if dirty:
+            with self.lock:
+                self.save()
+
+
+class PersistedIndex:
+    """
+    One entry per float, derived from its :class:`records.FloatRecord` and
+    kept until a new data version arrives. The table lives at ``path`` next to
+    the float cache and is shared by all sessions, so floats loaded by earlier
+    sessions are known without loading them. A file that cannot be read (or
+    has an older layout) is ignored and the table rebuilt as floats load.
+    Updates are written together by a :class:`DeferredSave`.
+
+    Subclasses build an entry with ``_entry(record)``, give its version with
+    ``_version(entry)``, and read and write the file with ``_load(path)`` and
+    ``_dump(f)`` (``f`` is a binary file).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._saver = DeferredSave(self._save, self._lock)
+        if os.path.exists(path):
+            try:
+                self._entries = self._load(path)
+            except (OSError, ValueError, KeyError, TypeError):
+                self._entries = {}
+
+    def __contains__(self, float_id) -> bool:
+        return float_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, record, save: bool = True) -> bool:
+        """Index ``record`` unless this version is already indexed; True if it was."""
+        current = self._entries.get(record.float_id)
+        if current is not None and self._version(current) == record.version:
+            return False
+        entry = self._entry(record)
+        with self._lock:
+            self._entries[int(record.float_id)] = entry
+            self._changed()
+        if save:
+            self._saver.mark()
+        return True
+
+    def backfill(self, float_ids, cache) -> int:
+        """Index floats that are in the on-disk ``cache`` but not in the table yet."""
+        added = 0
+        for fid in float_ids:
+            if fid not in self._entries and os.path.exists(cache.path(fid)):
+                added += self.update(cache.read_record(fid), save=False)
+        if added:
+            self._saver.mark()
+            self.flush()
+        return added
+
+    def flush(self) -> None:
+        """Write pending updates now."""
+        self._saver.flush()
+
+    def _changed(self) -> None:
+        """Called with the lock held after an entry changed."""
+
+    def _save(self) -> None:
+        # Written next to the target and renamed, so readers never see half a file
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        name, ext = os.path.splitext(os.path.basename(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}-", suffix=ext)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self._dump(f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
@@ -1,40 +1,111 @@
 # visualizations.py
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
+import json
+import os
+
 import numpy as np
+import plotly.colors
+import plotly.graph_objects as go
+
+import trajectory
+from derived import SERIES, derived_cache
+from gridding import STANDARD_LEVELS, grid_cache
+from profiling import span
+from records import as_record, select_profiles
+from summary import FloatSummary, summarize
+from utils import LRUCache
+
+# Upper bound on the points sent to the browser for one float's profiles
+POINT_BUDGET = 20000
+# Floats drawn as separate tracks on a trajectory map; more share one trace
+MAX_TRACK_TRACES = 10
+FIGURE_CACHE_SIZE = int(os.environ.get("ARGO_FIGURE_CACHE_SIZE", 64))
+
+
+def _profile_xy(record, variable):
+    """x/y arrays and axis labels for one float and variable, or None if unsupported."""
+    if variable == "TEMP":
+        return record.pres, record.temp, "Pressure (dbar)", "Temperature (°C)"
+    if variable == "PSAL":
+        return record.pres, record.psal, "Pressure (dbar)", "Salinity (psu)"
+    if variable == "PRES":
+        return np.arange(record.n_points), record.pres, "Sample Index", "Pressure (dbar)"
+    if variable == "SIGMA0":
+        return record.pres, derived_cache.get(record).sigma0, "Pressure (dbar)", "Potential density σθ (kg/m³ − 1000)"
+    return None
+
+
+def _minmax_decimate(prof, y, per_profile):
+    """
+    Indices (sorted) of the points to keep so that no profile has more than
+    ``per_profile`` points. Each profile longer than that is cut into
+    ``per_profile // 2`` consecutive buckets and only the min and max of ``y``
+    in every bucket survive, which preserves the visible envelope of the line.
+    ``prof`` is the (non-decreasing) profile index of every point.
+    """
+    if len(prof) == 0:
+        return np.arange(0)
+    starts = np.flatnonzero(np.r_[True, prof[1:] != prof[:-1]])
+    counts = np.diff(np.r_[starts, len(prof)])
+    n_buckets = np.where(counts <= per_profile, counts, max(per_profile // 2, 1))
+    seg = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(len(prof)) - starts[seg]
+    bucket = np.r_[0, np.cumsum(n_buckets)[:-1]][seg] + local * n_buckets[seg] // counts[seg]
+    order = np.lexsort((y, bucket))
+    sorted_bucket = bucket[order]
+    first = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
 
 
-def plot_float_profiles(float_data_dict, variable="TEMP"):
+def _profile_lines(record, variable, cycles="all", n_cycles=1, max_points=POINT_BUDGET):
+    """
+    One float's selected profiles as a single line with NaN breaks between
+    profiles, decimated to at most ``max_points`` points in total. When that
+    does not leave 2 points per profile, evenly spaced profiles are drawn.
+    Returns ``(x, y, x_label, y_label)`` or None if the variable is unsupported.
+    """
+    xy = _profile_xy(record, variable)
+    if xy is None:
+        return None
+    x, y, x_axis, y_label = xy
+    selected = select_profiles(record, cycles, n_cycles)
+    prof = record.profile_ids()
+    mask = np.isin(prof, selected) & ~np.isnan(x) & ~np.isnan(y)
+    idx = np.flatnonzero(mask)
+    if len(idx) == 0:
+        return np.array([]), np.array([]), x_axis, y_label
+    drawn = np.unique(prof[idx])
+    if 2 * len(drawn) > max_points:
+        keep = drawn[np.unique(np.linspace(0, len(drawn) - 1, max(max_points // 2, 1)).round().astype(int))]
+        idx = idx[np.isin(prof[idx], keep)]
+        drawn = keep
+    per_profile = max(max_points // len(drawn), 2)
+    idx = idx[_minmax_decimate(prof[idx], y[idx], per_profile)]
+    # Break the line wherever a new profile starts
+    breaks = np.flatnonzero(prof[idx][1:] != prof[idx][:-1]) + 1
+    x_out = np.insert(np.asarray(x[idx], dtype=float), breaks, np.nan)
+    y_out = np.insert(np.asarray(y[idx], dtype=float), breaks, np.nan)
+    return x_out, y_out, x_axis, y_label
+
+
+def plot_float_profiles(float_data_dict, variable="TEMP", cycles="all", n_cycles=1, max_points=POINT_BUDGET):
     """
     Plot profiles (TEMP, PSAL, PRES) for one or multiple floats.
-    float_data_dict: {float_id: xarray dataset}
-    variable: "TEMP", "PSAL", or "PRES"
+    float_data_dict: mapping {float_id: FloatRecord or xarray dataset}, e.g. a store.FloatStore view
+    variable: "TEMP", "PSAL", "PRES", or "SIGMA0" (potential density, see derived.py)
+    cycles / n_cycles: which profiles to draw ("all", "latest" n, or "every" n-th)
+    max_points: per-float point budget; longer floats are min-max decimated
     """
     fig = go.Figure()
     y_label = ""
     x_axis = ""
     
     for fid, ds in float_data_dict.items():
-        if variable == "TEMP":
-            x = ds['PRES'].values
-            y = ds['TEMP'].values
-            y_label = "Temperature (°C)"
-            x_axis = "Pressure (dbar)"
-        elif variable == "PSAL":
-            x = ds['PRES'].values
-            y = ds['PSAL'].values
-            y_label = "Salinity (psu)"
-            x_axis = "Pressure (dbar)"
-        elif variable == "PRES":
-            x = np.arange(len(ds['PRES'].values))
-            y = ds['PRES'].values
-            y_label = "Pressure (dbar)"
-            x_axis = "Sample Index"
-        else:
+        lines = _profile_lines(as_record(ds, fid), variable, cycles, n_cycles, max_points)
+        if lines is None:
             continue
-        
-        fig.add_trace(go.Scatter(x=x, y=y, mode='lines', name=f'Float {fid}'))
+        x, y, x_axis, y_label = lines
+        fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', name=f'Float {fid}', connectgaps=False))
     
     fig.update_layout(
         xaxis_title=x_axis,
@@ -44,27 +115,62 @@ def plot_float_profiles(float_data_dict, variable="TEMP"):
     return fig
 
 
+def plot_float_series(float_data_dict, variable="MLD", cycles="all", n_cycles=1):
+    """
+    Plot one derived value per profile over time for one or multiple floats.
+    variable: "MLD" (mixed-layer depth) or "OHC" (0-700 dbar heat content), see derived.py
+    cycles / n_cycles: which profiles to draw, as in plot_float_profiles
+    """
+    fig = go.Figure()
+    for fid, ds in float_data_dict.items():
+        record = as_record(ds, fid)
+        selected = select_profiles(record, cycles, n_cycles)
+        values = derived_cache.get(record).series(variable)[selected]
+        fig.add_trace(go.Scatter(
+            x=record.juld[selected],
+            y=values,
+            mode='lines+markers',
+            name=f'Float {fid}',
+            customdata=record.cycle[selected],
+            hovertemplate='Cycle %{customdata}: %{y:.2f}',
+            connectgaps=False,
+        ))
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="{} ({})".format(*SERIES[variable]),
+        template='plotly_white'
+    )
+    if variable == "MLD":
+        fig.update_yaxes(autorange="reversed")
+    return fig
+
+
 def plot_map(float_data_dict):
     """
     Plot map of latest positions of floats.
+    Values may be :class:`summary.FloatSummary` rows, which avoids touching the data.
     """
     info_list = []
-    for fid, ds in float_data_dict.items():
-        lat = float(ds['LATITUDE'].values[-1]) if 'LATITUDE' in ds and ds['LATITUDE'].size > 0 else np.nan
-        lon = float(ds['LONGITUDE'].values[-1]) if 'LONGITUDE' in ds and ds['LONGITUDE'].size > 0 else np.nan
+    for fid, data in float_data_dict.items():
+        row = data if isinstance(data, FloatSummary) else summarize(as_record(data, fid))
         info_list.append({
             'Float': fid,
-            'Latitude': lat,
-            'Longitude': lon
+            'Latitude': np.nan if row.latest_lat is None else row.latest_lat,
+            'Longitude': np.nan if row.latest_lon is None else row.latest_lon,
+            'Cycle': row.latest_cycle,
+            'Date': row.latest_date,
         })
+    # pandas and plotly.express are only needed here, and slow to import
+    import pandas as pd
+    import plotly.express as px
     info_df = pd.DataFrame(info_list)
-    fig = px.scatter_mapbox(
+    fig = px.scatter_map(
         info_df,
         lat='Latitude',
         lon='Longitude',
         color='Float',
-        hover_data=['Float'],
-        mapbox_style='open-street-map'
+        hover_data=['Float', 'Cycle', 'Date'],
+        map_style='open-street-map'
     )
     # Auto-fit to shown locations by computing bounds
     if not info_df.empty and info_df['Latitude'].notna().any() and info_df['Longitude'].notna().any():
@@ -73,44 +179,32 @@ def plot_map(float_data_dict):
         west = float(info_df['Longitude'].min())
         east = float(info_df['Longitude'].max())
         fig.update_layout(
-            mapbox=dict(
+            map=dict(
                 bounds=dict(west=west, east=east, south=south, north=north),
             ),
             margin=dict(l=0, r=0, t=0, b=0),
         )
     else:
         fig.update_layout(
-            mapbox_zoom=2,
+            map_zoom=2,
             margin=dict(l=0, r=0, t=0, b=0),
         )
     return fig
 
 
-def compare_floats_plot(float_data_dict, float_ids):
+def compare_floats_plot(float_data_dict, float_ids, cycles="all", n_cycles=1, max_points=POINT_BUDGET):
     """
     Return dict of figures comparing multiple floats for TEMP, PSAL, PRES.
+    cycles, n_cycles and max_points work as in plot_float_profiles.
     """
     figs = {}
+    records = {fid: as_record(float_data_dict[fid], fid) for fid in float_ids}
     for var, y_label in zip(["TEMP", "PSAL", "PRES"], ["Temperature (°C)", "Salinity (psu)", "Pressure (dbar)"]):
         fig = go.Figure()
         x_axis = ""
-        for fid in float_ids:
-            ds = float_data_dict[fid]
-            if var == "TEMP":
-                x = ds['PRES'].values
-                y = ds['TEMP'].values
-                x_axis = "Pressure (dbar)"
-            elif var == "PSAL":
-                x = ds['PRES'].values
-                y = ds['PSAL'].values
-                x_axis = "Pressure (dbar)"
-            elif var == "PRES":
-                x = np.arange(len(ds['PRES'].values))
-                y = ds['PRES'].values
-                x_axis = "Sample Index"
-            else:
-                continue
-            fig.add_trace(go.Scatter(x=x, y=y, mode='lines', name=f'Float {fid}'))
+        for fid, record in records.items():
+            x, y, x_axis, _ = _profile_lines(record, var, cycles, n_cycles, max_points)
+            fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', name=f'Float {fid}', connectgaps=False))
         fig.update_layout(
             xaxis_title=x_axis,
             yaxis_title=y_label,
@@ -120,86 +214,207 @@ def compare_floats_plot(float_data_dict, float_ids):
     return figs
 
 
-def plot_trajectories(float_data_dict):
+def compare_floats_envelopes(float_data_dict, float_ids, cycles="all", n_cycles=1, levels=STANDARD_LEVELS):
     """
-    Plot full trajectories for one or multiple floats using Scattermapbox.
-    Draws line+markers for the entire path and highlights the latest position in red.
+    Return dict of figures comparing floats on standard pressure levels for TEMP and PSAL.
+    Each float is drawn as its mean profile with a mean ± std band and dotted min/max
+    lines, computed from the gridded profiles selected by cycles / n_cycles.
     """
-    fig = go.Figure()
-    any_data = False
-    floats_with_data = []
+    figs = {}
+    gridded = {}
+    for fid in float_ids:
+        record = as_record(float_data_dict[fid], fid)
+        gridded[fid] = (grid_cache.get(record, levels), select_profiles(record, cycles, n_cycles))
+    colors = plotly.colors.qualitative.Plotly
+    for var, y_label in zip(["TEMP", "PSAL"], ["Temperature (°C)", "Salinity (psu)"]):
+        fig = go.Figure()
+        for i, (fid, (grid, selected)) in enumerate(gridded.items()):
+            env = grid.envelope(var, selected)
+            color = colors[i % len(colors)]
+            has = env.count > 0
+            x = env.levels[has]
+            fig.add_trace(go.Scatter(
+                x=np.concatenate([x, x[::-1]]),
+                y=np.concatenate([(env.mean + env.std)[has], (env.mean - env.std)[has][::-1]]),
+                fill='toself', fillcolor=color, opacity=0.2, line=dict(width=0),
+                hoverinfo='skip', legendgroup=str(fid), showlegend=False,
+            ))
+            # Min and max as one dotted trace, broken by a NaN
+            fig.add_trace(go.Scatter(
+                x=np.concatenate([x, [np.nan], x]),
+                y=np.concatenate([env.min[has], [np.nan], env.max[has]]),
+                mode='lines', line=dict(color=color, width=1, dash='dot'),
+                name=f'Float {fid} min/max', legendgroup=str(fid), showlegend=False,
+            ))
+            fig.add_trace(go.Scatter(
+                x=x, y=env.mean[has], mode='lines+markers', line=dict(color=color, width=2),
+                name=f'Float {fid}', legendgroup=str(fid),
+                customdata=np.stack([env.std[has], env.count[has]], axis=-1),
+                hovertemplate='%{x} dbar: %{y:.3f} ± %{customdata[0]:.3f} (%{customdata[1]} profiles)',
+            ))
+        fig.update_layout(
+            xaxis_title="Pressure (dbar)",
+            yaxis_title=y_label,
+            template='plotly_white'
+        )
+        figs[var] = fig
+    return figs
+
 
+def plot_trajectories(float_data_dict, point_budget: int = trajectory.TRACK_POINT_BUDGET):
+    """
+    Plot full trajectories for one or multiple floats on a Scattermap.
+    Tracks are simplified to ``point_budget`` vertices in total and cut at the
+    dateline (see :mod:`trajectory`). Up to ``MAX_TRACK_TRACES`` floats get a
+    line+markers track each with the latest position highlighted in red; more
+    floats are drawn as one line and one layer of latest positions.
+    """
+    positions = {}
     for fid, ds in float_data_dict.items():
-        if 'LATITUDE' in ds and 'LONGITUDE' in ds and ds['LATITUDE'].size > 0 and ds['LONGITUDE'].size > 0:
-            lats = ds['LATITUDE'].values
-            lons = ds['LONGITUDE'].values
-            # Normalize longitudes to [-180, 180] to avoid dateline spanning
-            lons = ((lons + 180) % 360) - 180
-            # Full track
-            fig.add_trace(go.Scattermapbox(
-                lat=lats.tolist(),
-                lon=lons.tolist(),
+        record = as_record(ds, fid)
+        positions[fid] = (record.latitude, record.longitude)
+    tracks = trajectory.prepare(positions, point_budget)
+
+    fig = go.Figure()
+    if len(tracks) <= MAX_TRACK_TRACES:
+        for i, fid in enumerate(tracks.float_ids):
+            lats, lons = tracks.track(i)
+            fig.add_trace(go.Scattermap(
+                lat=lats,
+                lon=lons,
                 mode='lines+markers',
                 name=f'Track {fid}',
                 marker=dict(size=6),
                 line=dict(width=2)
             ))
-            # Latest point
-            fig.add_trace(go.Scattermapbox(
-                lat=[float(lats[-1])],
-                lon=[float(lons[-1])],
+            fig.add_trace(go.Scattermap(
+                lat=tracks.latest_lat[i:i + 1],
+                lon=tracks.latest_lon[i:i + 1],
                 mode='markers',
                 name=f'Latest {fid}',
                 marker=dict(size=12, color='red')
             ))
-            any_data = True
-            floats_with_data.append(fid)
+    elif len(tracks):
+        lats, lons, ids = tracks.joined()
+        fig.add_trace(go.Scattermap(
+            lat=lats, lon=lons, mode='lines', name=f'Tracks ({len(tracks)} floats)',
+            line=dict(width=1), customdata=ids, hovertemplate='Float %{customdata}<extra></extra>'
+        ))
+        fig.add_trace(go.Scattermap(
+            lat=tracks.latest_lat, lon=tracks.latest_lon, mode='markers', name='Latest positions',
+            marker=dict(size=6, color='red'), customdata=np.asarray(tracks.float_ids),
+            hovertemplate='Float %{customdata}<extra></extra>'
+        ))
 
-    # Auto-fit view to the data by computing bounds
     fig.update_layout(
-        mapbox_style='open-street-map',
+        map_style='open-street-map',
         margin=dict(l=0, r=0, t=0, b=0),
     )
-
-    # Collect all lat/lon points from traces to set bounds
-    all_lats = []
-    all_lons = []
-    for tr in fig.data:
-        if isinstance(tr, go.Scattermapbox):
-            if hasattr(tr, 'lat') and hasattr(tr, 'lon') and tr.lat is not None and tr.lon is not None:
-                all_lats.extend([float(x) for x in tr.lat])
-                all_lons.extend([float(x) for x in tr.lon])
-
-    if all_lats and all_lons:
-        south = float(np.nanmin(all_lats))
-        north = float(np.nanmax(all_lats))
-        west = float(np.nanmin(all_lons))
-        east = float(np.nanmax(all_lons))
-        # If only one float is provided, center on latest point with a sensible zoom
-        if len(floats_with_data) == 1:
-            center_lat = float(all_lats[-1])
-            center_lon = float(all_lons[-1])
-            # Simple heuristic for zoom based on span
-            lat_span = max(1e-6, north - south)
-            lon_span = max(1e-6, east - west)
-            span = max(lat_span, lon_span)
-            # Rough mapping: smaller span -> larger zoom
-            if span < 0.5:
-                zoom = 6
-            elif span < 1.0:
-                zoom = 5
-            elif span < 5:
-                zoom = 4
-            else:
-                zoom = 3
-            fig.update_layout(mapbox=dict(center=dict(lat=center_lat, lon=center_lon), zoom=zoom))
+    # Auto-fit view to the data
+    if tracks.bounds is None:
+        fig.update_layout(map_zoom=2)
+    elif len(tracks) == 1:
+        # One float: center on its latest position with a zoom that fits the track
+        south, north, west, east = tracks.bounds
+        extent = max(north - south, east - west, 1e-6)
+        # Rough mapping: smaller extent -> larger zoom
+        if extent < 0.5:
+            zoom = 6
+        elif extent < 1.0:
+            zoom = 5
+        elif extent < 5:
+            zoom = 4
         else:
-            fig.update_layout(
-                mapbox=dict(
-                    bounds=dict(west=west, east=east, south=south, north=north),
-                )
-            )
+            zoom = 3
+        fig.update_layout(map=dict(center=dict(lat=float(tracks.latest_lat[0]),
+                                               lon=float(tracks.latest_lon[0])), zoom=zoom))
     else:
-        fig.update_layout(mapbox_zoom=2)
-
+        south, north, west, east = tracks.bounds
+        fig.update_layout(map=dict(bounds=dict(west=west, east=east, south=south, north=north)))
     return fig
+
+
+def _json_size(cached) -> int:
+    if isinstance(cached, dict):
+        return sum(len(j) for j in cached.values())
+    return len(cached)
+
+
+class FigureCache(LRUCache):
+    """
+    Rendered figures stored as plotly JSON.
+
+    Keys combine the plotting function, the sorted float IDs, every float's data
+    version and the remaining arguments, so a figure is rebuilt only when the
+    selection, the render options or the underlying data change.
+    """
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_SIZE):
+        super().__init__(max_entries, size=_json_size)
+
+    def get_or_build(self, key, build):
+        """Return the figure (or dict of figures) for ``key``, building it on a miss."""
+        built = []
+
+        def build_json():
+            with span("figure.build", plot=key[0]):
+                result = build()
+            built.append(result)
+            with span("figure.to_json", plot=key[0]):
+                if isinstance(result, dict):
+                    return {name: fig.to_json() for name, fig in result.items()}
+                return result.to_json()
+
+        with span("figure", plot=key[0]) as s:
+            cached = super().get_or_build(key, build_json, s)
+            if built:
+                return built[0]
+            with span("figure.from_json", plot=key[0]):
+                if isinstance(cached, dict):
+                    return {name: _figure_from_json(j) for name, j in cached.items()}
+                return _figure_from_json(cached)
+
+
+figure_cache = FigureCache()
+
+
+def _figure_from_json(spec):
+    # Hand plotly NumPy arrays instead of long lists; validating lists point by
+    # point costs several times more than parsing the JSON itself
+    fig_dict = json.loads(spec)
+    for trace in fig_dict.get("data", []):
+        for axis in ("x", "y", "lat", "lon"):
+            values = trace.get(axis)
+            if isinstance(values, list) and values and not isinstance(values[0], str):
+                trace[axis] = np.array(values, dtype=float)
+    return go.Figure(fig_dict)
+
+
+def _data_version(data, fid):
+    version = getattr(data, "version", None)
+    return version if version is not None else as_record(data, fid).version
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def cached_figure(plot_fn, float_data_dict, *args, **kwargs):
+    """
+    Memoized ``plot_fn(float_data_dict, *args, **kwargs)`` through ``figure_cache``.
+    Floats are passed to ``plot_fn`` in sorted ID order so equal keys mean equal figures.
+    """
+    ids = sorted(float_data_dict)
+    data = {fid: float_data_dict[fid] for fid in ids}
+    key = (
+        plot_fn.__name__,
+        tuple(ids),
+        tuple(_data_version(data[fid], fid) for fid in ids),
+        _freeze(args),
+        _freeze(kwargs),
+    )
+    return figure_cache.get_or_build(key, lambda: plot_fn(data, *args, **kwargs))
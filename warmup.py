@@ -0,0 +1,185 @@
+"""
+Background warm-up of the float cache and predictive prefetch.
+
+:func:`warm` loads a list of floats (``ARGO_WARMUP_FLOATS``, by default the
+curated ``floats.indian_floats``) into the on-disk cache, the summary table,
+the spatial index and the float store. Only a few floats are in flight at a
+time, so interactive requests still find free fetch workers. The app runs it
+once per process in a background thread (:func:`start_warmup`); it also runs
+from the command line, e.g. from a deploy script or cron:
+
+    python warmup.py
+    python warmup.py --floats 2902206,2903893 --concurrency 4 --data data/samples
+
+:func:`predict` guesses from a session's last reply which floats it will ask
+for next, and :func:`prefetch` loads them in the background.
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from engine import SPATIAL_INTENTS
+from fetcher import FetchTimeout, get_coordinator
+from floats import indian_floats
+from nlp import DEFAULT_RADIUS_KM
+from profiling import span
+from spatial import get_spatial_index
+from store import get_store
+from summary import get_summary_index
+
+
+def parse_ids(text: str):
+    """Float IDs in a comma- or space-separated string."""
+    return [int(fid) for fid in re.findall(r"\d+", text or "")]
+
+
+WARMUP = os.environ.get("ARGO_WARMUP", "1").lower() not in ("0", "false", "no")
+WARMUP_FLOATS = parse_ids(os.environ.get("ARGO_WARMUP_FLOATS")) or list(indian_floats)
+WARMUP_CONCURRENCY = int(os.environ.get("ARGO_WARMUP_CONCURRENCY", 2))
+# Floats prefetched after a reply, and how far to look for neighbours of the floats it showed
+PREFETCH_LIMIT = int(os.environ.get("ARGO_PREFETCH_LIMIT", 3))
+PREFETCH_RADIUS_KM = float(os.environ.get("ARGO_PREFETCH_RADIUS_KM", DEFAULT_RADIUS_KM))
+
+stats = dict.fromkeys(["warmed", "prefetched", "failed"], 0)
+_lock = threading.Lock()
+_warmup_thread = None
+_prefetching = set()
+
+
+def warm(float_ids=None, store=None, concurrency: int = WARMUP_CONCURRENCY, on_progress=None):
+    """
+    Load ``float_ids`` (default :data:`WARMUP_FLOATS`) that are not in the
+    store yet, at most ``concurrency`` at a time. Returns ``(loaded_ids,
+    errors)`` like :meth:`store.FloatStore.load_many`; ``on_progress(float_id,
+    done, total, error)`` is called as each float finishes.
+    """
+    store = get_store() if store is None else store
+    coordinator = get_coordinator()
+    ids = [fid for fid in dict.fromkeys(WARMUP_FLOATS if float_ids is None else float_ids) if fid not in store]
+    pending = iter(ids)
+    running, loaded, errors = {}, [], {}
+
+    def finish(fid, error):
+        if error is None:
+            loaded.append(fid)
+        else:
+            errors[fid] = error
+        if on_progress is not None:
+            on_progress(fid, len(loaded) + len(errors), len(ids), error)
+
+    with span("warm", floats=len(ids), concurrency=concurrency) as s:
+        while True:
+            while len(running) < max(concurrency, 1):
+                fid = next(pending, None)
+                if fid is None:
+                    break
+                running[coordinator.submit(fid)] = fid
+            if not running:
+                break
+            done, _ = wait(running, timeout=coordinator.timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Nothing finished in time: give up on what is still running
+                for fid in running.values():
+                    finish(fid, FetchTimeout(f"Float {fid} did not load within {coordinator.timeout:g}s"))
+                running.clear()
+                continue
+            for future in done:
+                fid = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    store.put(fid, future.result())
+                finish(fid, error)
+        s.set(loaded=len(loaded), failed=len(errors))
+    return loaded, errors
+
+
+def _run(float_ids, store, concurrency, counter):
+    loaded, errors = warm(float_ids, store, concurrency)
+    with _lock:
+        stats[counter] += len(loaded)
+        stats["failed"] += len(errors)
+        _prefetching.difference_update(float_ids or ())
+
+
+def start_warmup(float_ids=None, store=None, concurrency: int = WARMUP_CONCURRENCY) -> threading.Thread:
+    """Run :func:`warm` in a daemon thread, once per process; later calls return the same thread."""
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_run, args=(float_ids, store, concurrency, "warmed"),
+                                              name="argo-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+
+def prefetch(float_ids, store=None, concurrency: int = 1):
+    """
+    Load ``float_ids`` in a background thread, skipping floats that are
+    loaded or already being prefetched. Returns the IDs it started on.
+    """
+    store = get_store() if store is None else store
+    with _lock:
+        ids = [fid for fid in dict.fromkeys(float_ids) if fid not in store and fid not in _prefetching]
+        _prefetching.update(ids)
+    if ids:
+        threading.Thread(target=_run, args=(ids, store, concurrency, "prefetched"),
+                         name="argo-prefetch", daemon=True).start()
+    return ids
+
+
+def neighbours(float_ids, limit: int = PREFETCH_LIMIT, radius_km: float = PREFETCH_RADIUS_KM):
+    """Cached floats whose latest position is within ``radius_km`` of one of ``float_ids``, closest first."""
+    rows = get_summary_index().describe(float_ids)
+    index = get_spatial_index()
+    found = {}
+    for row in rows.values():
+        if row.latest_lat is None or row.latest_lon is None:
+            continue
+        for match in index.near(row.latest_lat, row.latest_lon, radius_km):
+            if match.float_id not in rows:
+                found[match.float_id] = min(match.distance_km, found.get(match.float_id, float("inf")))
+    return sorted(found, key=found.get)[:limit]
+
+
+def predict(state, response, limit: int = PREFETCH_LIMIT):
+    """
+    Float IDs a session is likely to ask for after ``response`` (an
+    :class:`engine.Response`), most likely first: the first floats listed by
+    a spatial query, otherwise floats named in the message but not loaded
+    (single-float requests only use the first) followed by the nearest
+    neighbours of the floats the reply showed.
+    """
+    shown = list(dict.fromkeys(fid for spec in response.figures for fid in spec.float_ids))
+    if response.intent in SPATIAL_INTENTS:
+        candidates = shown[:limit]
+    else:
+        named = [fid for fid in response.float_ids if fid not in state.float_ids]
+        candidates = named + (neighbours(shown, limit) if shown else [])
+    return [fid for fid in dict.fromkeys(candidates) if fid not in state.float_ids][:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the float cache, summary table and spatial index.")
+    parser.add_argument("--floats", help="comma-separated float IDs (default: ARGO_WARMUP_FLOATS or floats.py)")
+    parser.add_argument("--concurrency", type=int, default=WARMUP_CONCURRENCY, help="floats loaded at a time")
+    parser.add_argument("--data", help="serve floats from <DIR>/<float_id>.nc instead of argopy")
+    args = parser.parse_args(argv)
+
+    if args.data:
+        from fetcher import DirectoryBackend, FloatCache, set_cache
+        set_cache(FloatCache(DirectoryBackend(args.data)))
+
+    def report(fid, done, total, error):
+        print(f"[{done}/{total}] {fid}: {'failed: ' + str(error) if error else 'ok'}", flush=True)
+
+    loaded, errors = warm(parse_ids(args.floats) if args.floats else None,
+                          concurrency=args.concurrency, on_progress=report)
+    print(f"{len(loaded)} floats warmed, {len(errors)} failed")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())